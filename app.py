@@ -6,15 +6,33 @@ Detects pivot-confirmed RSI divergence, institutional Order Blocks,
 and validates signals only when price is near an OB zone.
 """
 
-from flask import Flask, render_template, jsonify, request as req
+from flask import Flask, Response, render_template, jsonify, request as req, stream_with_context
 import yfinance as yf
 import pandas as pd
 import numpy as np
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import OrderedDict, deque
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed, wait)
+from contextlib import closing
 from datetime import datetime
-import traceback
+import bisect
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
 
 app = Flask(__name__)
+log = logging.getLogger("screener")
 
 # ─── Timeframe map ────────────────────────────────────────────────────────────
 TF_CONFIG = {
@@ -24,6 +42,146 @@ TF_CONFIG = {
     "Monthly": {"interval": "1mo", "period": "5y"},
 }
 
+# ─── Data provider ────────────────────────────────────────────────────────────
+# "yahoo" (live) or "archive" (memory-mapped local bar archive at ARCHIVE_PATH)
+DATA_PROVIDER = os.environ.get("DATA_PROVIDER", "yahoo")
+ARCHIVE_PATH = os.environ.get(
+    "ARCHIVE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "archive"),
+)
+
+# ─── Local bar store ──────────────────────────────────────────────────────────
+# SQLite file holding every fetched OHLCV bar. Set BAR_STORE_PATH="" to disable.
+BAR_STORE_PATH = os.environ.get(
+    "BAR_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bars.sqlite3"),
+)
+# Relative close mismatch on overlapping bars that marks a re-adjusted history
+ADJ_TOLERANCE = 1e-4
+
+# Symbols per bulk download request in the fetch stage of run_scan
+FETCH_BATCH_SIZE = 50
+# Chart requests one YahooProvider bulk download runs at once: Yahoo serves
+# one symbol per request, so a batch fans out on the shared session
+YAHOO_BATCH_THREADS = int(os.environ.get("YAHOO_BATCH_THREADS", 8))
+# Series refreshed within SHARED_TTL_FRACTION of a bar (at most SHARED_TTL_MAX
+# seconds) are served straight from the store without a request:
+# 1h → 60 s, 1d and longer → 300 s by default.
+SHARED_TTL_FRACTION = float(os.environ.get("SHARED_TTL_FRACTION", 1 / 60))
+SHARED_TTL_MAX = float(os.environ.get("SHARED_TTL_MAX", 300))
+
+# ─── Order blocks ─────────────────────────────────────────────────────────────
+# Most recent OBs per side checked for proximity / breakout (and kept in
+# SignalState). Raising it invalidates persisted states, which then rebuild.
+OB_LOOKBACK = max(1, int(os.environ.get("OB_LOOKBACK", 10)))
+
+# ─── Scan pipeline ────────────────────────────────────────────────────────────
+# I/O stage: threads doing downloads. Analytics stage: SCAN_CPU_WORKERS
+# processes ("auto" = one per core); 0 runs analytics on the I/O threads.
+SCAN_IO_WORKERS = int(os.environ.get("SCAN_IO_WORKERS", 20))
+_cpu_env = os.environ.get("SCAN_CPU_WORKERS", "0")
+SCAN_CPU_WORKERS = (os.cpu_count() or 1) if _cpu_env == "auto" else int(_cpu_env)
+# Analytics tasks allowed in flight before the I/O stage stops starting downloads
+SCAN_ANALYTICS_BACKLOG = int(os.environ.get("SCAN_ANALYTICS_BACKLOG", 200))
+# Analyze each downloaded chunk as one (symbols × bars) matrix instead of
+# symbol by symbol (see analyze_matrix): "local" (default) for local providers
+# such as the archive only, "1" for every provider, "0" never.
+SCAN_BATCHED = os.environ.get("SCAN_BATCHED", "local")
+# Largest parameter grid /api/sweep accepts (rsi_len × pivot_len × ob_prox × ob_confirm)
+SWEEP_MAX_COMBOS = int(os.environ.get("SWEEP_MAX_COMBOS", 500))
+# Best-ranked results /api/screen keeps from a universe-wide scan by default
+SCREEN_TOP_K = int(os.environ.get("SCREEN_TOP_K", 200))
+# Seconds between the progress frames /api/screen streams while it scans, so
+# proxies and the server's timeout see a live response
+SCREEN_PROGRESS_INTERVAL = float(os.environ.get("SCREEN_PROGRESS_INTERVAL", 5))
+# Symbols /api/confluence ranks by default, and how many timeframes must agree
+CONFLUENCE_TOP_N = int(os.environ.get("CONFLUENCE_TOP_N", 20))
+CONFLUENCE_MIN_ALIGNED = int(os.environ.get("CONFLUENCE_MIN_ALIGNED", 2))
+
+# ─── Fetch scheduler ──────────────────────────────────────────────────────────
+# Every remote provider call goes through FETCH_SCHEDULER: a token bucket and
+# a concurrency window (1 … SCAN_IO_WORKERS), both AIMD — halved when the
+# provider throttles, grown back additively on success. FETCH_RATE caps the
+# request rate (requests/s, 0 = no cap until the provider first throttles),
+# FETCH_BURST its bursts (0 = one second's worth). Failed calls are retried
+# FETCH_RETRIES times with jittered exponential backoff (FETCH_BACKOFF ·
+# 2^attempt, capped at FETCH_BACKOFF_MAX).
+FETCH_RATE = float(os.environ.get("FETCH_RATE", 0))
+FETCH_BURST = float(os.environ.get("FETCH_BURST", 0))
+FETCH_START_CONCURRENCY = int(os.environ.get("FETCH_START_CONCURRENCY", 8))
+FETCH_RETRIES = int(os.environ.get("FETCH_RETRIES", 4))
+FETCH_BACKOFF = float(os.environ.get("FETCH_BACKOFF", 0.5))        # seconds
+FETCH_BACKOFF_MAX = float(os.environ.get("FETCH_BACKOFF_MAX", 30))  # seconds
+# Re-requests of symbols a bulk download left out (YahooProvider drops the
+# symbols whose request failed, as long as any other came back)
+FETCH_MISSING_RETRIES = int(os.environ.get("FETCH_MISSING_RETRIES", 1))
+
+# ─── Metadata cache ───────────────────────────────────────────────────────────
+# Market cap changes at most daily; ticker.info is one of the slowest endpoints.
+META_TTL = float(os.environ.get("META_TTL", 6 * 3600))   # seconds
+META_MAX_SYMBOLS = int(os.environ.get("META_MAX_SYMBOLS", 5000))
+
+# ─── Backtest ─────────────────────────────────────────────────────────────────
+# Forward-return horizons (bars) scored for every backtested signal
+BACKTEST_HORIZONS = (1, 5, 10, 20)
+
+# ─── Metrics ──────────────────────────────────────────────────────────────────
+# Histogram bucket bounds (seconds) for /metrics
+METRIC_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                  1, 2.5, 5, 10, 30, 60)
+
+# ─── Scan jobs ────────────────────────────────────────────────────────────────
+# Jobs (like watches, precomputed scans and /metrics) live in the web process:
+# serve the app from ONE gunicorn worker, scaled with --threads, and let
+# SCAN_CPU_WORKERS spread the analytics over the cores (see Procfile).
+JOB_FRESHNESS = float(os.environ.get("JOB_FRESHNESS", 300))   # reuse identical scans (s)
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION", 3600))  # forget finished jobs (s)
+
+# ─── Watch mode ───────────────────────────────────────────────────────────────
+# A watch re-scans a timeframe once a bar of it has closed in the exchange's
+# timezone: 1H bars start at WATCH_HOUR_OFFSET past the hour during the session
+# (the last one is cut short by the close), daily bars close at
+# WATCH_SESSION_CLOSE (weekly on Friday, monthly on the month's last weekday).
+WATCH_TZ = os.environ.get("WATCH_TZ", "Asia/Kolkata")
+WATCH_SESSION_CLOSE = pd.Timedelta(os.environ.get("WATCH_SESSION_CLOSE", "15:30") + ":00")
+WATCH_HOUR_OFFSET = pd.Timedelta(minutes=int(os.environ.get("WATCH_HOUR_OFFSET", 15)))
+WATCH_SETTLE = float(os.environ.get("WATCH_SETTLE", 120))  # wait for the provider to publish a closed bar (s)
+WATCH_POLL = float(os.environ.get("WATCH_POLL", 30))       # how often watches check for closed bars (s)
+WATCH_IDLE = float(os.environ.get("WATCH_IDLE", 3600))     # stop watches nobody listens to (s)
+WATCH_SESSION_OPEN = pd.Timedelta(os.environ.get("WATCH_SESSION_OPEN", "09:15") + ":00")
+# Event streams each hold a server thread for as long as they are open: cap
+# them below the gunicorn --threads so scans and API calls keep some (503 beyond)
+WATCH_MAX_LISTENERS = int(os.environ.get("WATCH_MAX_LISTENERS", 8))
+
+# ─── Precompute ───────────────────────────────────────────────────────────────
+# Comma-separated presets kept scanned in the background with default
+# parameters, in priority order ("all" = every preset; unset or "" = off).
+# Each timeframe is re-scanned when one of its bars closes, and every
+# PRECOMPUTE_REFRESH seconds during the session so the live bar stays current.
+# /api/scan and /api/scan/stream answer matching requests from these
+# snapshots while they are younger than PRECOMPUTE_MAX_AGE.
+# Cost: a preset of N symbols is N × len(TF_CONFIG) downloads + analyses per
+# refresh ("all" is ~2,800 every PRECOMPUTE_REFRESH seconds of the session)
+# and its snapshots stay in memory. Opt in with the presets users actually
+# scan, and run ONE web process (see Procfile) so the work isn't repeated.
+PRECOMPUTE_PRESETS = os.environ.get("PRECOMPUTE_PRESETS", "")
+PRECOMPUTE_REFRESH = float(os.environ.get("PRECOMPUTE_REFRESH", 900))   # seconds
+PRECOMPUTE_MAX_AGE = float(os.environ.get("PRECOMPUTE_MAX_AGE", 1800))  # seconds
+# Budget: download threads per background scan, and the share of the fetch
+# scheduler's window background calls may hold (interactive calls go first)
+PRECOMPUTE_WORKERS = int(os.environ.get("PRECOMPUTE_WORKERS", 4))
+PRECOMPUTE_FETCH_SHARE = float(os.environ.get("PRECOMPUTE_FETCH_SHARE", 0.5))
+
+# ─── Resampled higher timeframes ──────────────────────────────────────────────
+# With derive_htf on, Daily / Weekly / Monthly come from ONE long daily download.
+# Set DERIVE_HTF=1 to make it the default for /api/scan.
+DERIVE_HTF = os.environ.get("DERIVE_HTF", "0") == "1"
+DAILY_BASE_PERIOD = "5y"
+RESAMPLE_RULES = {
+    "Weekly":  "W-MON",   # Yahoo labels weekly bars with the Monday of the week
+    "Monthly": "MS",      # … and monthly bars with the 1st of the month
+}
+
 NIFTY_50 = [
     "ADANIENT", "ADANIPORTS", "APOLLOHOSP", "ASIANPAINT", "AXISBANK", "BAJAJ-AUTO",
     "BAJFINANCE", "BAJAJFINSV", "BEL", "BHARTIARTL", "CIPLA", "COALINDIA", "DRREDDY",
@@ -148,6 +306,192 @@ PRESET_WATCHLISTS = {
     "Nifty 500":     [s + ".NS" for s in NIFTY_500],
 }
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# INSTRUMENTATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class Metrics:
+    """Process-wide Prometheus counters and histograms, cheap enough for the
+    hot path (one lock, a bisect per observation). render() produces the
+    text exposition format served on /metrics.
+
+    Every series carries the serving process's `pid` label: counters live in
+    one process, so if the app is ever run with several gunicorn workers
+    each scrape sees one of them — aggregate with sum without (pid).
+    screener_process_start_time_seconds marks restarts (counter resets)."""
+
+    def __init__(self, buckets=METRIC_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help = {}                 # name → (type, help)
+        self._counters = {}             # (name, labels) → value
+        self._histograms = {}           # (name, labels) → [bucket counts…, +Inf, sum]
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def inc(self, name, n=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def set(self, name, value, **labels):
+        """Gauge: overwrite the current value."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = value
+
+    def observe(self, name, value, n=1, **labels):
+        """Record `n` observations of `value` seconds."""
+        key = (name, tuple(sorted(labels.items())))
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            hist[slot] += n
+            hist[-1] += value * n
+
+    def render(self):
+        pid = (("pid", os.getpid()),)
+
+        def fmt(labels, extra=()):
+            items = list(pid) + list(labels) + list(extra)
+            return "{" + ",".join(f'{k}="{str(v)}"' for k, v in items) + "}"
+
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+        lines = []
+        for name, (kind, text) in sorted(self._help.items()):
+            lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+            if kind in ("counter", "gauge"):
+                for (n, labels), value in sorted(counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{fmt(labels)} {_sample(value)}")
+                continue
+            for (n, labels), hist in sorted(histograms.items()):
+                if n != name:
+                    continue
+                running = 0
+                for bound, count in zip(self.buckets + (float("inf"),), hist[:-1]):
+                    running += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', le)])} {running}")
+                lines.append(f"{name}_sum{fmt(labels)} {_sample(hist[-1])}")
+                lines.append(f"{name}_count{fmt(labels)} {running}")
+        return "\n".join(lines) + "\n"
+
+
+def _sample(value):
+    """A sample value in the exposition format, without losing precision:
+    ints as ints, floats as their shortest round-tripping repr."""
+    if isinstance(value, float):
+        if value != value:
+            return "NaN"
+        if value in (float("inf"), float("-inf")):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(int(value))
+
+
+METRICS = Metrics()
+METRICS.describe("screener_stage_seconds", "histogram",
+                 "Analytics time per symbol x timeframe task, by stage (queue = waiting for a worker).")
+METRICS.describe("screener_fetch_seconds", "histogram",
+                 "Provider calls: one bar download batch (history) or market-cap lookup (info).")
+METRICS.describe("screener_tasks_total", "counter",
+                 "Symbol x timeframe tasks by outcome: ok, empty (no data), short (too few bars), error.")
+METRICS.describe("screener_scan_seconds", "histogram", "Wall time of whole scans.")
+METRICS.describe("screener_scans_total", "counter", "Scans run.")
+METRICS.describe("screener_requests_total", "counter", "Requests issued to the data provider.")
+METRICS.describe("screener_fetch_retries_total", "counter",
+                 "Provider calls retried, by reason: throttled, error, missing (symbol left out of a bulk download).")
+METRICS.describe("screener_fetch_failures_total", "counter",
+                 "Provider calls that failed after every retry, by reason.")
+METRICS.describe("screener_precompute_scans_total", "counter",
+                 "Background re-scans of a preset's due timeframes.")
+METRICS.describe("screener_precompute_hits_total", "counter",
+                 "/api/scan requests answered from a precomputed preset snapshot.")
+METRICS.describe("screener_fetch_concurrency", "gauge",
+                 "Current adaptive concurrency window of the fetch scheduler.")
+METRICS.describe("screener_errors_total", "counter",
+                 "Unexpected exceptions caught and logged (with traceback), by where they were caught.")
+METRICS.describe("screener_process_start_time_seconds", "gauge",
+                 "Start time of the process serving these metrics (Unix seconds).")
+METRICS.set("screener_process_start_time_seconds", time.time())
+
+
+class StageClock:
+    """Splits one analytics task into named stages: lap(stage) charges the
+    time since the previous lap to `stage`. Plain data, so laps survive
+    the trip back from an analytics process."""
+
+    __slots__ = ("laps", "_start", "_last")
+
+    def __init__(self):
+        self.laps = {}
+        self._start = self._last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.laps[stage] = self.laps.get(stage, 0.0) + (now - self._last)
+        self._last = now
+
+    def report(self, outcomes):
+        """What an analytics-stage task hands back next to its results."""
+        return {"seconds": time.perf_counter() - self._start, "stages": self.laps,
+                "outcomes": outcomes}
+
+
+class _NullClock:
+    def lap(self, stage):
+        pass
+
+
+NULL_CLOCK = _NullClock()
+
+
+def min_bars(rsi_len, pivot_len):
+    """Shortest history analyze() evaluates; anything shorter is "short"."""
+    return rsi_len + pivot_len * 2 + 10
+
+
+def bars_outcome(n, rsi_len, pivot_len):
+    return "empty" if n == 0 else "short" if n < min_bars(rsi_len, pivot_len) else "ok"
+
+
+def record_task(stats, tf_label, report, waited=0.0):
+    """Feed one analytics task report into METRICS and the scan's stats.
+    Stage times of a batched task are spread evenly over its symbols."""
+    n = sum(report["outcomes"].values()) or 1
+    for stage, secs in report["stages"].items():
+        METRICS.observe("screener_stage_seconds", secs / n, n, stage=stage, timeframe=tf_label)
+    METRICS.observe("screener_stage_seconds", waited / n, n, stage="queue", timeframe=tf_label)
+    for outcome, count in report["outcomes"].items():
+        METRICS.inc("screener_tasks_total", count, timeframe=tf_label, outcome=outcome)
+    if stats is not None:
+        for stage, secs in report["stages"].items():
+            stats.add("seconds." + stage, secs)
+        stats.add("seconds.queue", waited)
+        for outcome, count in report["outcomes"].items():
+            stats.add("outcome." + outcome, count)
+
+
+def scan_timings(stats):
+    """Per-scan breakdown from record_task's stats: busy seconds per stage
+    (fetch and info are I/O; the rest summed over analytics workers) and
+    task counts per outcome."""
+    c = stats.as_dict()
+    stages = {"fetch": round(c.get("fetch_seconds", 0.0), 4)}
+    stages.update({k.split(".", 1)[1]: round(v, 4) for k, v in c.items() if k.startswith("seconds.")})
+    return {
+        "wall_s":   round(c.get("wall_seconds", 0.0), 4),
+        "stages":   stages,
+        "outcomes": {k.split(".", 1)[1]: v for k, v in c.items() if k.startswith("outcome.")},
+    }
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # CORE ANALYTICS
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -163,61 +507,69 @@ def calc_rsi(close, length=14):
     return 100.0 - (100.0 / (1.0 + rs))
 
 
+def pivot_mask(values, left=5, right=5):
+    """Boolean (pivot_high, pivot_low) masks along the last axis of a 1-D
+    series or a 2-D (series × bars) array.
+
+    Bar i is a pivot high when no other bar in [i-left, i+right] is >= it,
+    and a pivot low when none is <= it — the strict tie rule of TradingView
+    ta.pivothigh / ta.pivotlow. NaN compares False, exactly like the
+    original per-bar loops, so a NaN bar (RSI warm-up) never blocks a
+    neighbour and is itself reported. The first `left` and last `right`
+    bars are never pivots.
+
+    The window max / min are sliding_window_view reductions: O(n × (left +
+    right)) in NumPy, not a single O(n) monotonic-deque pass. With pivot
+    lengths of a few bars that is cheaper than a Python-level deque."""
+    v = np.asarray(values, dtype=float)
+    n = v.shape[-1]
+    is_ph = np.zeros(v.shape, dtype=bool)
+    is_pl = np.zeros(v.shape, dtype=bool)
+    if n < left + right + 1:
+        return is_ph, is_pl
+
+    center = v[..., left:n - right]
+    nan_c = np.isnan(center)
+
+    # Neighbours excluding the center: NaN never satisfies >= / <=, so it
+    # is replaced by the value that can never block a pivot.
+    hi = np.where(np.isnan(v), -np.inf, v)
+    lo = np.where(np.isnan(v), np.inf, v)
+    m = center.shape[-1]
+    max_nb = np.full(center.shape, -np.inf)
+    min_nb = np.full(center.shape, np.inf)
+    windows = np.lib.stride_tricks.sliding_window_view
+    if left > 0:
+        max_nb = np.maximum(max_nb, windows(hi, left, axis=-1)[..., :m, :].max(axis=-1))
+        min_nb = np.minimum(min_nb, windows(lo, left, axis=-1)[..., :m, :].min(axis=-1))
+    if right > 0:
+        max_nb = np.maximum(max_nb, windows(hi[..., left + 1:], right, axis=-1)[..., :m, :].max(axis=-1))
+        min_nb = np.minimum(min_nb, windows(lo[..., left + 1:], right, axis=-1)[..., :m, :].min(axis=-1))
+
+    is_ph[..., left:n - right] = nan_c | (center > max_nb)
+    is_pl[..., left:n - right] = nan_c | (center < min_nb)
+    return is_ph, is_pl
+
+
+def pivot_indices(values, left=5, right=5):
+    """Return (pivot_high_idx, pivot_low_idx) for a single series.
+    Shared pivot engine for price and RSI — see pivot_mask for the rules."""
+    is_ph, is_pl = pivot_mask(values, left, right)
+    return np.flatnonzero(is_ph).tolist(), np.flatnonzero(is_pl).tolist()
+
+
 def find_pivots(highs, lows, left=5, right=5):
     """Return indices of confirmed pivot highs and pivot lows on PRICE.
     Used for Order Block detection."""
-    n = len(highs)
-    ph_idx, pl_idx = [], []
-    h = highs.values
-    l = lows.values
-
-    for i in range(left, n - right):
-        is_ph = True
-        for j in range(i - left, i + right + 1):
-            if j != i and h[j] >= h[i]:
-                is_ph = False
-                break
-        if is_ph:
-            ph_idx.append(i)
-
-        is_pl = True
-        for j in range(i - left, i + right + 1):
-            if j != i and l[j] <= l[i]:
-                is_pl = False
-                break
-        if is_pl:
-            pl_idx.append(i)
-
+    ph_idx, _ = pivot_indices(highs, left, right)
+    _, pl_idx = pivot_indices(lows, left, right)
     return ph_idx, pl_idx
 
 
 def find_rsi_pivots(rsi_values, left=5, right=5):
     """Return indices of confirmed pivot highs and pivot lows on RSI.
     Matches TradingView: ta.pivothigh(osc, lbL, lbR) / ta.pivotlow(osc, lbL, lbR)"""
-    n = len(rsi_values)
-    ph_idx, pl_idx = [], []
-    r = rsi_values.values
-
-    for i in range(left, n - right):
-        # RSI Pivot High
-        is_ph = True
-        for j in range(i - left, i + right + 1):
-            if j != i and r[j] >= r[i]:
-                is_ph = False
-                break
-        if is_ph:
-            ph_idx.append(i)
-
-        # RSI Pivot Low
-        is_pl = True
-        for j in range(i - left, i + right + 1):
-            if j != i and r[j] <= r[i]:
-                is_pl = False
-                break
-        if is_pl:
-            pl_idx.append(i)
-
-    return ph_idx, pl_idx
+    return pivot_indices(rsi_values, left, right)
 
 
 def detect_divergences(df, rsi, rsi_ph_idx, rsi_pl_idx, range_lower=5, range_upper=60):
@@ -273,54 +625,121 @@ def detect_order_blocks(df, ph_idx, pl_idx):
     Bearish OB  → last bullish candle before price breaks below a pivot low.
     Returns two lists of dicts: [{high, low, bar, breakout_bar}, …]
     """
-    c = df["Close"].values
-    o = df["Open"].values
-    h = df["High"].values
-    l = df["Low"].values
-    n = len(df)
+    return order_blocks(df["Open"].values, df["High"].values, df["Low"].values,
+                        df["Close"].values, ph_idx, pl_idx)
 
-    ph_set = set(ph_idx)
-    pl_set = set(pl_idx)
 
-    last_ph_val = None
-    last_pl_val = None
-    bull_obs, bear_obs = [], []
+def _last_index(mask):
+    """Index of the latest True at or before each position (-1 before the first)."""
+    return np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1))
 
-    for i in range(n):
-        if i in ph_set:
-            last_ph_val = h[i]
-        if i in pl_set:
-            last_pl_val = l[i]
 
-        if i == 0:
-            continue
+def _breakouts(level, prev_level_ok, candle, n):
+    """Bars i ≥ 1 where `prev_level_ok[i]` and the latest `candle` bar before i
+    is at most 29 bars back → (i, j) arrays."""
+    last = np.full(n, -1)
+    last[1:] = _last_index(candle)[:-1]
+    hit = level & prev_level_ok & (last >= np.maximum(np.arange(n) - 29, 0))
+    hit[0] = False
+    i = np.flatnonzero(hit)
+    return i, last[i]
 
-        # Break above pivot high → bullish OB
-        if last_ph_val is not None and h[i] > last_ph_val and h[i - 1] <= last_ph_val:
-            for j in range(i - 1, max(i - 30, -1), -1):
-                if c[j] < o[j]:  # bearish candle
-                    bull_obs.append({"high": float(h[j]), "low": float(l[j]),
-                                     "bar": j, "breakout": i})
-                    break
 
-        # Break below pivot low → bearish OB
-        if last_pl_val is not None and l[i] < last_pl_val and l[i - 1] >= last_pl_val:
-            for j in range(i - 1, max(i - 30, -1), -1):
-                if c[j] > o[j]:  # bullish candle
-                    bear_obs.append({"high": float(h[j]), "low": float(l[j]),
-                                     "bar": j, "breakout": i})
-                    break
+def order_blocks(o, h, l, c, ph_idx, pl_idx):
+    """detect_order_blocks on plain OHLC arrays.
+
+    Vectorized: the last pivot high / low value is forward-filled to every
+    bar, breakouts are two array comparisons against it, and the OB candle
+    is read from a "last bearish / bullish bar so far" index array instead
+    of scanning back up to 29 candles per break."""
+    o, h, l, c = (np.asarray(a, dtype=np.float64) for a in (o, h, l, c))
+    n = len(c)
+    if n < 2:
+        return [], []
+
+    def ffill_level(idx, values):
+        mask = np.zeros(n, dtype=bool)
+        mask[np.asarray(idx, dtype=np.int64)] = True
+        last = _last_index(mask)
+        return np.where(last >= 0, values[np.maximum(last, 0)], np.nan)
+
+    # NaN (no pivot yet) fails every comparison, like the `is not None` guard
+    ph_val = ffill_level(ph_idx, h)
+    pl_val = ffill_level(pl_idx, l)
+    prev_h = np.concatenate(([np.nan], h[:-1]))
+    prev_l = np.concatenate(([np.nan], l[:-1]))
 
+    # Break above pivot high → bullish OB at the last bearish candle
+    bull_i, bull_j = _breakouts(h > ph_val, prev_h <= ph_val, c < o, n)
+    # Break below pivot low → bearish OB at the last bullish candle
+    bear_i, bear_j = _breakouts(l < pl_val, prev_l >= pl_val, c > o, n)
+
+    bull_obs = [{"high": float(h[j]), "low": float(l[j]), "bar": int(j), "breakout": int(i)}
+                for i, j in zip(bull_i, bull_j)]
+    bear_obs = [{"high": float(h[j]), "low": float(l[j]), "bar": int(j), "breakout": int(i)}
+                for i, j in zip(bear_i, bear_j)]
     return bull_obs, bear_obs
 
 
+class OBZones:
+    """The last OB_LOOKBACK order blocks of one side in sorted arrays, so the
+    proximity and breakout checks are binary searches. Build once per
+    symbol × timeframe and query with as many thresholds as needed."""
+
+    def __init__(self, ob_list, lookback=None):
+        self.obs = ob_list[-(lookback or OB_LOOKBACK):]
+        mids = [(ob["high"] + ob["low"]) / 2.0 for ob in self.obs]
+        # positions sorted by midpoint (zones without a positive mid are never near)
+        self.by_mid = sorted((k for k, m in enumerate(mids) if m > 0), key=mids.__getitem__)
+        self.mids = [mids[k] for k in self.by_mid]
+        # positions sorted by high / low (NaN zones can never confirm)
+        by_high = sorted((k for k, ob in enumerate(self.obs) if ob["high"] == ob["high"]),
+                         key=lambda k: self.obs[k]["high"])
+        by_low = sorted((k for k, ob in enumerate(self.obs) if ob["low"] == ob["low"]),
+                        key=lambda k: self.obs[k]["low"])
+        self.highs = [self.obs[k]["high"] for k in by_high]
+        self.lows = [self.obs[k]["low"] for k in by_low]
+        # newest OB among the k lowest highs / among the highest lows from k on
+        self.newest_upto = list(itertools.accumulate(by_high, max))
+        self.newest_from = list(itertools.accumulate(reversed(by_low), max))[::-1]
+
+    def __len__(self):
+        return len(self.obs)
+
+    def near(self, price, threshold):
+        """check_proximity: |price − mid| / mid is smallest at the mids
+        bracketing price, so only those two are tested."""
+        k = bisect.bisect_left(self.mids, price)
+        return any(abs(price - mid) / mid <= threshold for mid in self.mids[max(k - 1, 0):k + 1])
+
+    def nearest(self, price, threshold):
+        """The OB whose mid is closest to price, if near(price, threshold), else None."""
+        k = bisect.bisect_left(self.mids, price)
+        dist = {j: abs(price - self.mids[j]) / self.mids[j]
+                for j in range(max(k - 1, 0), min(k + 1, len(self.mids)))}
+        j = min(dist, key=dist.get, default=None)
+        return self.obs[self.by_mid[j]] if j is not None and dist[j] <= threshold else None
+
+    def breakout(self, price, confirm_pct, ob_type):
+        """check_ob_breakout → (confirmed, newest confirming OB or None)."""
+        if price != price:
+            return False, None
+        if not 0.0 <= confirm_pct < 1.0:
+            return _scan_breakout(price, self.obs, confirm_pct, ob_type)
+        if ob_type == "bullish":
+            k = bisect.bisect_right(self.highs, price, key=lambda x: x * (1.0 + confirm_pct))
+            if k:
+                return True, self.obs[self.newest_upto[k - 1]]
+        elif ob_type == "bearish":
+            k = bisect.bisect_left(self.lows, price, key=lambda x: x * (1.0 - confirm_pct))
+            if k < len(self.lows):
+                return True, self.obs[self.newest_from[k]]
+        return False, None
+
+
 def check_proximity(price, ob_list, threshold):
     """True if price is within threshold% of any recent OB midpoint."""
-    for ob in reversed(ob_list[-10:]):
-        mid = (ob["high"] + ob["low"]) / 2.0
-        if mid > 0 and abs(price - mid) / mid <= threshold:
-            return True
-    return False
+    return OBZones(ob_list).near(price, threshold)
 
 
 def check_ob_breakout(price, ob_list, confirm_pct, ob_type):
@@ -335,7 +754,12 @@ def check_ob_breakout(price, ob_list, confirm_pct, ob_type):
 
     Returns (confirmed: bool, ob_dict or None)
     """
-    for ob in reversed(ob_list[-10:]):
+    return OBZones(ob_list).breakout(price, confirm_pct, ob_type)
+
+
+def _scan_breakout(price, ob_list, confirm_pct, ob_type):
+    """Linear check_ob_breakout, for confirm_pct outside [0, 1)."""
+    for ob in reversed(ob_list):
         if ob_type == "bullish":
             # Bullish OB (red candle) → price must close above OB high + X%
             target = ob["high"] * (1.0 + confirm_pct)
@@ -349,233 +773,3403 @@ def check_ob_breakout(price, ob_list, confirm_pct, ob_type):
     return False, None
 
 
+def divergence_signal(last_div, threshold):
+    """Pick the most recent divergence at or after `threshold`.
+    last_div maps reg_bull / hid_bull / reg_bear / hid_bear → bar index of
+    the latest divergence of that kind (or None). Returns (signal, div_type)."""
+    candidates = []
+    for key, sig, kind in (("reg_bull", "Bullish", "Regular"), ("hid_bull", "Bullish", "Hidden"),
+                           ("reg_bear", "Bearish", "Regular"), ("hid_bear", "Bearish", "Hidden")):
+        idx = last_div.get(key)
+        if idx is not None and idx >= threshold:
+            candidates.append((sig, kind, idx))
+
+    if not candidates:
+        return "None", ""
+    candidates.sort(key=lambda x: -x[2])
+    return candidates[0][0], candidates[0][1]
+
+
+def build_result(symbol, tf_label, signal, div_type, bull_obs, bear_obs,
+                 current_close, current_rsi, ob_prox_pct,
+                 rsi_div_on=True, ob_on=True, ob_confirm_pct=0.0, mcap=None):
+    """OB proximity / breakout checks and validation → scan_one's result dict,
+    or None when nothing was found for the active features. bull_obs /
+    bear_obs are OB lists or prebuilt OBZones."""
+    near_bull_ob = False
+    near_bear_ob = False
+    ob_confirmed = False
+    ob_confirm_dir = None
+    ob_confirm_zone = None
+
+    if not isinstance(bull_obs, OBZones):
+        bull_obs = OBZones(bull_obs)
+    if not isinstance(bear_obs, OBZones):
+        bear_obs = OBZones(bear_obs)
+
+    if ob_on:
+        near_bull_ob = bull_obs.near(current_close, ob_prox_pct)
+        near_bear_ob = bear_obs.near(current_close, ob_prox_pct)
+
+        # OB Breakout Confirmation
+        if ob_confirm_pct > 0:
+            # Bullish OB (red candle) → price closed above high + X%
+            bull_conf, bull_conf_ob = bull_obs.breakout(current_close, ob_confirm_pct, "bullish")
+            # Bearish OB (green candle) → price closed below low − X%
+            bear_conf, bear_conf_ob = bear_obs.breakout(current_close, ob_confirm_pct, "bearish")
+
+            if bull_conf and bull_conf_ob:
+                ob_confirmed = True
+                ob_confirm_dir = "Bullish"
+                ob_confirm_zone = f"{bull_conf_ob['low']:.2f} – {bull_conf_ob['high']:.2f}"
+            if bear_conf and bear_conf_ob:
+                ob_confirmed = True
+                ob_confirm_dir = "Bearish"
+                ob_confirm_zone = f"{bear_conf_ob['low']:.2f} – {bear_conf_ob['high']:.2f}"
+
+    # ── Validation logic ──
+    validated = False
+    if rsi_div_on and ob_on:
+        # Both ON → original logic: divergence + near OB
+        if signal == "Bullish" and near_bull_ob:
+            validated = True
+        elif signal == "Bearish" and near_bear_ob:
+            validated = True
+    elif rsi_div_on and not ob_on:
+        # Only RSI → any divergence = validated
+        validated = signal != "None"
+    elif not rsi_div_on and ob_on:
+        # Only OB → near any OB = validated
+        validated = near_bull_ob or near_bear_ob
+        if near_bull_ob and not near_bear_ob:
+            signal = "Bullish"
+        elif near_bear_ob and not near_bull_ob:
+            signal = "Bearish"
+        elif near_bull_ob and near_bear_ob:
+            signal = "Bullish"  # default to bullish if both
+
+    # Skip if nothing found based on active features
+    if not rsi_div_on and not ob_on:
+        return None
+    if rsi_div_on and not ob_on and signal == "None":
+        return None
+    if not rsi_div_on and ob_on and not (near_bull_ob or near_bear_ob):
+        return None
+
+    # OB zone details
+    ob_zone = None
+    if ob_on and (near_bull_ob or near_bear_ob):
+        if (signal == "Bullish" or near_bull_ob) and bull_obs:
+            ob = bull_obs.obs[-1]
+            ob_zone = f"{ob['low']:.2f} – {ob['high']:.2f}"
+        elif (signal == "Bearish" or near_bear_ob) and bear_obs:
+            ob = bear_obs.obs[-1]
+            ob_zone = f"{ob['low']:.2f} – {ob['high']:.2f}"
+
+    # The OB price actually sits near: the signal's side when both are near
+    ob_side = ob_range = None
+    sides = [("Bullish", near_bull_ob, bull_obs), ("Bearish", near_bear_ob, bear_obs)]
+    for side, near, zones in sides[::-1] if signal == "Bearish" else sides:
+        if near:
+            ob = zones.nearest(current_close, ob_prox_pct)
+            ob_side, ob_range = side, [round(float(ob["low"]), 2), round(float(ob["high"]), 2)]
+            break
+
+    return {
+        "symbol":        symbol,
+        "timeframe":     tf_label,
+        "signal":        signal,
+        "div_type":      div_type,
+        "validated":     validated,
+        "near_ob":       near_bull_ob or near_bear_ob,
+        "rsi":           round(current_rsi, 1),
+        "price":         round(current_close, 2),
+        "ob_zone":       ob_zone,
+        "ob_side":       ob_side,
+        "ob_range":      ob_range,
+        "mcap":          mcap,
+        "ob_confirmed":  ob_confirmed,
+        "ob_confirm_dir": ob_confirm_dir,
+        "ob_confirm_zone": ob_confirm_zone,
+    }
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
-# SCANNER
+# INCREMENTAL ENGINE
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def fetch_data(symbol, interval, period):
-    """Fetch OHLCV data via yf.Ticker (thread-safe, unlike yf.download)."""
-    ticker = yf.Ticker(symbol)
-    df = ticker.history(interval=interval, period=period, auto_adjust=True)
-    if df.empty:
-        return None, None
-    # Ensure standard column names
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.droplevel(1)
-    # Market cap
-    try:
-        mcap = ticker.info.get("marketCap")
-    except Exception:
-        mcap = None
-    return df, mcap
+def _ob_step(ob, idx, o, h, l, c, is_ph, is_pl):
+    """detect_order_blocks() loop body for bar idx on a running OB state."""
+    if is_ph:
+        ob["last_ph"], ob["ph_at"] = h, idx
+    if is_pl:
+        ob["last_pl"], ob["pl_at"] = l, idx
+    if idx > 0:
+        first = max(idx - 29, 0)        # detect_order_blocks looks back 29 candles
+        if ob["last_ph"] is not None and h > ob["last_ph"] and ob["prev_high"] <= ob["last_ph"]:
+            bear = ob["last_bear"]
+            if bear is not None and bear[0] >= first:
+                ob["bull"].append({"high": bear[1], "low": bear[2], "bar": bear[0], "breakout": idx,
+                                   "pivot": ob["ph_at"]})
+                del ob["bull"][:-OB_LOOKBACK]
+        if ob["last_pl"] is not None and l < ob["last_pl"] and ob["prev_low"] >= ob["last_pl"]:
+            bull = ob["last_bull"]
+            if bull is not None and bull[0] >= first:
+                ob["bear"].append({"high": bull[1], "low": bull[2], "bar": bull[0], "breakout": idx,
+                                   "pivot": ob["pl_at"]})
+                del ob["bear"][:-OB_LOOKBACK]
+    if c < o:
+        ob["last_bear"] = [idx, h, l]
+    elif c > o:
+        ob["last_bull"] = [idx, h, l]
+    ob["prev_high"] = h
+    ob["prev_low"] = l
 
 
-def scan_one(symbol, tf_label, rsi_len, pivot_len, ob_prox_pct,
-             rsi_div_on=True, ob_on=True, ob_confirm_pct=0.0):
-    """Scan a single symbol × timeframe. Returns a result dict.
-    rsi_div_on: enable RSI divergence detection
-    ob_on: enable Order Block detection
-    ob_confirm_pct: OB breakout confirmation % (0 = off)"""
-    cfg = TF_CONFIG[tf_label]
-    try:
-        df, mcap = fetch_data(symbol, cfg["interval"], cfg["period"])
-        if df is None or df.empty:
-            return None
+def _is_pivot(values, center, high):
+    """pivot_indices() rule for one window: NaN never blocks and is a pivot."""
+    v = values[center]
+    if v != v:
+        return True
+    for j, x in enumerate(values):
+        if j != center and (x >= v if high else x <= v):
+            return False
+    return True
 
-        needed = rsi_len + pivot_len * 2 + 10
-        if len(df) < needed:
-            return None
 
-        # RSI (always calculated for display)
-        rsi = calc_rsi(df["Close"], rsi_len)
-        current_close = float(df["Close"].iloc[-1])
-        current_rsi = float(rsi.iloc[-1]) if not np.isnan(rsi.iloc[-1]) else 0.0
+class SignalState:
+    """Running RSI / pivot / order-block state for one symbol × timeframe.
+
+    update() consumes one closed bar in O(pivot_len) time; emit() returns the
+    dict analyze() would return for all bars consumed so far. It holds the
+    pandas-ewm RSI accumulators, the last 2·pivot_len+2 bars (pending pivot
+    windows), the last confirmed RSI pivot high/low, the latest index of
+    each divergence kind (and of the pivot it pairs with) and the OB
+    detector state with its last OB_LOOKBACK OBs. trimmed() drops what
+    falls out of the period window analyze() sees.
+    to_dict() / from_dict() make it JSON-serializable."""
+
+    def __init__(self, rsi_len=14, pivot_len=5):
+        self.rsi_len = rsi_len
+        self.pivot_len = pivot_len
+        self.n = 0
+        self.last_ts = None
+        # calc_rsi: ewm(com=rsi_len-1, adjust=True) of gains / losses
+        self.prev_close = None
+        self.avg_gain = float("nan")
+        self.avg_loss = float("nan")
+        self.ewm_wt = 1.0
+        self.ewm_nobs = 0
+        # recent bars: [idx, open, high, low, close, rsi]
+        self.window = []
+        # last confirmed RSI pivots: [idx, rsi, high] / [idx, rsi, low]
+        self.rsi_ph = None
+        self.rsi_pl = None
+        self.last_div = {"reg_bull": None, "hid_bull": None, "reg_bear": None, "hid_bear": None}
+        self.div_from = dict.fromkeys(self.last_div)     # earlier pivot of each pair
+        # OB detector, final up to bar n-1-pivot_len (pivots there are confirmed)
+        self.ob = {"last_ph": None, "last_pl": None, "ph_at": None, "pl_at": None,
+                   "last_bear": None, "last_bull": None,
+                   "prev_high": None, "prev_low": None, "bull": [], "bear": []}
+        self.ob_keep = OB_LOOKBACK
+
+    # ── persistence ──
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls.__new__(cls)
+        state.__dict__.update(data)
+        return state
+
+    def copy(self):
+        state = SignalState.from_dict(self.to_dict())
+        state.window = [list(b) for b in self.window]
+        state.last_div = dict(self.last_div)
+        state.div_from = dict(self.div_from)
+        state.ob = dict(self.ob, bull=list(self.ob["bull"]), bear=list(self.ob["bear"]))
+        return state
+
+    def trimmed(self, first):
+        """The state as analyze() would see it on a frame starting at bar
+        `first`: no OB candles before it, no price pivots (nor OBs broken out
+        of them) among its first pivot_len bars and no RSI pivots (or divergence pairs reaching back)
+        into its RSI warm-up, where analyze()'s RSI is still NaN. Returns
+        self when nothing is dropped, else a trimmed copy."""
+        rsi_from = first + max(self.pivot_len, self.rsi_len)
+        px_from = first + self.pivot_len
+        ob = self.ob
+
+        def old(idx, limit):
+            return idx is not None and idx < limit
+
+        if not (any(old(i, rsi_from) for i in self.div_from.values())
+                or any(p is not None and old(p[0], rsi_from) for p in (self.rsi_ph, self.rsi_pl))
+                or old(ob["ph_at"], px_from) or old(ob["pl_at"], px_from)
+                or any(c is not None and old(c[0], first) for c in (ob["last_bear"], ob["last_bull"]))
+                or any(old(x["bar"], first) or old(x["pivot"], px_from)
+                       for x in ob["bull"] + ob["bear"])):
+            return self
+        state = self.copy()
+        for key, start in state.div_from.items():
+            if old(start, rsi_from):
+                state.last_div[key] = state.div_from[key] = None
+        if state.rsi_ph is not None and old(state.rsi_ph[0], rsi_from):
+            state.rsi_ph = None
+        if state.rsi_pl is not None and old(state.rsi_pl[0], rsi_from):
+            state.rsi_pl = None
+        ob = state.ob
+        if old(ob["ph_at"], px_from):
+            ob["last_ph"] = ob["ph_at"] = None
+        if old(ob["pl_at"], px_from):
+            ob["last_pl"] = ob["pl_at"] = None
+        for side in ("last_bear", "last_bull"):
+            if ob[side] is not None and old(ob[side][0], first):
+                ob[side] = None
+        for side in ("bull", "bear"):
+            ob[side] = [x for x in ob[side] if not (old(x["bar"], first) or old(x["pivot"], px_from))]
+        return state
+
+    @property
+    def last_close(self):
+        return self.window[-1][4] if self.window else None
 
-        # ── RSI Divergence ──
-        signal = "None"
-        div_type = ""
-        has_reg_bull = has_hid_bull = has_reg_bear = has_hid_bear = False
+    # ── bar consumption ──
+    def _rsi_step(self, close):
+        if self.prev_close is None:
+            self.prev_close = close
+            return float("nan")
+        delta = close - self.prev_close
+        self.prev_close = close
+        gain = delta if delta > 0 else 0.0
+        loss = -(delta if delta < 0 else 0.0)
+        if self.ewm_nobs == 0:
+            self.avg_gain, self.avg_loss = gain, loss
+        else:
+            # same recursion and operation order as pandas' ewm(adjust=True)
+            self.ewm_wt *= 1.0 - 1.0 / self.rsi_len
+            if self.avg_gain != gain:
+                self.avg_gain = (self.ewm_wt * self.avg_gain + 1.0 * gain) / (self.ewm_wt + 1.0)
+            if self.avg_loss != loss:
+                self.avg_loss = (self.ewm_wt * self.avg_loss + 1.0 * loss) / (self.ewm_wt + 1.0)
+            self.ewm_wt += 1.0
+        self.ewm_nobs += 1
+        if self.ewm_nobs < self.rsi_len:
+            return float("nan")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rs = np.float64(self.avg_gain) / np.float64(self.avg_loss)
+            return float(100.0 - (100.0 / (1.0 + rs)))
 
+    def update(self, ts, o, h, l, c):
+        """Consume one closed bar."""
+        o, h, l, c = float(o), float(h), float(l), float(c)
+        idx = self.n
+        rsi = self._rsi_step(c)
+        self.window.append([idx, o, h, l, c, rsi])
+        del self.window[:-(2 * self.pivot_len + 2)]
+        self.n += 1
+        self.last_ts = ts
+
+        left = right = self.pivot_len
+        cidx = idx - right
+        if cidx < 0:
+            return
+        bars = self.window[-(left + right + 1):]
+        center = len(bars) - 1 - right
+        bar = bars[center]
+        is_ph = is_pl = False
+        if cidx >= left:
+            rsis = [b[5] for b in bars]
+            if _is_pivot(rsis, center, high=True):
+                if self.rsi_ph is not None and 5 <= cidx - self.rsi_ph[0] <= 60:
+                    _, pr, ph = self.rsi_ph
+                    if bar[2] > ph and bar[5] < pr:
+                        self.last_div["reg_bear"], self.div_from["reg_bear"] = cidx, self.rsi_ph[0]
+                    if bar[2] < ph and bar[5] > pr:
+                        self.last_div["hid_bear"], self.div_from["hid_bear"] = cidx, self.rsi_ph[0]
+                self.rsi_ph = [cidx, bar[5], bar[2]]
+            if _is_pivot(rsis, center, high=False):
+                if self.rsi_pl is not None and 5 <= cidx - self.rsi_pl[0] <= 60:
+                    _, pr, pl = self.rsi_pl
+                    if bar[3] < pl and bar[5] > pr:
+                        self.last_div["reg_bull"], self.div_from["reg_bull"] = cidx, self.rsi_pl[0]
+                    if bar[3] > pl and bar[5] < pr:
+                        self.last_div["hid_bull"], self.div_from["hid_bull"] = cidx, self.rsi_pl[0]
+                self.rsi_pl = [cidx, bar[5], bar[3]]
+            is_ph = _is_pivot([b[2] for b in bars], center, high=True)
+            is_pl = _is_pivot([b[3] for b in bars], center, high=False)
+        _ob_step(self.ob, cidx, bar[1], bar[2], bar[3], bar[4], is_ph, is_pl)
+
+    # ── output ──
+    def emit(self, symbol, tf_label, ob_prox_pct, rsi_div_on=True, ob_on=True,
+             ob_confirm_pct=0.0, mcap=None):
+        """analyze()'s result for the bars consumed so far."""
+        if self.n < self.rsi_len + self.pivot_len * 2 + 10:
+            return None
+        last = self.window[-1]
+        current_close = last[4]
+        current_rsi = last[5] if last[5] == last[5] else 0.0
+
+        signal, div_type = "None", ""
         if rsi_div_on:
-            rsi_ph_idx, rsi_pl_idx = find_rsi_pivots(rsi, pivot_len, pivot_len)
-            if len(rsi_ph_idx) >= 2 or len(rsi_pl_idx) >= 2:
-                reg_bull, reg_bear, hid_bull, hid_bear = detect_divergences(
-                    df, rsi, rsi_ph_idx, rsi_pl_idx, range_lower=5, range_upper=60
-                )
-                threshold = len(df) - pivot_len * 5
-                has_reg_bull = len(reg_bull) > 0 and reg_bull[-1] >= threshold
-                has_hid_bull = len(hid_bull) > 0 and hid_bull[-1] >= threshold
-                has_reg_bear = len(reg_bear) > 0 and reg_bear[-1] >= threshold
-                has_hid_bear = len(hid_bear) > 0 and hid_bear[-1] >= threshold
-
-        candidates = []
-        if has_reg_bull:
-            candidates.append(("Bullish", "Regular", reg_bull[-1]))
-        if has_hid_bull:
-            candidates.append(("Bullish", "Hidden", hid_bull[-1]))
-        if has_reg_bear:
-            candidates.append(("Bearish", "Regular", reg_bear[-1]))
-        if has_hid_bear:
-            candidates.append(("Bearish", "Hidden", hid_bear[-1]))
-
-        if candidates:
-            candidates.sort(key=lambda x: -x[2])
-            signal = candidates[0][0]
-            div_type = candidates[0][1]
-
-        # ── Order Blocks ──
-        near_bull_ob = False
-        near_bear_ob = False
-        bull_obs, bear_obs = [], []
-        ob_confirmed = False
-        ob_confirm_dir = None
-        ob_confirm_zone = None
+            signal, div_type = divergence_signal(self.last_div, self.n - self.pivot_len * 5)
 
+        bull_obs, bear_obs = [], []
         if ob_on:
-            price_ph_idx, price_pl_idx = find_pivots(df["High"], df["Low"], pivot_len, pivot_len)
-            bull_obs, bear_obs = detect_order_blocks(df, price_ph_idx, price_pl_idx)
-            near_bull_ob = check_proximity(current_close, bull_obs, ob_prox_pct)
-            near_bear_ob = check_proximity(current_close, bear_obs, ob_prox_pct)
-
-            # OB Breakout Confirmation
-            if ob_confirm_pct > 0:
-                # Bullish OB (red candle) → price closed above high + X%
-                bull_conf, bull_conf_ob = check_ob_breakout(
-                    current_close, bull_obs, ob_confirm_pct, "bullish")
-                # Bearish OB (green candle) → price closed below low − X%
-                bear_conf, bear_conf_ob = check_ob_breakout(
-                    current_close, bear_obs, ob_confirm_pct, "bearish")
-
-                if bull_conf and bull_conf_ob:
-                    ob_confirmed = True
-                    ob_confirm_dir = "Bullish"
-                    ob_confirm_zone = f"{bull_conf_ob['low']:.2f} – {bull_conf_ob['high']:.2f}"
-                if bear_conf and bear_conf_ob:
-                    ob_confirmed = True
-                    ob_confirm_dir = "Bearish"
-                    ob_confirm_zone = f"{bear_conf_ob['low']:.2f} – {bear_conf_ob['high']:.2f}"
-
-        # ── Validation logic ──
-        validated = False
-        if rsi_div_on and ob_on:
-            # Both ON → original logic: divergence + near OB
-            if signal == "Bullish" and near_bull_ob:
-                validated = True
-            elif signal == "Bearish" and near_bear_ob:
-                validated = True
-        elif rsi_div_on and not ob_on:
-            # Only RSI → any divergence = validated
-            validated = signal != "None"
-        elif not rsi_div_on and ob_on:
-            # Only OB → near any OB = validated
-            validated = near_bull_ob or near_bear_ob
-            if near_bull_ob and not near_bear_ob:
-                signal = "Bullish"
-            elif near_bear_ob and not near_bull_ob:
-                signal = "Bearish"
-            elif near_bull_ob and near_bear_ob:
-                signal = "Bullish"  # default to bullish if both
-
-        # Skip if nothing found based on active features
-        if not rsi_div_on and not ob_on:
-            return None
-        if rsi_div_on and not ob_on and signal == "None":
-            return None
-        if not rsi_div_on and ob_on and not (near_bull_ob or near_bear_ob):
-            return None
+            # The newest pivot_len bars can't be pivots yet — run them through
+            # the OB detector on a scratch copy, exactly as analyze() sees them.
+            ob = dict(self.ob, bull=list(self.ob["bull"]), bear=list(self.ob["bear"]))
+            for b in self.window[-self.pivot_len:] if self.pivot_len else []:
+                if b[0] > self.n - 1 - self.pivot_len:
+                    _ob_step(ob, b[0], b[1], b[2], b[3], b[4], False, False)
+            bull_obs, bear_obs = ob["bull"], ob["bear"]
 
-        # OB zone details
-        ob_zone = None
-        if ob_on and (near_bull_ob or near_bear_ob):
-            if (signal == "Bullish" or near_bull_ob) and bull_obs:
-                ob = bull_obs[-1]
-                ob_zone = f"{ob['low']:.2f} – {ob['high']:.2f}"
-            elif (signal == "Bearish" or near_bear_ob) and bear_obs:
-                ob = bear_obs[-1]
-                ob_zone = f"{ob['low']:.2f} – {ob['high']:.2f}"
+        return build_result(symbol, tf_label, signal, div_type, bull_obs, bear_obs,
+                            current_close, current_rsi, ob_prox_pct,
+                            rsi_div_on, ob_on, ob_confirm_pct, mcap)
 
-        return {
-            "symbol":        symbol,
-            "timeframe":     tf_label,
-            "signal":        signal,
-            "div_type":      div_type,
-            "validated":     validated,
-            "near_ob":       near_bull_ob or near_bear_ob,
-            "rsi":           round(current_rsi, 1),
-            "price":         round(current_close, 2),
-            "ob_zone":       ob_zone,
-            "mcap":          mcap,
-            "ob_confirmed":  ob_confirmed,
-            "ob_confirm_dir": ob_confirm_dir,
-            "ob_confirm_zone": ob_confirm_zone,
-        }
 
-    except Exception:
-        traceback.print_exc()
-        return None
+# ═══════════════════════════════════════════════════════════════════════════════
+# BATCHED ANALYTICS
+# ═══════════════════════════════════════════════════════════════════════════════
 
+def stack_bars(frames):
+    """Right-align OHLC series of different lengths into (series × bars)
+    float64 matrices, NaN-padded on the left so the last bar of every
+    series sits in the last column. `frames` are DataFrames or to_bars()
+    arrays. Returns ({"Open": M, "High": M, "Low": M, "Close": M}, lengths)."""
+    lengths = np.array([len(f["Close"]) for f in frames], dtype=np.int64)
+    width = int(lengths.max()) if len(frames) else 0
+    mats = {}
+    for col in ("Open", "High", "Low", "Close"):
+        m = np.full((len(frames), width), np.nan)
+        for k, f in enumerate(frames):
+            if lengths[k]:
+                m[k, width - lengths[k]:] = np.asarray(f[col], dtype=np.float64)
+        mats[col] = m
+    return mats, lengths
 
-def run_scan(symbols, timeframes, rsi_len, pivot_len, ob_prox_pct,
-             rsi_div_on=True, ob_on=True, ob_confirm_pct=0.0):
-    """Scan all symbols × timeframes in parallel."""
-    tasks = []
-    for sym in symbols:
-        for tf in timeframes:
-            tasks.append((sym, tf))
 
-    results = []
-    with ThreadPoolExecutor(max_workers=20) as pool:
-        futures = {
-            pool.submit(scan_one, sym, tf, rsi_len, pivot_len, ob_prox_pct,
-                        rsi_div_on, ob_on, ob_confirm_pct): (sym, tf)
-            for sym, tf in tasks
-        }
-        for future in as_completed(futures):
-            r = future.result()
-            if r is not None:
-                results.append(r)
+def _last_divergences(piv, price, rsi, range_lower=5, range_upper=60):
+    """Column of the latest divergence per row at the pivots in `piv`, or -1.
+    Each pivot is paired with the previous one in its row (forward-filled
+    pivot column), the way detect_divergences walks consecutive pivots.
+    Returns (price down + RSI up, price up + RSI down): regular / hidden
+    bullish at pivot lows, hidden / regular bearish at pivot highs."""
+    cols = np.arange(piv.shape[1])
+    last = np.maximum.accumulate(np.where(piv, cols, -1), axis=1)
+    prev = np.full_like(last, -1)
+    prev[:, 1:] = last[:, :-1]
+    dist = cols - prev
+    pair = piv & (prev >= 0) & (dist >= range_lower) & (dist <= range_upper)
 
-    # Sort: validated signals first, then by symbol
-    results.sort(key=lambda x: (not x["validated"], x["signal"] == "None", x["symbol"], x["timeframe"]))
+    at = np.maximum(prev, 0)
+    p_prev = np.take_along_axis(price, at, axis=1)
+    r_prev = np.take_along_axis(rsi, at, axis=1)
+    down_up = pair & (price < p_prev) & (rsi > r_prev)
+    up_down = pair & (price > p_prev) & (rsi < r_prev)
+    return (np.where(down_up, cols, -1).max(axis=1),
+            np.where(up_down, cols, -1).max(axis=1))
+
+
+def _matrix_rsi(mats, rsi_len):
+    """calc_rsi on every row of the stacked closes (one wide ewm)."""
+    return calc_rsi(pd.DataFrame(mats["Close"].T), rsi_len).to_numpy().T
+
+
+def _pivot_range(lengths, width, pivot_len):
+    """Columns where each row may hold a pivot: `pivot_len` bars into its data."""
+    return np.arange(width) >= (width - lengths + pivot_len)[:, None]
+
+
+def _matrix_divergences(mats, rsi, valid, pivot_len, clock=NULL_CLOCK):
+    """Latest column of each divergence kind per row (-1 = none)."""
+    rsi_ph, rsi_pl = pivot_mask(rsi, pivot_len, pivot_len)
+    clock.lap("pivots")
+    reg_bull, hid_bull = _last_divergences(rsi_pl & valid, mats["Low"], rsi)
+    hid_bear, reg_bear = _last_divergences(rsi_ph & valid, mats["High"], rsi)
+    clock.lap("divergences")
+    return {"reg_bull": reg_bull, "hid_bull": hid_bull,
+            "reg_bear": reg_bear, "hid_bear": hid_bear}
+
+
+def _matrix_obs(mats, lengths, valid, pivot_len, clock=NULL_CLOCK):
+    """(bull, bear) OBZones per row from price pivots on the stacked highs / lows."""
+    o, h, l, c = mats["Open"], mats["High"], mats["Low"], mats["Close"]
+    price_ph = pivot_mask(h, pivot_len, pivot_len)[0] & valid
+    price_pl = pivot_mask(l, pivot_len, pivot_len)[1] & valid
+    clock.lap("pivots")
+    zones = []
+    for k, p in enumerate(c.shape[1] - lengths):
+        bull, bear = order_blocks(o[k, p:], h[k, p:], l[k, p:], c[k, p:],
+                                  np.flatnonzero(price_ph[k, p:]).tolist(),
+                                  np.flatnonzero(price_pl[k, p:]).tolist())
+        zones.append((OBZones(bull), OBZones(bear)))
+    clock.lap("order_blocks")
+    return zones
+
+
+def _row_signal(last_div, k, threshold):
+    if last_div is None:
+        return "None", ""
+    return divergence_signal(
+        {key: (int(v[k]) if v[k] >= 0 else None) for key, v in last_div.items()}, threshold)
+
+
+def analyze_matrix(frames, symbols, tf_label, rsi_len, pivot_len, ob_prox_pct,
+                   rsi_div_on=True, ob_on=True, ob_confirm_pct=0.0, clock=NULL_CLOCK):
+    """analyze() for many symbols of one timeframe at once.
+
+    RSI, RSI / price pivots and divergence flags are computed on the
+    stacked matrices (stack_bars); only order blocks and the final checks
+    run per symbol. Padding is NaN and each row's pivot range starts
+    `pivot_len` bars into its own data, so every row matches analyze() on
+    its own frame exactly. Returns a list aligned with `symbols` of result
+    dicts or None (market cap left unset)."""
+    if not frames:
+        return []
+    mats, lengths = stack_bars(frames)
+    width = mats["Close"].shape[1]
+    if width < min_bars(rsi_len, pivot_len):
+        return [None] * len(symbols)        # every row is "short" (or empty)
+    valid = _pivot_range(lengths, width, pivot_len)
+    clock.lap("stack")
+    rsi = _matrix_rsi(mats, rsi_len)
+    clock.lap("rsi")
+    last_div = _matrix_divergences(mats, rsi, valid, pivot_len, clock) if rsi_div_on else None
+    zones = _matrix_obs(mats, lengths, valid, pivot_len, clock) if ob_on else None
+
+    needed = min_bars(rsi_len, pivot_len)
+    threshold = width - pivot_len * 5
+    results = []
+    for k, symbol in enumerate(symbols):
+        if lengths[k] < needed:
+            results.append(None)
+            continue
+        signal, div_type = _row_signal(last_div, k, threshold)
+        bull, bear = zones[k] if zones else ([], [])
+        current_rsi = float(rsi[k, -1]) if not np.isnan(rsi[k, -1]) else 0.0
+        results.append(build_result(symbol, tf_label, signal, div_type, bull, bear,
+                                    float(mats["Close"][k, -1]), current_rsi, ob_prox_pct,
+                                    rsi_div_on, ob_on, ob_confirm_pct))
+    clock.lap("checks")
     return results
 
 
+def sweep_combos(rsi_lens, pivot_lens, prox_pcts, confirm_pcts):
+    """Every parameter combination of a sweep, in grid order."""
+    return [{"rsi_len": r, "pivot_len": p, "ob_prox_pct": x, "ob_confirm_pct": y}
+            for r, p, x, y in itertools.product(rsi_lens, pivot_lens, prox_pcts, confirm_pcts)]
+
+
+def sweep_matrix(frames, symbols, tf_label, rsi_lens, pivot_lens, prox_pcts, confirm_pcts,
+                 rsi_div_on=True, ob_on=True):
+    """analyze_matrix() over a parameter grid, sharing the intermediates:
+    RSI once per rsi_len, price pivots and OB zones once per pivot_len,
+    divergences once per (rsi_len, pivot_len); only the proximity and
+    breakout checks run per combination.
+
+    Returns a list aligned with `symbols` of cell lists in sweep_combos()
+    order; a cell is None (no result) or
+    [signal, div_type, validated, near_ob, ob_confirmed]."""
+    cells = [[] for _ in symbols]
+    if not frames:
+        return cells
+    mats, lengths = stack_bars(frames)
+    width = mats["Close"].shape[1]
+    closes = mats["Close"][:, -1]
+    per_pivot = len(prox_pcts) * len(confirm_pcts)
+
+    valid = {p: _pivot_range(lengths, width, p) for p in pivot_lens}
+    zones = {p: _matrix_obs(mats, lengths, valid[p], p) for p in pivot_lens} if ob_on else None
+    for r in rsi_lens:
+        rsi = _matrix_rsi(mats, r)
+        for p in pivot_lens:
+            last_div = _matrix_divergences(mats, rsi, valid[p], p) if rsi_div_on else None
+            needed = min_bars(r, p)
+            threshold = width - p * 5
+            for k, symbol in enumerate(symbols):
+                if lengths[k] < needed:
+                    cells[k].extend([None] * per_pivot)
+                    continue
+                signal, div_type = _row_signal(last_div, k, threshold)
+                bull, bear = zones[p][k] if zones else ([], [])
+                current_rsi = float(rsi[k, -1]) if not np.isnan(rsi[k, -1]) else 0.0
+                for prox, confirm in itertools.product(prox_pcts, confirm_pcts):
+                    res = build_result(symbol, tf_label, signal, div_type, bull, bear,
+                                       float(closes[k]), current_rsi, prox,
+                                       rsi_div_on, ob_on, confirm)
+                    cells[k].append(None if res is None else
+                                    [res["signal"], res["div_type"], res["validated"],
+                                     res["near_ob"], res["ob_confirmed"]])
+    return cells
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
-# ROUTES
+# BAR STORE
 # ═══════════════════════════════════════════════════════════════════════════════
 
-@app.route("/")
-def index():
-    return render_template("index.html", presets=PRESET_WATCHLISTS)
+_PERIOD_RE = re.compile(r"^(\d+)(d|wk|mo|y)$")
 
 
-@app.route("/api/scan", methods=["POST"])
-def api_scan():
-    data = req.get_json(force=True)
-    symbols    = [s.strip().upper() for s in data.get("symbols", []) if s.strip()]
-    timeframes = data.get("timeframes", ["Daily"])
-    rsi_len    = int(data.get("rsi_len", 14))
-    pivot_len  = int(data.get("pivot_len", 5))
-    ob_prox    = float(data.get("ob_prox", 1.0)) / 100.0
-    rsi_div_on = bool(data.get("rsi_div_on", True))
-    ob_on      = bool(data.get("ob_on", True))
-    ob_confirm = float(data.get("ob_confirm", 0.0)) / 100.0
+def period_start(period, now=None):
+    """Earliest timestamp (UTC) covered by a yfinance period string like "60d" or "5y"."""
+    now = now if now is not None else pd.Timestamp.now(tz="UTC")
+    m = _PERIOD_RE.match(period)
+    if not m:
+        raise ValueError(f"Unsupported period: {period}")
+    num, unit = int(m.group(1)), m.group(2)
+    if unit == "d":
+        return now - pd.Timedelta(days=num)
+    if unit == "wk":
+        return now - pd.Timedelta(weeks=num)
+    if unit == "mo":
+        return now - pd.DateOffset(months=num)
+    return now - pd.DateOffset(years=num)
 
-    if not symbols:
-        return jsonify({"error": "No symbols provided"}), 400
-    if not rsi_div_on and not ob_on:
-        return jsonify({"error": "Enable at least one: RSI Divergence or Order Block"}), 400
 
-    results = run_scan(symbols, timeframes, rsi_len, pivot_len, ob_prox,
-                       rsi_div_on, ob_on, ob_confirm)
-    return jsonify({
-        "results": results,
-        "scanned": len(symbols) * len(timeframes),
-        "signals": sum(1 for r in results if r["signal"] != "None"),
-        "validated": sum(1 for r in results if r["validated"]),
-        "ob_confirmed_count": sum(1 for r in results if r.get("ob_confirmed")),
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-    })
+def retention_start(interval, now=None):
+    """Oldest bar the store keeps for `interval`: the start of the longest
+    period any scan requests it for (None for intervals no scan uses)."""
+    periods = [cfg["period"] for cfg in TF_CONFIG.values() if cfg["interval"] == interval]
+    if interval == "1d":
+        periods.append(DAILY_BASE_PERIOD)
+    return min((period_start(p, now) for p in periods), default=None)
+
+
+def _to_epoch(index):
+    """DatetimeIndex → int64 seconds since epoch (UTC)."""
+    idx = index.tz_convert("UTC") if index.tz is not None else index
+    idx = idx.tz_localize(None)
+    return np.asarray((idx - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1), dtype=np.int64)
+
+
+class BarStore:
+    """On-disk OHLCV cache keyed by (symbol, interval), plus the persisted
+    SignalStates of incremental scans.
+
+    One SQLite file shared by every thread (one short-lived connection per
+    call, WAL mode) so a restart keeps the cache warm."""
+
+    def __init__(self, path):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with closing(self._connect()) as con, con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("""CREATE TABLE IF NOT EXISTS bars (
+                symbol TEXT, interval TEXT, ts INTEGER,
+                open REAL, high REAL, low REAL, close REAL, volume REAL,
+                PRIMARY KEY (symbol, interval, ts))""")
+            con.execute("""CREATE TABLE IF NOT EXISTS series (
+                symbol TEXT, interval TEXT, tz TEXT, since INTEGER, updated REAL,
+                PRIMARY KEY (symbol, interval))""")
+            con.execute("""CREATE TABLE IF NOT EXISTS states (
+                symbol TEXT, timeframe TEXT, rsi_len INTEGER, pivot_len INTEGER, data TEXT,
+                PRIMARY KEY (symbol, timeframe, rsi_len, pivot_len))""")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def load(self, symbol, interval):
+        """Return (df, since) or (None, None) when the series is not stored.
+        `since` is the epoch second the stored history is known to cover."""
+        with closing(self._connect()) as con:
+            meta = con.execute("SELECT tz, since FROM series WHERE symbol=? AND interval=?",
+                               (symbol, interval)).fetchone()
+            if meta is None:
+                return None, None
+            rows = con.execute("SELECT ts, open, high, low, close, volume FROM bars "
+                               "WHERE symbol=? AND interval=? ORDER BY ts",
+                               (symbol, interval)).fetchall()
+        if not rows:
+            return None, None
+        arr = np.array(rows, dtype=float)
+        index = pd.to_datetime(arr[:, 0].astype(np.int64), unit="s", utc=True)
+        if meta[0]:
+            index = index.tz_convert(meta[0])
+        df = pd.DataFrame(arr[:, 1:], index=index,
+                          columns=["Open", "High", "Low", "Close", "Volume"])
+        return df, meta[1]
+
+    def save(self, symbol, interval, df, since=None):
+        """Upsert bars. Passing `since` marks a full download: the stored
+        series is replaced and its coverage start recorded."""
+        ts = _to_epoch(df.index)
+        vol = df["Volume"].values if "Volume" in df else np.zeros(len(df))
+        rows = list(zip(ts.tolist(), df["Open"].values.tolist(), df["High"].values.tolist(),
+                        df["Low"].values.tolist(), df["Close"].values.tolist(), vol.tolist()))
+        tz = str(df.index.tz) if df.index.tz is not None else ""
+        now = datetime.now().timestamp()
+        with closing(self._connect()) as con, con:
+            if since is not None:
+                con.execute("DELETE FROM bars WHERE symbol=? AND interval=?", (symbol, interval))
+                con.execute("INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?, ?)",
+                            (symbol, interval, tz, int(since), now))
+            else:
+                con.execute("UPDATE series SET updated=? WHERE symbol=? AND interval=?",
+                            (now, symbol, interval))
+            con.executemany("INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            [(symbol, interval) + r for r in rows])
+
+    def prune(self, symbols, interval, before):
+        """Drop bars older than `before` (a Timestamp); the series then only
+        claim coverage from there."""
+        cutoff = int(before.timestamp())
+        with closing(self._connect()) as con, con:
+            con.executemany("DELETE FROM bars WHERE symbol=? AND interval=? AND ts<?",
+                            [(sym, interval, cutoff) for sym in symbols])
+            con.executemany("UPDATE series SET since=MAX(since, ?) WHERE symbol=? AND interval=?",
+                            [(cutoff, sym, interval) for sym in symbols])
+
+    def coverage(self, symbols, interval):
+        """{symbol: (since, updated)} for the stored series among `symbols`;
+        `updated` is when the series was last refreshed from the provider."""
+        out = {}
+        with closing(self._connect()) as con:
+            for chunk in _chunks(list(symbols), 500):
+                marks = ",".join("?" * len(chunk))
+                for sym, since, updated in con.execute(
+                        f"SELECT symbol, since, updated FROM series WHERE interval=? "
+                        f"AND symbol IN ({marks})", [interval] + chunk):
+                    out[sym] = (since, updated or 0.0)
+        return out
+
+    def load_state(self, symbol, timeframe, rsi_len, pivot_len):
+        """Persisted SignalState or None. `timeframe` names the bar series
+        the state was built from, e.g. "Weekly/1d" (see analyze_incremental)."""
+        with closing(self._connect()) as con:
+            row = con.execute("SELECT data FROM states WHERE symbol=? AND timeframe=? "
+                              "AND rsi_len=? AND pivot_len=?",
+                              (symbol, timeframe, rsi_len, pivot_len)).fetchone()
+        return SignalState.from_dict(json.loads(row[0])) if row else None
+
+    def save_state(self, symbol, timeframe, state):
+        with closing(self._connect()) as con, con:
+            con.execute("INSERT OR REPLACE INTO states VALUES (?, ?, ?, ?, ?)",
+                        (symbol, timeframe, state.rsi_len, state.pivot_len,
+                         json.dumps(state.to_dict())))
+
+
+BAR_STORE = BarStore(BAR_STORE_PATH) if BAR_STORE_PATH else None
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SCANNER
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class ScanStats:
+    """Thread-safe counters for one scan (requests, symbols fetched, …).
+    `background` scans yield provider calls to interactive ones (FetchScheduler)."""
+
+    def __init__(self, background=False):
+        self.background = background
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def add(self, key, n=1):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + n
+
+    def as_dict(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+def _make_session():
+    """One pooled HTTP session shared by every fetch (yfinance ≥0.2.55 wants curl_cffi)."""
+    try:
+        from curl_cffi import requests as curl_requests
+    except ImportError:
+        return None
+    return curl_requests.Session(impersonate="chrome")
+
+
+class DataProvider:
+    """Source of OHLCV bars and metadata for the scanner.
+
+    Implementations override history() and, when the backend can do better
+    than one call per symbol, history_batch(). Frames carry Open / High /
+    Low / Close / Volume columns on a tz-aware DatetimeIndex. Every method
+    takes an optional ScanStats and records the remote requests it issues.
+    `local` providers read from disk: the bar store is skipped for them and
+    iter_scan takes bars_batch() arrays when they offer it."""
+
+    local = False
+
+    def history(self, symbol, interval, period=None, start=None, stats=None):
+        """OHLCV for `period` (or from `start` on), or None when there is none."""
+        raise NotImplementedError
+
+    def history_batch(self, symbols, interval, period=None, start=None, stats=None):
+        """{symbol: df} for many symbols; symbols with no data are left out."""
+        frames = {}
+        for sym in symbols:
+            df = self.history(sym, interval, period, start, stats)
+            if df is not None and not df.empty:
+                frames[sym] = df
+        return frames
+
+    def market_cap(self, symbol, stats=None):
+        return None
+
+    def request_cost(self, n_symbols):
+        """Remote requests one history_batch() of `n_symbols` costs (FetchScheduler tokens)."""
+        return 1
+
+
+class RateLimited(Exception):
+    """A provider refused a request for exceeding its rate limit (HTTP 429)."""
+
+
+class YahooProvider(DataProvider):
+    """OHLCV and metadata from Yahoo Finance through one shared session.
+
+    Every method takes an optional ScanStats and records the HTTP requests
+    it issues, so a scan can report requests-per-scan."""
+
+    def __init__(self, session=None):
+        self.session = session if session is not None else _make_session()
+
+    def history(self, symbol, interval, period=None, start=None, stats=None):
+        """One symbol via yf.Ticker (thread-safe, unlike yf.download)."""
+        if stats is not None:
+            stats.add("requests")
+        ticker = yf.Ticker(symbol, session=self.session)
+        if start is not None:
+            df = ticker.history(interval=interval, start=start, auto_adjust=True)
+        else:
+            df = ticker.history(interval=interval, period=period, auto_adjust=True)
+        if df.empty:
+            return None
+        # Ensure standard column names
+        if isinstance(df.columns, pd.MultiIndex):
+            df.columns = df.columns.droplevel(1)
+        return df
+
+    def history_batch(self, symbols, interval, period=None, start=None, stats=None):
+        """Many symbols → {symbol: df}, leaving out symbols with no data.
+
+        Yahoo's chart API serves one symbol per request, so the batch fans
+        out over YAHOO_BATCH_THREADS history() calls on the pooled session
+        and records one request per call. (yf.download keeps its results in
+        module globals, so concurrent bulk downloads would need one lock for
+        the whole process.) Symbols that fail are left out for fetch_batch
+        to re-request; when all of them fail, the first error is raised —
+        a throttling one if any."""
+        if len(symbols) == 1:
+            df = self.history(symbols[0], interval, period, start, stats)
+            return {symbols[0]: df} if df is not None else {}
+
+        def one(sym):
+            try:
+                return self.history(sym, interval, period, start, stats)
+            except Exception as exc:
+                return exc
+
+        with ThreadPoolExecutor(max_workers=min(len(symbols), YAHOO_BATCH_THREADS)) as pool:
+            fetched = dict(zip(symbols, pool.map(one, symbols)))
+        errors = [r for r in fetched.values() if isinstance(r, Exception)]
+        frames = {sym: r for sym, r in fetched.items()
+                  if r is not None and not isinstance(r, Exception)}
+        if errors and not frames:
+            raise next((e for e in errors if is_throttled(e)), errors[0])
+        return frames
+
+    def market_cap(self, symbol, stats=None):
+        if stats is not None:
+            stats.add("requests")
+        return yf.Ticker(symbol, session=self.session).info.get("marketCap")
+
+    def request_cost(self, n_symbols):
+        return n_symbols
+
+
+class ArchiveProvider(DataProvider):
+    """Replays a local columnar bar archive through memory-mapping.
+
+    Layout under `root`: <interval>/<symbol>.npy holds a (5, n) float64
+    block — Open, High, Low, Close, Volume rows, each one contiguous
+    column — and <interval>/<symbol>.ts.npy the int64 epoch seconds of
+    the n bars. archive.json keeps the timezone and optional market caps.
+    bars_batch() hands out zero-copy views of the mapped files; periods
+    are counted back from the archive's last bar, so replays are
+    deterministic however old the archive is. Build one with write()."""
+
+    local = True
+    COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+
+    def __init__(self, root):
+        self.root = root
+        self._maps = {}
+        self._lock = threading.Lock()
+        try:
+            with open(os.path.join(root, "archive.json")) as f:
+                self.meta = json.load(f)
+        except (OSError, ValueError):
+            self.meta = {}
+
+    def _paths(self, symbol, interval):
+        base = os.path.join(self.root, interval, symbol.replace("/", "_"))
+        return base + ".npy", base + ".ts.npy"
+
+    def _open(self, symbol, interval):
+        key = (symbol, interval)
+        with self._lock:
+            if key not in self._maps:
+                data_path, ts_path = self._paths(symbol, interval)
+                if os.path.exists(data_path) and os.path.exists(ts_path):
+                    self._maps[key] = (np.load(data_path, mmap_mode="r"),
+                                       np.load(ts_path, mmap_mode="r"))
+                else:
+                    self._maps[key] = None
+            return self._maps[key]
+
+    def bars(self, symbol, interval, period=None, start=None):
+        """to_bars(…, with_ts=True)-style dict of memory-mapped views (plus
+        Volume), or None when the archive doesn't hold the series."""
+        mapped = self._open(symbol, interval)
+        if mapped is None or not len(mapped[1]):
+            return None
+        data, ts = mapped
+        if start is not None:
+            first = pd.Timestamp(start)
+            first = first.tz_localize("UTC") if first.tz is None else first
+        elif period is not None:
+            first = period_start(period, now=pd.Timestamp(int(ts[-1]), unit="s", tz="UTC"))
+        else:
+            first = None
+        lo = int(np.searchsorted(ts, int(first.timestamp()))) if first is not None else 0
+        if lo >= len(ts):
+            return None
+        bars = {col: data[k, lo:] for k, col in enumerate(self.COLUMNS)}
+        bars["ts"] = ts[lo:]
+        return bars
+
+    def bars_batch(self, symbols, interval, period=None, start=None, stats=None):
+        out = {}
+        for sym in symbols:
+            bars = self.bars(sym, interval, period, start)
+            if bars is not None:
+                out[sym] = bars
+        return out
+
+    def history(self, symbol, interval, period=None, start=None, stats=None):
+        bars = self.bars(symbol, interval, period, start)
+        if bars is None:
+            return None
+        index = pd.to_datetime(np.asarray(bars["ts"]), unit="s", utc=True)
+        index = index.tz_convert(self.meta.get("tz", "UTC"))
+        return pd.DataFrame({col: np.asarray(bars[col]) for col in self.COLUMNS}, index=index)
+
+    def market_cap(self, symbol, stats=None):
+        return self.meta.get("market_caps", {}).get(symbol)
+
+    def write(self, symbol, interval, df, mcap=None):
+        """Add or replace one series (e.g. from the bar store or a download)."""
+        folder = os.path.join(self.root, interval)
+        os.makedirs(folder, exist_ok=True)
+        data_path, ts_path = self._paths(symbol, interval)
+        vol = df["Volume"].values if "Volume" in df else np.zeros(len(df))
+        block = np.vstack([df[col].values for col in self.COLUMNS[:4]] + [vol]).astype(np.float64)
+        np.save(data_path, block)
+        np.save(ts_path, _to_epoch(df.index))
+        with self._lock:
+            self._maps.pop((symbol, interval), None)
+            if df.index.tz is not None:
+                self.meta["tz"] = str(df.index.tz)
+            if mcap is not None:
+                self.meta.setdefault("market_caps", {})[symbol] = mcap
+            with open(os.path.join(self.root, "archive.json"), "w") as f:
+                json.dump(self.meta, f)
+
+
+PROVIDERS = {
+    "yahoo":   lambda: YahooProvider(),
+    "archive": lambda: ArchiveProvider(ARCHIVE_PATH),
+}
+
+
+def make_provider(name):
+    """DataProvider for a DATA_PROVIDER name."""
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown DATA_PROVIDER {name!r} (choose from {', '.join(PROVIDERS)})")
+    return PROVIDERS[name]()
+
+
+PROVIDER = make_provider(DATA_PROVIDER)
+
+
+def is_throttled(exc):
+    """Whether a provider exception means "slow down" rather than a plain failure."""
+    if isinstance(exc, RateLimited) or type(exc).__name__ == "YFRateLimitError":
+        return True
+    text = str(exc)
+    return "429" in text or "Too Many Requests" in text or "Rate limit" in text
+
+
+class FetchScheduler:
+    """Paces every remote provider call of the process.
+
+    Two AIMD limits: a token bucket on the request rate and a window on
+    calls in flight. Both grow additively with successes and are halved on
+    a throttling response — the rate down to half of what was actually
+    being sent — at most once per backoff period, so one burst of 429s
+    counts as one congestion event. Failed calls are retried with
+    full-jitter exponential backoff; fetch_batch() also re-requests the
+    symbols a bulk download left out. Retries and failures are counted in
+    the caller's ScanStats ("retries", "throttled", "fetch_failures",
+    "symbols_missing") and in METRICS. Calls of background scans hold at
+    most `background_share` of the window and wait while interactive calls
+    are queued."""
+
+    def __init__(self, rate=FETCH_RATE, burst=FETCH_BURST, max_concurrency=SCAN_IO_WORKERS,
+                 start=FETCH_START_CONCURRENCY, retries=FETCH_RETRIES,
+                 backoff=FETCH_BACKOFF, backoff_max=FETCH_BACKOFF_MAX,
+                 missing_retries=FETCH_MISSING_RETRIES, background_share=PRECOMPUTE_FETCH_SHARE):
+        self.max_rate = rate            # 0 = no cap
+        self.rate = rate                # current rate; 0 = uncapped
+        self.fixed_burst = burst
+        self.max_window = max(1, max_concurrency)
+        self.window = float(min(max(1, start), self.max_window))
+        self.retries, self.missing_retries = retries, missing_retries
+        self.backoff, self.backoff_max = backoff, backoff_max
+        self.inflight = 0
+        self.background_share = background_share
+        self._background = 0            # background calls in flight
+        self._queued = 0                # interactive calls waiting for a slot
+        self._tokens, self._stamp = self.burst, time.monotonic()
+        self._sent = deque()            # send times over the last second
+        self._last_cut = float("-inf")
+        self._cond = threading.Condition()
+        self._bucket_lock = threading.Lock()
+        METRICS.set("screener_fetch_concurrency", self.window)
+
+    @property
+    def burst(self):
+        return self.fixed_burst or max(self.rate, 1.0)
+
+    def _take(self, cost):
+        """Block until the bucket can pay `cost` tokens. Costs above the burst
+        size are admitted once the bucket is full and leave it in debt."""
+        while True:
+            with self._bucket_lock:
+                now = time.monotonic()
+                while self._sent and self._sent[0] < now - 1.0:
+                    self._sent.popleft()
+                if self.rate <= 0:
+                    self._sent.extend([now] * cost)
+                    return
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                need = min(cost, self.burst)
+                if self._tokens >= need:
+                    self._tokens -= cost
+                    self._sent.extend([now] * cost)
+                    return
+                delay = (need - self._tokens) / self.rate
+            time.sleep(delay)
+
+    def _acquire(self, cost, background=False):
+        with self._cond:
+            if background:
+                while (self.inflight >= int(self.window) or self._queued or
+                       self._background >= max(1, int(self.window * self.background_share))):
+                    self._cond.wait()
+                self._background += 1
+            else:
+                self._queued += 1
+                while self.inflight >= int(self.window):
+                    self._cond.wait()
+                self._queued -= 1
+            self.inflight += 1
+        self._take(cost)
+
+    def _release(self, outcome, cost=1, background=False):
+        with self._cond:
+            self.inflight -= 1
+            if background:
+                self._background -= 1
+            if outcome == "ok":
+                self.window = min(self.max_window, self.window + 1.0 / self.window)
+                with self._bucket_lock:
+                    if self.rate > 0:
+                        self.rate += cost / self.rate
+                        if self.max_rate:
+                            self.rate = min(self.rate, self.max_rate)
+            elif outcome == "throttled":
+                self._cut()
+            self._cond.notify_all()
+        METRICS.set("screener_fetch_concurrency", round(self.window, 2))
+
+    def _cut(self):
+        """Multiplicative decrease (call with self._cond held)."""
+        now = time.monotonic()
+        if now - self._last_cut < self.backoff:
+            return
+        self._last_cut = now
+        self.window = max(1.0, self.window / 2)
+        with self._bucket_lock:
+            sent = len(self._sent)
+            current = min(self.rate, sent) if self.rate > 0 else sent
+            self.rate = max(0.5, current / 2)
+            self._tokens = min(self._tokens, self.burst)
+
+    def delay(self, attempt):
+        """Full-jitter exponential backoff before retry number `attempt` (1-based)."""
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+
+    def call(self, fn, *args, cost=1, stats=None, **kwargs):
+        """fn(*args, stats=stats, **kwargs) within the rate and concurrency
+        limits, retried on any exception. Raises the last one when retries
+        run out."""
+        attempt = 0
+        background = getattr(stats, "background", False)
+        while True:
+            self._acquire(cost, background)
+            outcome = "error"
+            try:
+                result = fn(*args, stats=stats, **kwargs)
+                outcome = "ok"
+                return result
+            except Exception as exc:
+                if is_throttled(exc):
+                    outcome = "throttled"
+                if attempt >= self.retries:
+                    METRICS.inc("screener_fetch_failures_total", reason=outcome)
+                    if stats is not None:
+                        stats.add("fetch_failures")
+                    raise
+            finally:
+                self._release(outcome, cost, background)
+            attempt += 1
+            METRICS.inc("screener_fetch_retries_total", reason=outcome)
+            if stats is not None:
+                stats.add("retries")
+                if outcome == "throttled":
+                    stats.add("throttled")
+            time.sleep(self.delay(attempt))
+
+    def fetch_batch(self, provider, symbols, interval, period=None, start=None, stats=None):
+        """provider.history_batch through call(), re-requesting symbols the
+        provider left out. A bulk download that comes back with nothing at
+        all is treated as throttling."""
+        def batch(syms):
+            return self.call(provider.history_batch, syms, interval, period=period, start=start,
+                             stats=stats, cost=provider.request_cost(len(syms)))
+
+        frames = batch(list(symbols))
+        missing = [sym for sym in symbols if sym not in frames]
+        for attempt in range(1, self.missing_retries + 1):
+            if not missing:
+                break
+            if len(missing) == len(symbols) > 1:
+                with self._cond:
+                    self._cut()
+            METRICS.inc("screener_fetch_retries_total", len(missing), reason="missing")
+            if stats is not None:
+                stats.add("retries", len(missing))
+            time.sleep(self.delay(attempt))
+            try:
+                found = batch(missing)
+            except Exception:
+                break
+            frames.update(found)
+            missing = [sym for sym in missing if sym not in found]
+        if missing and stats is not None:
+            stats.add("symbols_missing", len(missing))
+        return frames
+
+
+FETCH_SCHEDULER = FetchScheduler()
+
+
+class MetaCache:
+    """Per-symbol metadata (market cap) with a TTL and LRU eviction.
+
+    Shared by every scan thread. Concurrent misses on the same symbol wait
+    for one lookup instead of each calling ticker.info."""
+
+    def __init__(self, ttl=META_TTL, maxsize=META_MAX_SYMBOLS):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()      # symbol → (expires_at, value)
+        self._inflight = {}             # symbol → threading.Event
+        self._lock = threading.Lock()
+
+    def peek(self, symbol):
+        """(hit, value) without fetching."""
+        with self._lock:
+            entry = self._data.get(symbol)
+            if entry is None:
+                return False, None
+            if entry[0] < time.monotonic():
+                del self._data[symbol]
+                return False, None
+            self._data.move_to_end(symbol)
+            return True, entry[1]
+
+    def put(self, symbol, value):
+        with self._lock:
+            self._data[symbol] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(symbol)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def market_cap(self, symbol, provider=None, stats=None):
+        """Cached market cap, looked up through the provider on a miss.
+        Failed lookups return None and are not cached."""
+        while True:
+            hit, value = self.peek(symbol)
+            if hit:
+                return value
+            with self._lock:
+                event = self._inflight.get(symbol)
+                owner = event is None
+                if owner:
+                    event = self._inflight[symbol] = threading.Event()
+            if owner:
+                break
+            event.wait()
+            if not self.peek(symbol)[0]:
+                # the owner's lookup failed — don't retry in every waiter
+                return None
+        t0 = time.perf_counter()
+        try:
+            provider = provider or PROVIDER
+            if provider.local:
+                value = provider.market_cap(symbol, stats)
+            else:
+                value = FETCH_SCHEDULER.call(provider.market_cap, symbol, stats=stats)
+            self.put(symbol, value)
+            return value
+        except Exception:
+            return None
+        finally:
+            secs = time.perf_counter() - t0
+            METRICS.observe("screener_fetch_seconds", secs, kind="info", interval="")
+            if stats is not None:
+                stats.add("seconds.info", secs)
+            with self._lock:
+                del self._inflight[symbol]
+            event.set()
+
+    def warm(self, symbols, provider=None, max_workers=10):
+        """Look up every symbol not already cached → {symbol: mcap}."""
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            caps = pool.map(lambda sym: self.market_cap(sym, provider), symbols)
+            return dict(zip(symbols, caps))
+
+
+META_CACHE = MetaCache()
+# Background lookups for scans that return before metadata is ready
+_META_POOL = ThreadPoolExecutor(max_workers=8)
+
+
+def download_bars(symbol, interval, period=None, start=None, provider=None, stats=None):
+    """Download OHLCV for one symbol, bypassing the bar store.
+    Pass `start` to fetch only the bars from that timestamp onwards."""
+    provider = provider or PROVIDER
+    if provider.local:
+        return provider.history(symbol, interval, period=period, start=start, stats=stats)
+    return FETCH_SCHEDULER.call(provider.history, symbol, interval, period=period, start=start,
+                                stats=stats)
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def fetch_batch(symbols, interval, period=None, start=None, provider=None, stats=None):
+    """provider.history_batch, paced and retried by FETCH_SCHEDULER unless local."""
+    provider = provider or PROVIDER
+    if provider.local:
+        return provider.history_batch(symbols, interval, period=period, start=start, stats=stats)
+    return FETCH_SCHEDULER.fetch_batch(provider, symbols, interval, period=period, start=start,
+                                       stats=stats)
+
+
+# Bar duration per interval (seconds), for SHARED_TTL_FRACTION
+INTERVAL_SECONDS = {"1h": 3600, "1d": 86400, "1wk": 7 * 86400, "1mo": 30 * 86400}
+
+
+def shared_ttl(interval):
+    """How long a refreshed series is served from the store without a request."""
+    return min(INTERVAL_SECONDS.get(interval, 86400) * SHARED_TTL_FRACTION, SHARED_TTL_MAX)
+
+
+class SingleFlight:
+    """In-process de-duplication of concurrent fetches: the first caller of
+    a key fetches it, later callers wait for that result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}                # key → [threading.Event, result]
+
+    def claim(self, keys):
+        """(keys this caller must fetch, {key: call} being fetched by others)."""
+        mine, theirs = [], {}
+        with self._lock:
+            for key in keys:
+                call = self._calls.get(key)
+                if call is None:
+                    self._calls[key] = [threading.Event(), None]
+                    mine.append(key)
+                else:
+                    theirs[key] = call
+        return mine, theirs
+
+    def resolve(self, results):
+        """Publish {key: result} for keys this caller claimed."""
+        with self._lock:
+            calls = [(self._calls.pop(key), value) for key, value in results.items()]
+        for call, value in calls:
+            call[1] = value
+            call[0].set()
+
+    @staticmethod
+    def wait(call):
+        call[0].wait()
+        return call[1]
+
+
+FETCH_FLIGHTS = SingleFlight()
+
+
+def load_bars_batch(symbols, interval, period, provider=None, stats=None):
+    """{symbol: OHLCV covering `period`} for many symbols with bulk requests.
+
+    Concurrent scans share downloads: a symbol another thread is already
+    fetching for the same interval and period is waited for (FETCH_FLIGHTS).
+    With the bar store, series refreshed within shared_ttl() are served
+    from the store without a request (see _load_stored)."""
+    provider = provider or PROVIDER
+    if provider.local:
+        return _download(list(symbols), interval, period, provider, stats)
+    mine, theirs = FETCH_FLIGHTS.claim([(sym, interval, period) for sym in symbols])
+    out = {}
+    try:
+        syms = [key[0] for key in mine]
+        if BAR_STORE is None:
+            out = _download(syms, interval, period, provider, stats)
+        else:
+            out = _load_stored(syms, interval, period, provider, stats)
+    finally:
+        FETCH_FLIGHTS.resolve({key: out.get(key[0]) for key in mine})
+    for key, call in theirs.items():
+        df = FETCH_FLIGHTS.wait(call)
+        if df is not None:
+            out[key[0]] = df
+    if theirs and stats is not None:
+        stats.add("coalesced", len(theirs))
+    return out
+
+
+def _download(symbols, interval, period, provider, stats):
+    """Full downloads for `period`, written through to the bar store."""
+    start = period_start(period)
+    out = {}
+    for chunk in _chunks(symbols, FETCH_BATCH_SIZE):
+        for sym, df in fetch_batch(chunk, interval, period=period, provider=provider,
+                                   stats=stats).items():
+            if BAR_STORE is not None and not provider.local:
+                BAR_STORE.save(sym, interval, df, since=start.timestamp())
+                # Same window as a topped-up series, so cold and warm scans agree
+                df = df[df.index >= start]
+            out[sym] = df
+    return out
+
+
+def _load_stored(symbols, interval, period, provider, stats):
+    """Bar store path of load_bars_batch: series refreshed within
+    shared_ttl() come straight from the store, the rest are refreshed
+    (_refresh_stored)."""
+    start = period_start(period)
+    ttl = shared_ttl(interval)
+    cover = BAR_STORE.coverage(symbols, interval)
+    now = time.time()
+    out, stale = {}, []
+    for sym in symbols:
+        since, updated = cover.get(sym, (None, 0.0))
+        df = None
+        if since is not None and since <= start.timestamp() and updated >= now - ttl:
+            df, _ = BAR_STORE.load(sym, interval)
+        if df is None:
+            stale.append(sym)
+        else:
+            out[sym] = df[df.index >= start]
+    if out and stats is not None:
+        stats.add("shared_hits", len(out))
+    if stale:
+        out.update(_refresh_stored(stale, interval, period, start, provider, stats))
+    return out
+
+
+def _refresh_stored(symbols, interval, period, start, provider, stats):
+    """Refresh stored series from the provider.
+
+    Stored series are topped up from their second-to-last bar: the last one
+    may have been an unfinished bar and is overwritten, the ones before it
+    must match the fresh download. A mismatch means the vendor re-adjusted
+    the history (split / dividend), so that series is downloaded again in
+    full. Symbols not in the store are downloaded in full. When the top-up
+    fails the stored series is served as is and counted as "stale"; bars
+    older than retention_start() are pruned."""
+    out = {}
+    cold, warm = [], {}
+    for sym in symbols:
+        cached, since = BAR_STORE.load(sym, interval)
+        if cached is None or len(cached) < 2 or since > start.timestamp():
+            cold.append(sym)
+        else:
+            warm[sym] = cached
+
+    for chunk in _chunks(list(warm), FETCH_BATCH_SIZE):
+        since = min(warm[sym].index[-2] for sym in chunk)
+        try:
+            fresh_frames = fetch_batch(chunk, interval, start=since, provider=provider, stats=stats)
+        except Exception:
+            log.exception("bar refresh failed: %d symbols %s", len(chunk), interval)
+            METRICS.inc("screener_errors_total", where="refresh")
+            fresh_frames = {}
+        for sym in chunk:
+            cached = warm[sym]
+            fresh = fresh_frames.get(sym)
+            if fresh is None:
+                out[sym] = cached[cached.index >= start]
+                if stats is not None:
+                    stats.add("stale")
+                continue
+            overlap = cached.index[:-1].intersection(fresh.index)
+            if len(overlap) == 0 or not np.allclose(cached.loc[overlap, "Close"].values,
+                                                    fresh.loc[overlap, "Close"].values,
+                                                    rtol=ADJ_TOLERANCE, atol=0.0):
+                cold.append(sym)
+                continue
+            BAR_STORE.save(sym, interval, fresh)
+            merged = pd.concat([cached[cached.index < fresh.index[0]],
+                                fresh[["Open", "High", "Low", "Close", "Volume"]]])
+            out[sym] = merged[merged.index >= start]
+
+    out.update(_download(cold, interval, period, provider, stats))
+    cutoff = retention_start(interval)
+    if cutoff is not None:
+        BAR_STORE.prune(symbols, interval, cutoff)
+    return out
+
+
+def load_bars(symbol, interval, period, provider=None, stats=None):
+    """OHLCV for one symbol covering `period` (bar store + incremental top-up)."""
+    return load_bars_batch([symbol], interval, period, provider, stats).get(symbol)
+
+
+def fetch_data(symbol, interval, period, provider=None, stats=None):
+    """Fetch OHLCV (bar store + incremental top-up) and market cap."""
+    provider = provider or PROVIDER
+    df = load_bars(symbol, interval, period, provider, stats)
+    if df is None or df.empty:
+        return None, None
+    return df, META_CACHE.market_cap(symbol, provider, stats)
+
+
+def analyze(df, symbol, tf_label, rsi_len, pivot_len, ob_prox_pct,
+            rsi_div_on=True, ob_on=True, ob_confirm_pct=0.0, mcap=None, clock=NULL_CLOCK):
+    """Analytics half of scan_one on an already fetched OHLC frame.
+    Only bar order matters, not the index. Returns a result dict or None.
+    clock: a StageClock to charge the rsi / pivots / divergences /
+    order_blocks / checks stages to."""
+    if len(df) < min_bars(rsi_len, pivot_len):
+        return None
+
+    # RSI (always calculated for display)
+    rsi = calc_rsi(df["Close"], rsi_len)
+    current_close = float(df["Close"].iloc[-1])
+    current_rsi = float(rsi.iloc[-1]) if not np.isnan(rsi.iloc[-1]) else 0.0
+    clock.lap("rsi")
+
+    # ── RSI Divergence ──
+    signal = "None"
+    div_type = ""
+
+    if rsi_div_on:
+        rsi_ph_idx, rsi_pl_idx = find_rsi_pivots(rsi, pivot_len, pivot_len)
+        clock.lap("pivots")
+        if len(rsi_ph_idx) >= 2 or len(rsi_pl_idx) >= 2:
+            reg_bull, reg_bear, hid_bull, hid_bear = detect_divergences(
+                df, rsi, rsi_ph_idx, rsi_pl_idx, range_lower=5, range_upper=60
+            )
+            last_div = {
+                "reg_bull": reg_bull[-1] if reg_bull else None,
+                "hid_bull": hid_bull[-1] if hid_bull else None,
+                "reg_bear": reg_bear[-1] if reg_bear else None,
+                "hid_bear": hid_bear[-1] if hid_bear else None,
+            }
+            signal, div_type = divergence_signal(last_div, len(df) - pivot_len * 5)
+        clock.lap("divergences")
+
+    # ── Order Blocks ──
+    bull_obs, bear_obs = [], []
+    if ob_on:
+        price_ph_idx, price_pl_idx = find_pivots(df["High"], df["Low"], pivot_len, pivot_len)
+        clock.lap("pivots")
+        bull_obs, bear_obs = detect_order_blocks(df, price_ph_idx, price_pl_idx)
+        clock.lap("order_blocks")
+
+    result = build_result(symbol, tf_label, signal, div_type, bull_obs, bear_obs,
+                          current_close, current_rsi, ob_prox_pct,
+                          rsi_div_on, ob_on, ob_confirm_pct, mcap)
+    clock.lap("checks")
+    return result
+
+
+def scan_one(symbol, tf_label, rsi_len, pivot_len, ob_prox_pct,
+             rsi_div_on=True, ob_on=True, ob_confirm_pct=0.0,
+             df=None, provider=None, stats=None, mcap=None):
+    """Scan a single symbol × timeframe. Returns a result dict.
+    rsi_div_on: enable RSI divergence detection
+    ob_on: enable Order Block detection
+    ob_confirm_pct: OB breakout confirmation % (0 = off)
+    df: OHLCV already fetched by the batch stage (skips the download and
+        the market-cap lookup — the caller passes `mcap` or fills it later)"""
+    cfg = TF_CONFIG[tf_label]
+    clock = StageClock()
+    result, outcome = None, "empty"
+    try:
+        if df is None:
+            df, mcap = fetch_data(symbol, cfg["interval"], cfg["period"], provider, stats)
+            clock.lap("download")
+        if df is not None and not df.empty:
+            outcome = bars_outcome(len(df), rsi_len, pivot_len)
+            result = analyze(df, symbol, tf_label, rsi_len, pivot_len, ob_prox_pct,
+                             rsi_div_on, ob_on, ob_confirm_pct, mcap, clock=clock)
+    except Exception:
+        log.error("scan_one failed: %s %s", symbol, tf_label, exc_info=True)
+        outcome = "error"
+    record_task(stats, tf_label, clock.report({outcome: 1}))
+    return result
+
+
+def to_bars(df, with_ts=False):
+    """Compact contiguous float64 OHLC arrays — what crosses to an analytics
+    process. with_ts adds int64 epoch seconds under "ts". `df` may also be
+    a bars dict already (ArchiveProvider.bars_batch)."""
+    bars = {col: np.ascontiguousarray(df[col], dtype=np.float64)
+            for col in ("Open", "High", "Low", "Close")}
+    if with_ts:
+        bars["ts"] = np.asarray(df["ts"], dtype=np.int64) if isinstance(df, dict) else _to_epoch(df.index)
+    return bars
+
+
+def analyze_bars(bars, symbol, tf_label, *args):
+    """analyze() for the analytics stage → (result or None, task report).
+    `bars` is a DataFrame (thread stage) or to_bars() arrays (process stage).
+    The report (StageClock.report) carries stage times and the outcome."""
+    clock = StageClock()
+    outcome = bars_outcome(len(bars["Close"]), args[0], args[1])
+    try:
+        df = bars if isinstance(bars, pd.DataFrame) else pd.DataFrame(bars)
+        result = analyze(df, symbol, tf_label, *args, clock=clock)
+    except Exception:
+        log.error("analyze failed: %s %s", symbol, tf_label, exc_info=True)
+        result, outcome = None, "error"
+    return result, clock.report({outcome: 1})
+
+
+def analyze_batch(frames, symbols, tf_label, *args):
+    """analyze_matrix() for the analytics stage → (results, task report).
+    Falls back to symbol-by-symbol analyze() if the batch fails."""
+    clock = StageClock()
+    outcomes = {}
+    for f in frames:
+        outcome = bars_outcome(len(f["Close"]), args[0], args[1])
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    try:
+        results = analyze_matrix(frames, symbols, tf_label, *args, clock=clock)
+    except Exception:
+        log.error("analyze_matrix failed: %d symbols %s", len(symbols), tf_label, exc_info=True)
+        outcomes, results = {}, []
+        for f, sym in zip(frames, symbols):
+            result, report = analyze_bars(f, sym, tf_label, *args)
+            results.append(result)
+            for outcome, count in report["outcomes"].items():
+                outcomes[outcome] = outcomes.get(outcome, 0) + count
+        clock.lap("fallback")
+    return results, clock.report(outcomes)
+
+
+def sweep_batch(frames, symbols, tf_label, grid, rsi_div_on, ob_on):
+    """sweep_matrix() for the analytics stage → (rows, seconds spent).
+    Rows with no result in any combination are dropped. Failures raise to
+    run_sweep, which logs and counts them in the serving process."""
+    t0 = time.perf_counter()
+    rows = []
+    cells = sweep_matrix(frames, symbols, tf_label, *grid, rsi_div_on, ob_on)
+    for sym, f, row in zip(symbols, frames, cells):
+        if any(cell is not None for cell in row):
+            rows.append({"symbol": sym, "timeframe": tf_label,
+                         "price": round(float(np.asarray(f["Close"])[-1]), 2), "cells": row})
+    return rows, time.perf_counter() - t0
+
+
+# Write-through memory cache in front of BarStore.load_state
+STATE_CACHE_SIZE = 20000
+# A state whose RSI started before the frame is rebuilt from the frame's first
+# bar while that older history still weighs more than this in the RSI average
+# ((1 − 1/rsi_len) ** bars in the frame). With rsi_len 14 that is every slide
+# of a Weekly (2y, ~5e-4) or Monthly (5y, ~1e-2) window, i.e. once per new
+# bar, when the state replays the frame; updates of the forming bar and
+# series that only grow stay on the O(1) path. A carried-forward state
+# (Daily, 1H) differs from a full recompute by less than the tolerance in
+# RSI, which could only flip a pivot tied at that scale. Exact carry-forward
+# would need the RSI accumulators from every possible frame start.
+STATE_ANCHOR_TOLERANCE = 1e-6
+_STATE_CACHE = OrderedDict()
+_state_cache_lock = threading.Lock()
+
+
+def sync_state(state, bars, rsi_len, pivot_len):
+    """Bring a SignalState up to `bars` (to_bars(…, with_ts=True)), committing
+    every bar but the last, which may still be forming. Returns the input
+    state when there is nothing to commit, else a new one.
+
+    The state is rebuilt from the first bar when it is missing, keeps fewer
+    OBs than OB_LOOKBACK, predates pair tracking (div_from), or its last
+    committed bar is no longer in the frame with the same close — the
+    vendor re-adjusted the history, or — in short frames (Monthly) — when
+    the bars before the frame still weigh more than STATE_ANCHOR_TOLERANCE
+    in its RSI. What lies before the frame's first bar is trimmed away
+    (SignalState.trimmed), so the state never remembers more history than
+    analyze() would see."""
+    ts = bars["ts"]
+    start = 0
+    if state is not None and (state.__dict__.get("ob_keep", 10) != OB_LOOKBACK
+                              or "div_from" not in state.__dict__):
+        state = None
+    if state is not None and state.last_ts is not None:
+        pos = int(np.searchsorted(ts, state.last_ts))
+        if (pos < len(ts) and ts[pos] == state.last_ts and
+                abs(bars["Close"][pos] - state.last_close) <= ADJ_TOLERANCE * abs(state.last_close)):
+            start = pos + 1
+            # bars the state consumed before the frame's first one
+            before = state.n - 1 - pos
+            if before > 0 and (1.0 - 1.0 / rsi_len) ** len(ts) > STATE_ANCHOR_TOLERANCE:
+                state, start = None, 0
+        else:
+            state = None
+    if state is None:
+        state = SignalState(rsi_len, pivot_len)
+    elif start < len(ts) - 1:
+        state = state.copy()        # cached states are shared; never mutate them
+    o, h, l, c = bars["Open"], bars["High"], bars["Low"], bars["Close"]
+    for k in range(start, len(ts) - 1):
+        state.update(int(ts[k]), o[k], h[k], l[k], c[k])
+    # bar ts[0] is number state.n - (len(ts) - 1) of the state's history
+    return state.trimmed(max(state.n - (len(ts) - 1), 0))
+
+
+def analyze_incremental(bars, symbol, tf_label, rsi_len, pivot_len, ob_prox_pct,
+                        rsi_div_on=True, ob_on=True, ob_confirm_pct=0.0, source=None):
+    """analyze_bars() through the persisted SignalState: only bars newer than
+    the stored state are processed. Falls back to analyze() without a bar store.
+    `source` is the interval the bars were downloaded at ("1d" for Weekly /
+    Monthly resampled from daily bars); native and derived bars keep
+    separate states."""
+    clock = StageClock()
+    outcome = bars_outcome(len(bars["ts"]), rsi_len, pivot_len)
+    try:
+        if outcome != "ok":
+            result = None
+        elif BAR_STORE is None:
+            result = analyze(pd.DataFrame({k: v for k, v in bars.items() if k != "ts"}),
+                             symbol, tf_label, rsi_len, pivot_len, ob_prox_pct,
+                             rsi_div_on, ob_on, ob_confirm_pct, clock=clock)
+        else:
+            series = f"{tf_label}/{source or TF_CONFIG[tf_label]['interval']}"
+            key = (symbol, series, rsi_len, pivot_len)
+            with _state_cache_lock:
+                stored = _STATE_CACHE.get(key)
+            if stored is None:
+                stored = BAR_STORE.load_state(symbol, series, rsi_len, pivot_len)
+            last_ts = stored.last_ts if stored is not None else None
+            state = sync_state(stored, bars, rsi_len, pivot_len)
+            if state is not stored or state.last_ts != last_ts:
+                BAR_STORE.save_state(symbol, series, state)
+            with _state_cache_lock:
+                _STATE_CACHE[key] = state
+                _STATE_CACHE.move_to_end(key)
+                while len(_STATE_CACHE) > STATE_CACHE_SIZE:
+                    _STATE_CACHE.popitem(last=False)
+            clock.lap("state_sync")
+            ts = bars["ts"]
+            if state.last_ts != int(ts[-1]):
+                state = state.copy()
+                state.update(int(ts[-1]), bars["Open"][-1], bars["High"][-1],
+                             bars["Low"][-1], bars["Close"][-1])
+            result = state.emit(symbol, tf_label, ob_prox_pct, rsi_div_on, ob_on, ob_confirm_pct)
+            clock.lap("emit")
+    except Exception:
+        log.error("analyze_incremental failed: %s %s", symbol, tf_label, exc_info=True)
+        result, outcome = None, "error"
+    return result, clock.report({outcome: 1})
+
+
+def resample_bars(daily, rule):
+    """Aggregate Daily OHLCV into Weekly / Monthly bars on Yahoo's boundaries
+    (bins closed on the left, labelled with the first day of the bin)."""
+    agg = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+    cols = [c for c in agg if c in daily.columns]
+    out = daily[cols].resample(rule, label="left", closed="left").agg({c: agg[c] for c in cols})
+    return out.dropna(subset=["Close"])
+
+
+def fetch_plan(timeframes, derive_htf=False):
+    """Downloads needed for `timeframes` → [(interval, period, {tf_label: rule})].
+    A rule of None means the downloaded bars are used as-is; otherwise they
+    are the long daily base and tf_frame() cuts / resamples them."""
+    plan, derived = [], {}
+    for tf in timeframes:
+        cfg = TF_CONFIG[tf]
+        if derive_htf and (tf == "Daily" or tf in RESAMPLE_RULES):
+            derived[tf] = RESAMPLE_RULES.get(tf, "1d")
+        else:
+            plan.append((cfg["interval"], cfg["period"], {tf: None}))
+    if derived:
+        plan.append(("1d", DAILY_BASE_PERIOD, derived))
+    return plan
+
+
+def tf_frame(df, tf_label, rule):
+    """Bars for tf_label from a planned download: as-is when rule is None,
+    else cut from the daily base (resampled unless rule is "1d"). The
+    period is counted back from the last bar, as ArchiveProvider does, so
+    replayed history is windowed like a download made when it was live."""
+    if rule is None:
+        return df
+    if rule != "1d":
+        df = resample_bars(df, rule)
+    if df.empty:
+        return df
+    return df[df.index >= period_start(TF_CONFIG[tf_label]["period"], now=df.index[-1])]
+
+
+def htf_parity(symbol, rsi_len=14, pivot_len=5, provider=None):
+    """Compare resampled Weekly / Monthly bars with the vendor's native ones.
+
+    Returns, per timeframe, the worst relative OHLC gap on shared bars, the
+    RSI gap at the last bar and whether RSI / price pivots land on the same
+    dates — the inputs that decide scan_one's output. A timeframe with no
+    bars to compare (e.g. a new listing) reports an "error" instead."""
+    provider = provider or PROVIDER
+    daily = download_bars(symbol, "1d", DAILY_BASE_PERIOD, provider=provider)
+    report = {}
+    if daily is None:
+        return report
+    for tf, rule in RESAMPLE_RULES.items():
+        cfg = TF_CONFIG[tf]
+        native = download_bars(symbol, cfg["interval"], cfg["period"], provider=provider)
+        if native is None:
+            continue
+        derived = tf_frame(daily, tf, rule)
+        if not derived.empty:
+            native = native[native.index >= derived.index[0]]
+        if derived.empty or native.empty:
+            report[tf] = {"bars_native": len(native), "bars_derived": len(derived),
+                          "error": f"Not enough history to compare {tf} bars"}
+            continue
+        common = native.index.intersection(derived.index)
+        cols = ["Open", "High", "Low", "Close"]
+        gap = (derived.loc[common, cols] - native.loc[common, cols]).abs() / native.loc[common, cols]
+        rsi_n = calc_rsi(native["Close"], rsi_len)
+        rsi_d = calc_rsi(derived["Close"], rsi_len)
+
+        def dates(idx_list, index):
+            return [str(index[i].date()) for i in idx_list]
+
+        rsi_piv_n = find_rsi_pivots(rsi_n, pivot_len, pivot_len)
+        rsi_piv_d = find_rsi_pivots(rsi_d, pivot_len, pivot_len)
+        px_piv_n = find_pivots(native["High"], native["Low"], pivot_len, pivot_len)
+        px_piv_d = find_pivots(derived["High"], derived["Low"], pivot_len, pivot_len)
+        report[tf] = {
+            "bars_native":   len(native),
+            "bars_derived":  len(derived),
+            "bars_shared":   len(common),
+            "max_ohlc_gap":  float(gap.values.max()) if len(common) else None,
+            "last_rsi_gap":  float(abs(rsi_n.iloc[-1] - rsi_d.iloc[-1])),
+            "rsi_pivots_match": all(dates(a, native.index) == dates(b, derived.index)
+                                    for a, b in zip(rsi_piv_n, rsi_piv_d)),
+            "price_pivots_match": all(dates(a, native.index) == dates(b, derived.index)
+                                      for a, b in zip(px_piv_n, px_piv_d)),
+        }
+    return report
+
+
+_cpu_pool_lock = threading.Lock()
+_cpu_pool_instance = None
+
+
+def cpu_pool():
+    """Shared process pool for the analytics stage (None when SCAN_CPU_WORKERS=0).
+    Spawned rather than forked: the parent is multi-threaded."""
+    global _cpu_pool_instance
+    if SCAN_CPU_WORKERS <= 0:
+        return None
+    with _cpu_pool_lock:
+        if _cpu_pool_instance is None:
+            _cpu_pool_instance = ProcessPoolExecutor(
+                max_workers=SCAN_CPU_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _cpu_pool_instance
+
+
+def _fetch_stage(chunk, interval, period, provider, stats, arrays=False):
+    """load_bars_batch for one chunk. arrays: take zero-copy bars dicts
+    from a local provider that offers them (no resampling planned)."""
+    t0 = time.perf_counter()
+    try:
+        if arrays and provider.local and hasattr(provider, "bars_batch"):
+            return provider.bars_batch(chunk, interval, period, stats=stats)
+        return load_bars_batch(chunk, interval, period, provider, stats)
+    finally:
+        secs = time.perf_counter() - t0
+        METRICS.observe("screener_fetch_seconds", secs, kind="history", interval=interval)
+        stats.add("fetch_seconds", secs)
+        stats.add("fetch_batches")
+
+
+def stage_report(stats):
+    """Per-stage throughput of one scan from its ScanStats counters."""
+    c = stats.as_dict()
+    wall = c.get("wall_seconds", 0.0) or 1e-9
+    return {
+        "wall_s": round(wall, 3),
+        "fetch": {
+            "batches":   c.get("fetch_batches", 0),
+            "symbols":   c.get("symbols_fetched", 0),
+            "busy_s":    round(c.get("fetch_seconds", 0.0), 3),
+            "symbols_per_s": round(c.get("symbols_fetched", 0) / wall, 1),
+            "retries":   c.get("retries", 0),
+            "throttled": c.get("throttled", 0),
+            "failures":  c.get("fetch_failures", 0),
+            "missing":   c.get("symbols_missing", 0),
+            "stale":     c.get("stale", 0),       # stored series served after a failed top-up
+            "shared_hits": c.get("shared_hits", 0),
+            "coalesced": c.get("coalesced", 0),
+            "concurrency": round(FETCH_SCHEDULER.window, 2),
+        },
+        "analytics": {
+            "workers":   SCAN_CPU_WORKERS or "io-threads",
+            "tasks":     c.get("analytics_tasks", 0),
+            "busy_s":    round(c.get("analytics_seconds", 0.0), 3),
+            "tasks_per_s": round(c.get("analytics_tasks", 0) / wall, 1),
+        },
+    }
+
+
+def iter_scan(symbols, timeframes, rsi_len, pivot_len, ob_prox_pct,
+              rsi_div_on=True, ob_on=True, ob_confirm_pct=0.0,
+              provider=None, stats=None, derive_htf=False, defer_meta=False,
+              incremental=False, cancel=None, batched=None, io_workers=None, meta=True):
+    """Scan all symbols × timeframes, yielding each result as soon as its
+    analytics finish (unsorted).
+
+    I/O stage: `io_workers` (default SCAN_IO_WORKERS) threads, one bulk
+    download per (interval, chunk of symbols), paced and retried by
+    FETCH_SCHEDULER. Analytics stage: analyze() on compact arrays in the
+    cpu_pool() processes, or on the I/O threads when it is disabled — one
+    analyze_matrix() task per downloaded chunk × timeframe when `batched`
+    (default: per SCAN_BATCHED and provider.local). No new download starts while
+    SCAN_ANALYTICS_BACKLOG symbol × timeframe tasks are queued.
+    Pass a ScanStats to collect requests-per-scan and stage throughput
+    (see stage_report). Market caps are looked up once per symbol through
+    META_CACHE.
+    derive_htf: build Daily / Weekly / Monthly from one daily download.
+    defer_meta: don't wait for market caps — results carry cached values
+                only, the misses are warmed in the background.
+    meta:       False skips market-cap lookups altogether (cached values only).
+    incremental: analyze through persisted SignalStates (analyze_incremental),
+                 so only bars closed since the last scan are processed
+                 (takes precedence over `batched`).
+
+    Closing the generator early, or setting the `cancel` Event, cancels
+    the work still queued. stats["tasks_done"] counts finished
+    symbol × timeframe tasks, including those with no data."""
+    provider = provider or PROVIDER
+    stats = stats if stats is not None else ScanStats()
+    args = (rsi_len, pivot_len, ob_prox_pct, rsi_div_on, ob_on, ob_confirm_pct)
+    if batched is None:
+        batched = SCAN_BATCHED == "1" or (SCAN_BATCHED == "local" and provider.local)
+    started = time.perf_counter()
+
+    io_workers = io_workers or SCAN_IO_WORKERS
+    io_pool = ThreadPoolExecutor(max_workers=io_workers)
+    procs = cpu_pool()
+    fetching = {}       # future → (chunk, {tf_label: rule})
+    analysing = {}      # future → (symbol × timeframe tasks it covers, tf_label, submitted at)
+    try:
+        if not meta:
+            metas = {}
+        elif defer_meta:
+            missing = [sym for sym in symbols if not META_CACHE.peek(sym)[0]]
+            for sym in missing:
+                _META_POOL.submit(META_CACHE.market_cap, sym, provider)
+            metas = {}
+        else:
+            metas = {sym: io_pool.submit(META_CACHE.market_cap, sym, provider, stats)
+                     for sym in symbols}
+
+        # chunk-major, so all timeframes of a symbol finish close together
+        plan = fetch_plan(timeframes, derive_htf)
+        queued = deque((chunk, interval, period, tfs)
+                       for chunk in _chunks(list(symbols), FETCH_BATCH_SIZE)
+                       for interval, period, tfs in plan)
+
+        def start_fetches():
+            while (queued and len(fetching) < io_workers
+                   and sum(a[0] for a in analysing.values()) < SCAN_ANALYTICS_BACKLOG):
+                chunk, interval, period, tfs = queued.popleft()
+                fut = io_pool.submit(_fetch_stage, chunk, interval, period, provider, stats,
+                                     all(rule is None for rule in tfs.values()))
+                fetching[fut] = (chunk, tfs)
+
+        start_fetches()
+        while fetching or analysing:
+            done, _ = wait(set(fetching) | set(analysing), timeout=None if cancel is None else 0.5,
+                           return_when=FIRST_COMPLETED)
+            if cancel is not None and cancel.is_set():
+                return
+            for fut in done:
+                if fut in analysing:
+                    count, tf, submitted = analysing.pop(fut)
+                    stats.add("tasks_done", count)
+                    try:
+                        out, report = fut.result()
+                    except Exception:
+                        log.exception("analytics task failed: %d tasks %s", count, tf)
+                        METRICS.inc("screener_errors_total", where="analytics")
+                        record_task(stats, tf, {"seconds": 0.0, "stages": {}, "outcomes": {"error": count}})
+                        continue
+                    waited = max(time.perf_counter() - submitted - report["seconds"], 0.0)
+                    record_task(stats, tf, report, waited)
+                    stats.add("analytics_tasks", count)
+                    stats.add("analytics_seconds", report["seconds"])
+                    for r in (out if isinstance(out, list) else [out]):
+                        if r is None:
+                            continue
+                        if r["symbol"] in metas:
+                            r["mcap"] = metas[r["symbol"]].result()
+                        else:
+                            r["mcap"] = META_CACHE.peek(r["symbol"])[1]
+                        yield r
+                    continue
+
+                chunk, tfs = fetching.pop(fut)
+                outcome = "empty"
+                try:
+                    frames = fut.result()
+                except Exception:
+                    log.exception("fetch failed: %d symbols %s", len(chunk), ", ".join(tfs))
+                    METRICS.inc("screener_errors_total", where="fetch")
+                    frames, outcome = {}, "error"
+                stats.add("symbols_fetched", len(frames))
+                stats.add("tasks_done", (len(chunk) - len(frames)) * len(tfs))
+                if len(frames) < len(chunk):
+                    for tf in tfs:
+                        record_task(stats, tf, {"seconds": 0.0, "stages": {},
+                                                "outcomes": {outcome: len(chunk) - len(frames)}})
+                if batched and not incremental and frames:
+                    syms = list(frames)
+                    for tf, rule in tfs.items():
+                        dfs = [tf_frame(frames[sym], tf, rule) for sym in syms]
+                        if procs is not None:
+                            dfs = [to_bars(df) for df in dfs]
+                        fut = (procs or io_pool).submit(analyze_batch, dfs, syms, tf, *args)
+                        analysing[fut] = (len(syms), tf, time.perf_counter())
+                    frames = {}
+                for sym, raw in frames.items():
+                    for tf, rule in tfs.items():
+                        df = tf_frame(raw, tf, rule)
+                        if incremental:
+                            task = (analyze_incremental, to_bars(df, with_ts=True), sym, tf, *args,
+                                    "1d" if rule else None)
+                        elif procs is not None:
+                            task = (analyze_bars, to_bars(df), sym, tf, *args)
+                        else:
+                            task = (analyze_bars, df, sym, tf, *args)
+                        analysing[(procs or io_pool).submit(*task)] = (1, tf, time.perf_counter())
+            start_fetches()
+    finally:
+        for fut in analysing:
+            fut.cancel()
+        io_pool.shutdown(wait=False, cancel_futures=True)
+        wall = time.perf_counter() - started
+        stats.add("wall_seconds", wall)
+        METRICS.observe("screener_scan_seconds", wall)
+        METRICS.inc("screener_scans_total")
+        METRICS.inc("screener_requests_total", stats.as_dict().get("requests", 0))
+
+
+def sort_results(results):
+    """Sort in place: validated signals first, then by symbol."""
+    results.sort(key=lambda x: (not x["validated"], x["signal"] == "None", x["symbol"], x["timeframe"]))
+    return results
+
+
+def run_scan(symbols, timeframes, rsi_len, pivot_len, ob_prox_pct,
+             rsi_div_on=True, ob_on=True, ob_confirm_pct=0.0,
+             provider=None, stats=None, derive_htf=False, defer_meta=False,
+             incremental=False, batched=None):
+    """Scan all symbols × timeframes in parallel; see iter_scan."""
+    results = list(iter_scan(symbols, timeframes, rsi_len, pivot_len, ob_prox_pct,
+                             rsi_div_on, ob_on, ob_confirm_pct,
+                             provider, stats, derive_htf, defer_meta, incremental,
+                             batched=batched))
+    return sort_results(results)
+
+
+# Server-side versions of the results table's filters
+RESULT_FILTERS = {
+    "all":          lambda r: True,
+    "signals":      lambda r: r["signal"] != "None",
+    "validated":    lambda r: r["validated"],
+    "bullish":      lambda r: r["signal"] == "Bullish",
+    "bearish":      lambda r: r["signal"] == "Bearish",
+    "hidden":       lambda r: r["div_type"] == "Hidden",
+    "ob_confirmed": lambda r: bool(r.get("ob_confirmed")),
+}
+
+
+def signal_rank(r):
+    """Larger ranks first: validated, confirmed OB breakout, any signal,
+    near an OB, then how far RSI is from 50."""
+    return (bool(r["validated"]), bool(r.get("ob_confirmed")), r["signal"] != "None",
+            bool(r["near_ob"]), abs(r["rsi"] - 50))
+
+
+class ScanAggregate:
+    """Constant-size summary of a streamed scan: counts of everything seen
+    plus the `top_k` best-ranked results (signal_rank) passing `only`."""
+
+    def __init__(self, top_k=SCREEN_TOP_K, only="all"):
+        self.top_k = top_k
+        self.only = only
+        self._keep = RESULT_FILTERS[only]
+        self.counts = {"results": 0, "signals": 0, "validated": 0, "ob_confirmed": 0, "matched": 0}
+        self.by_timeframe = {}
+        self._heap = []                 # (rank, -arrival, result); worst kept on top
+        self._arrivals = itertools.count()
+
+    def add(self, r):
+        tf = self.by_timeframe.setdefault(r["timeframe"], {"results": 0, "signals": 0, "validated": 0})
+        for counts in (self.counts, tf):
+            counts["results"] += 1
+            counts["signals"] += r["signal"] != "None"
+            counts["validated"] += bool(r["validated"])
+        self.counts["ob_confirmed"] += bool(r.get("ob_confirmed"))
+        if not self._keep(r):
+            return
+        self.counts["matched"] += 1
+        item = (signal_rank(r), -next(self._arrivals), r)
+        if len(self._heap) < self.top_k:
+            heapq.heappush(self._heap, item)
+        elif item[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, item)
+
+    def results(self):
+        """The kept results, best first (earlier arrivals win ties)."""
+        return [item[2] for item in sorted(self._heap, key=lambda item: item[:2], reverse=True)]
+
+
+def iter_screen(symbols, timeframes, rsi_len, pivot_len, ob_prox_pct,
+                rsi_div_on=True, ob_on=True, ob_confirm_pct=0.0,
+                provider=None, stats=None, derive_htf=False, incremental=False,
+                top_k=SCREEN_TOP_K, only="all"):
+    """screen() step by step: yields its ScanAggregate after every result
+    folded in, and a last time once the kept results have market caps."""
+    agg = ScanAggregate(top_k, only)
+    scan = iter_scan(symbols, timeframes, rsi_len, pivot_len, ob_prox_pct,
+                     rsi_div_on, ob_on, ob_confirm_pct, provider, stats, derive_htf,
+                     incremental=incremental, meta=False)
+    try:
+        for r in scan:
+            agg.add(r)
+            yield agg
+    finally:
+        scan.close()
+    top = agg.results()
+    caps = META_CACHE.warm(sorted({r["symbol"] for r in top}), provider)
+    for r in top:
+        r["mcap"] = caps.get(r["symbol"])
+    yield agg
+
+
+def screen(symbols, timeframes, rsi_len, pivot_len, ob_prox_pct,
+           rsi_div_on=True, ob_on=True, ob_confirm_pct=0.0,
+           provider=None, stats=None, derive_htf=False, incremental=False,
+           top_k=SCREEN_TOP_K, only="all"):
+    """Scan a universe of any size in bounded memory → ScanAggregate.
+
+    Results are folded into the aggregate as they stream out of iter_scan
+    (whose downloads are chunked and throttled by SCAN_ANALYTICS_BACKLOG,
+    and whose frames are released once analysed), so memory depends on
+    `top_k`, not on the universe. Market caps are looked up for the kept
+    results only."""
+    for agg in iter_screen(symbols, timeframes, rsi_len, pivot_len, ob_prox_pct,
+                           rsi_div_on, ob_on, ob_confirm_pct, provider, stats, derive_htf,
+                           incremental, top_k, only):
+        pass
+    return agg
+
+
+# Confluence: one row per symbol instead of one per symbol × timeframe.
+# Higher timeframes weigh more (1H 1 … Monthly 4).
+TF_WEIGHT = {tf: k + 1 for k, tf in enumerate(TF_CONFIG)}
+DIRECTIONS = ("Bullish", "Bearish")
+
+
+def confluence_points(r, direction):
+    """How strongly one timeframe's result supports `direction`: divergence
+    2, validated by a nearby OB 1, near an OB of that side 1, confirmed OB
+    breakout that way 1."""
+    div = r["signal"] == direction and r["div_type"] != ""
+    return (2 * div + (div and bool(r["validated"])) + (r.get("ob_side") == direction)
+            + (r.get("ob_confirm_dir") == direction))
+
+
+def nested_signals(by_tf, direction, ob_prox_pct):
+    """(lower, higher) timeframe pairs where the lower one has a `direction`
+    divergence and its price sits inside the higher one's `direction` OB
+    zone (widened by ob_prox_pct), e.g. a Daily bullish divergence inside
+    a Weekly bullish OB."""
+    pairs = []
+    for low in by_tf.values():
+        if low["signal"] != direction or not low["div_type"]:
+            continue
+        for high in by_tf.values():
+            if (TF_WEIGHT[high["timeframe"]] > TF_WEIGHT[low["timeframe"]]
+                    and high.get("ob_side") == direction and high.get("ob_range")):
+                lo, hi = high["ob_range"]
+                if lo * (1 - ob_prox_pct) <= low["price"] <= hi * (1 + ob_prox_pct):
+                    pairs.append((low["timeframe"], high["timeframe"]))
+    return pairs
+
+
+def score_confluence(by_tf, ob_prox_pct):
+    """One symbol's results {tf_label: result} → its confluence row.
+
+    Each side scores Σ TF_WEIGHT × confluence_points over the timeframes,
+    plus the higher timeframe's weight for every nested_signals pair. The
+    stronger side is the row's direction and its score is the margin over
+    the other side, so conflicting timeframes pull a symbol down; each
+    timeframe is aligned or opposed by which side it leans to. rsi_bias
+    (mean distance of the aligned timeframes' RSI from 50 towards the
+    reversal side) breaks ties."""
+    scores, nested = {}, {}
+    for d in DIRECTIONS:
+        nested[d] = nested_signals(by_tf, d, ob_prox_pct)
+        scores[d] = (sum(TF_WEIGHT[tf] * confluence_points(r, d) for tf, r in by_tf.items())
+                     + sum(TF_WEIGHT[high] for _, high in nested[d]))
+    direction, other = sorted(DIRECTIONS, key=lambda d: -scores[d])
+    ordered = sorted(by_tf, key=TF_WEIGHT.get)
+    lean = {tf: confluence_points(by_tf[tf], direction) - confluence_points(by_tf[tf], other)
+            for tf in ordered}
+    aligned = [tf for tf in ordered if lean[tf] > 0]
+    opposed = [tf for tf in ordered if lean[tf] < 0]
+    sign = 1 if direction == "Bullish" else -1
+    rsi_bias = (sum(sign * (50 - by_tf[tf]["rsi"]) for tf in aligned) / len(aligned)
+                if aligned else 0.0)
+    first = by_tf[ordered[0]]           # lowest timeframe has the freshest price
+    return {
+        "symbol":     first["symbol"],
+        "direction":  direction if scores[direction] else "None",
+        "score":      scores[direction] - scores[other],
+        "aligned":    aligned,
+        "opposed":    opposed,
+        "nested":     [f"{low} in {high}" for low, high in nested[direction]],
+        "rsi":        {tf: by_tf[tf]["rsi"] for tf in ordered},
+        "rsi_bias":   round(rsi_bias, 1),
+        "price":      first["price"],
+        "mcap":       first["mcap"],
+        "timeframes": {tf: by_tf[tf] for tf in ordered},
+    }
+
+
+def confluence_rank(row):
+    """Larger ranks first: score, aligned timeframes, nested pairs, rsi_bias."""
+    return (row["score"], len(row["aligned"]), len(row["nested"]), row["rsi_bias"])
+
+
+class ConfluenceAggregate:
+    """Streams scan results into per-symbol confluence rows, keeping the
+    `top_n` best-ranked (confluence_rank) with at least `min_aligned`
+    aligned timeframes and, unless `direction` is "all", that direction.
+
+    A symbol is scored as soon as all `timeframes` have reported (finish()
+    scores the rest), so only symbols still in flight are held in full."""
+
+    def __init__(self, timeframes, ob_prox_pct, top_n=CONFLUENCE_TOP_N,
+                 direction="all", min_aligned=CONFLUENCE_MIN_ALIGNED):
+        self.expected = len(timeframes)
+        self.ob_prox_pct = ob_prox_pct
+        self.top_n = top_n
+        self.direction = direction
+        self.min_aligned = min_aligned
+        self.counts = {"results": 0, "symbols": 0, "matched": 0, "Bullish": 0, "Bearish": 0}
+        self._pending = {}              # symbol → {tf_label: result}
+        self._heap = []                 # (rank, -arrival, row); worst kept on top
+        self._arrivals = itertools.count()
+
+    def add(self, r):
+        self.counts["results"] += 1
+        by_tf = self._pending.setdefault(r["symbol"], {})
+        by_tf[r["timeframe"]] = r
+        if len(by_tf) == self.expected:
+            self._score(self._pending.pop(r["symbol"]))
+
+    def finish(self):
+        """Score the symbols that some timeframe never reported for."""
+        while self._pending:
+            self._score(self._pending.popitem()[1])
+
+    def _score(self, by_tf):
+        row = score_confluence(by_tf, self.ob_prox_pct)
+        self.counts["symbols"] += 1
+        if row["direction"] != "None" and len(row["aligned"]) >= self.min_aligned:
+            self.counts[row["direction"]] += 1
+        if (len(row["aligned"]) < self.min_aligned or row["score"] <= 0
+                or self.direction not in ("all", row["direction"].lower())):
+            return
+        self.counts["matched"] += 1
+        item = (confluence_rank(row), -next(self._arrivals), row)
+        if len(self._heap) < self.top_n:
+            heapq.heappush(self._heap, item)
+        elif item[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, item)
+
+    def results(self):
+        """The kept rows, best first (earlier arrivals win ties)."""
+        return [item[2] for item in sorted(self._heap, key=lambda item: item[:2], reverse=True)]
+
+
+def rank_confluence(symbols, timeframes, rsi_len, pivot_len, ob_prox_pct,
+                    rsi_div_on=True, ob_on=True, ob_confirm_pct=0.0,
+                    provider=None, stats=None, derive_htf=False, incremental=False,
+                    top_n=CONFLUENCE_TOP_N, direction="all", min_aligned=CONFLUENCE_MIN_ALIGNED):
+    """Scan symbols × timeframes and rank symbols by multi-timeframe
+    confluence → ConfluenceAggregate. Scores come from the scan results
+    themselves (signals, OB zones, RSI), so nothing is fetched or analysed
+    twice; like screen(), market caps are looked up for the kept rows only."""
+    agg = ConfluenceAggregate(timeframes, ob_prox_pct, top_n, direction, min_aligned)
+    for r in iter_scan(symbols, timeframes, rsi_len, pivot_len, ob_prox_pct,
+                       rsi_div_on, ob_on, ob_confirm_pct, provider, stats, derive_htf,
+                       incremental=incremental, meta=False):
+        agg.add(r)
+    agg.finish()
+    top = agg.results()
+    caps = META_CACHE.warm(sorted({row["symbol"] for row in top}), provider)
+    for row in top:
+        row["mcap"] = caps.get(row["symbol"])
+        for r in row["timeframes"].values():
+            r["mcap"] = row["mcap"]
+    return agg
+
+
+def run_sweep(symbols, timeframes, rsi_lens, pivot_lens, prox_pcts, confirm_pcts,
+              rsi_div_on=True, ob_on=True, provider=None, stats=None, derive_htf=False):
+    """Scan symbols × timeframes for every combination of the parameter
+    lists. Each symbol / interval is downloaded once, exactly as in
+    iter_scan; every chunk × timeframe then runs one sweep_batch over the
+    whole grid. Returns (combos, rows sorted by symbol / timeframe)."""
+    provider = provider or PROVIDER
+    stats = stats if stats is not None else ScanStats()
+    grid = (rsi_lens, pivot_lens, prox_pcts, confirm_pcts)
+    started = time.perf_counter()
+    procs = cpu_pool()
+    rows = []
+    io_pool = ThreadPoolExecutor(max_workers=SCAN_IO_WORKERS)
+    try:
+        fetching = {io_pool.submit(_fetch_stage, chunk, interval, period, provider, stats,
+                                   all(rule is None for rule in tfs.values())): (chunk, tfs)
+                    for interval, period, tfs in fetch_plan(timeframes, derive_htf)
+                    for chunk in _chunks(list(symbols), FETCH_BATCH_SIZE)}
+        analysing = {}
+        for fut in as_completed(fetching):
+            chunk, tfs = fetching[fut]
+            try:
+                frames = fut.result()
+            except Exception:
+                log.exception("sweep fetch failed: %d symbols %s", len(chunk), ", ".join(tfs))
+                METRICS.inc("screener_errors_total", where="sweep")
+                continue
+            stats.add("symbols_fetched", len(frames))
+            syms = list(frames)
+            for tf, rule in tfs.items():
+                dfs = [tf_frame(frames[sym], tf, rule) for sym in syms]
+                if procs is not None:
+                    dfs = [to_bars(df) for df in dfs]
+                task = (procs or io_pool).submit(sweep_batch, dfs, syms, tf, grid, rsi_div_on, ob_on)
+                analysing[task] = len(syms)
+        for task in as_completed(analysing):
+            try:
+                out, secs = task.result()
+            except Exception:
+                log.exception("sweep task failed: %d symbols", analysing[task])
+                METRICS.inc("screener_errors_total", where="sweep")
+                continue
+            stats.add("analytics_tasks", analysing[task])
+            stats.add("analytics_seconds", secs)
+            rows.extend(out)
+    finally:
+        io_pool.shutdown(wait=False, cancel_futures=True)
+        stats.add("wall_seconds", time.perf_counter() - started)
+    rows.sort(key=lambda r: (r["symbol"], r["timeframe"]))
+    return sweep_combos(*grid), rows
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# BACKTEST
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def walk_forward(bars, symbol, tf_label, rsi_len, pivot_len, ob_prox_pct,
+                 rsi_div_on=True, ob_on=True, ob_confirm_pct=0.0):
+    """Signal onsets the scanner would have reported over the history in
+    `bars` (to_bars(…, with_ts=True)), without repainting.
+
+    One SignalState pass: at every bar it holds exactly what analyze()
+    sees on the prefix ending there — pivots confirmed pivot_len bars
+    later, order blocks of the newest bars still provisional — so the
+    whole history costs O(n · pivot_len) instead of a scan per prefix.
+    Returns [(bar index, result)] for each bar where a validated signal
+    appears or changes kind."""
+    state = SignalState(rsi_len, pivot_len)
+    o, h, l, c, ts = bars["Open"], bars["High"], bars["Low"], bars["Close"], bars["ts"]
+    onsets = []
+    prev = None
+    for k in range(len(ts)):
+        state.update(int(ts[k]), o[k], h[k], l[k], c[k])
+        r = state.emit(symbol, tf_label, ob_prox_pct, rsi_div_on, ob_on, ob_confirm_pct)
+        kind = (r["signal"], r["div_type"]) if r is not None and r["validated"] else None
+        if kind is not None and kind != prev:
+            onsets.append((k, r))
+        prev = kind
+    return onsets
+
+
+def signal_outcomes(bars, onsets, horizons):
+    """Forward return after each horizon (in the signal's direction) and the
+    worst adverse excursion within the longest one, entering at the signal
+    bar's close. Horizons that run past the data are None."""
+    h, l, c = bars["High"], bars["Low"], bars["Close"]
+    n = len(c)
+    longest = max(horizons)
+    events = []
+    for k, r in onsets:
+        side = 1.0 if r["signal"] == "Bullish" else -1.0
+        entry = c[k]
+        returns = {str(hz): (round(side * (c[k + hz] / entry - 1.0), 6) if k + hz < n else None)
+                   for hz in horizons}
+        drawdown = None
+        if k + longest < n:
+            if side > 0:
+                adverse = l[k + 1:k + longest + 1].min() / entry - 1.0
+            else:
+                adverse = 1.0 - h[k + 1:k + longest + 1].max() / entry
+            drawdown = round(min(float(adverse), 0.0), 6)
+        events.append({"symbol": r["symbol"], "timeframe": r["timeframe"], "ts": int(bars["ts"][k]),
+                       "signal": r["signal"], "div_type": r["div_type"],
+                       "ob_confirmed": r["ob_confirmed"], "price": r["price"],
+                       "returns": returns, "drawdown": drawdown})
+    return events
+
+
+def backtest_bars(bars, symbol, tf_label, args, horizons):
+    """walk_forward + signal_outcomes for the analytics stage → (events, seconds).
+    Failures raise to run_backtest, which logs and counts them."""
+    t0 = time.perf_counter()
+    events = signal_outcomes(bars, walk_forward(bars, symbol, tf_label, *args), horizons)
+    return events, time.perf_counter() - t0
+
+
+def summarize_backtest(events, horizons):
+    """Per timeframe × signal type: count, average return and hit rate per
+    horizon, average and worst drawdown."""
+    groups = {}
+    for e in events:
+        groups.setdefault((e["timeframe"], e["signal"], e["div_type"]), []).append(e)
+    tf_order = list(TF_CONFIG)
+    summary = []
+    for (tf, signal, div_type), group in sorted(
+            groups.items(), key=lambda kv: (tf_order.index(kv[0][0]), kv[0][1], kv[0][2])):
+        per_horizon = {}
+        for hz in horizons:
+            rets = [e["returns"][str(hz)] for e in group if e["returns"][str(hz)] is not None]
+            per_horizon[str(hz)] = {
+                "n":          len(rets),
+                "avg_return": round(float(np.mean(rets)), 6) if rets else None,
+                "hit_rate":   round(sum(1 for x in rets if x > 0) / len(rets), 4) if rets else None,
+            }
+        dds = [e["drawdown"] for e in group if e["drawdown"] is not None]
+        summary.append({
+            "timeframe":    tf,
+            "signal":       signal,
+            "div_type":     div_type,
+            "signals":      len(group),
+            "horizons":     per_horizon,
+            "avg_drawdown": round(float(np.mean(dds)), 6) if dds else None,
+            "max_drawdown": round(float(min(dds)), 6) if dds else None,
+        })
+    return summary
+
+
+def _history_stage(chunk, interval, period, provider, stats, refresh, arrays=False):
+    """History for a backtest: whatever the bar store holds (often more than
+    `period`), downloading only the symbols it doesn't have."""
+    if BAR_STORE is None or refresh or provider.local:
+        return _fetch_stage(chunk, interval, period, provider, stats, arrays)
+    out, missing = {}, []
+    for sym in chunk:
+        df, _ = BAR_STORE.load(sym, interval)
+        if df is None:
+            missing.append(sym)
+        else:
+            out[sym] = df
+    if missing:
+        out.update(_fetch_stage(missing, interval, period, provider, stats))
+    return out
+
+
+def run_backtest(symbols, timeframes, rsi_len, pivot_len, ob_prox_pct,
+                 rsi_div_on=True, ob_on=True, ob_confirm_pct=0.0,
+                 horizons=BACKTEST_HORIZONS, provider=None, stats=None,
+                 derive_htf=False, refresh=False):
+    """Walk-forward backtest of validated signals over symbols × timeframes,
+    one task per series on the analytics stage (cpu_pool() when enabled).
+    History comes from the bar store; refresh tops it up from the provider
+    first. Returns (summary, events)."""
+    provider = provider or PROVIDER
+    stats = stats if stats is not None else ScanStats()
+    args = (rsi_len, pivot_len, ob_prox_pct, rsi_div_on, ob_on, ob_confirm_pct)
+    horizons = sorted(set(horizons))
+    started = time.perf_counter()
+    procs = cpu_pool()
+    events = []
+    io_pool = ThreadPoolExecutor(max_workers=SCAN_IO_WORKERS)
+    try:
+        loading = {io_pool.submit(_history_stage, chunk, interval, period, provider, stats,
+                                  refresh, all(rule is None for rule in tfs.values())): tfs
+                   for interval, period, tfs in fetch_plan(timeframes, derive_htf)
+                   for chunk in _chunks(list(symbols), FETCH_BATCH_SIZE)}
+        testing = {}
+        for fut in as_completed(loading):
+            try:
+                frames = fut.result()
+            except Exception:
+                log.exception("backtest fetch failed: %s", ", ".join(loading[fut]))
+                METRICS.inc("screener_errors_total", where="backtest")
+                continue
+            stats.add("symbols_fetched", len(frames))
+            for sym, raw in frames.items():
+                for tf, rule in loading[fut].items():
+                    bars = to_bars(tf_frame(raw, tf, rule), with_ts=True)
+                    testing[(procs or io_pool).submit(
+                        backtest_bars, bars, sym, tf, args, horizons)] = (sym, tf)
+        for fut in as_completed(testing):
+            try:
+                out, secs = fut.result()
+            except Exception:
+                log.exception("backtest failed: %s %s", *testing[fut])
+                METRICS.inc("screener_errors_total", where="backtest")
+                continue
+            stats.add("analytics_tasks")
+            stats.add("analytics_seconds", secs)
+            events.extend(out)
+    finally:
+        io_pool.shutdown(wait=False, cancel_futures=True)
+        stats.add("wall_seconds", time.perf_counter() - started)
+    events.sort(key=lambda e: (e["ts"], e["symbol"], e["timeframe"]))
+    return summarize_backtest(events, horizons), events
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SCAN JOBS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def job_key(params):
+    """Hash of the parameters that decide a scan's output (symbol and
+    timeframe order and defer_meta don't)."""
+    canon = dict(params)
+    canon.pop("defer_meta", None)
+    canon["symbols"] = sorted(set(canon["symbols"]))
+    canon["timeframes"] = sorted(set(canon["timeframes"]))
+    return hashlib.sha1(json.dumps(canon, sort_keys=True).encode()).hexdigest()
+
+
+class ScanJob:
+    """One scan running in the background, detached from any HTTP request.
+    Partial results accumulate in arrival order; `clients` counts the
+    submitters sharing it so one user's cancel doesn't kill another's scan."""
+
+    def __init__(self, params, key):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.params = params
+        self.total = len(params["symbols"]) * len(params["timeframes"])
+        self.stats = ScanStats()
+        self.results = []
+        self.status = "running"
+        self.error = None
+        self.clients = 1
+        self.created = time.time()
+        self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        status, error = "done", None
+        try:
+            for r in iter_scan(**self.params, stats=self.stats, cancel=self._cancel):
+                with self._lock:
+                    self.results.append(r)
+            if self._cancel.is_set():
+                status = "cancelled"
+        except Exception as e:
+            log.exception("scan job %s failed", self.id)
+            METRICS.inc("screener_errors_total", where="job")
+            status, error = "error", str(e)
+        finally:
+            # `finished` first: a job that reads as finished always has it set
+            with self._lock:
+                self.finished = time.time()
+                self.error = error
+                self.status = status
+
+    def cancel(self):
+        self._cancel.set()
+
+    def snapshot(self, since=0):
+        """Progress plus results[since:] so pollers only receive new rows."""
+        with self._lock:
+            new = self.results[since:]
+            count = len(self.results)
+        results = sort_results(list(new)) if since == 0 and self.status == "done" else new
+        return {
+            "id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "done": min(self.stats.as_dict().get("tasks_done", 0), self.total),
+            "total": self.total,
+            "result_count": count,
+            "results": results,
+            "summary": scan_summary(self.results, self.params, self.stats)
+                       if self.status == "done" else None,
+        }
+
+
+class JobRegistry:
+    """Scan jobs by id. An identical parameter set submitted while a job is
+    running, or within JOB_FRESHNESS seconds of it finishing, reuses it."""
+
+    def __init__(self, freshness=JOB_FRESHNESS, retention=JOB_RETENTION):
+        self.freshness = freshness
+        self.retention = retention
+        self._jobs = {}
+        self._by_key = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        for job_id, job in list(self._jobs.items()):
+            if job.finished is not None and now - job.finished > self.retention:
+                del self._jobs[job_id]
+                if self._by_key.get(job.key) is job:
+                    del self._by_key[job.key]
+
+    def submit(self, params):
+        """→ (job, reused)"""
+        key = job_key(params)
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            job = self._by_key.get(key)
+            finished = job.finished if job is not None else None
+            if job is not None and (job.status == "running" or
+                                    (job.status == "done" and finished is not None
+                                     and now - finished <= self.freshness)):
+                job.clients += 1
+                return job, True
+            job = ScanJob(params, key)
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+        return job.start(), False
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def release(self, job_id):
+        """Drop one client; cancel the scan when none are left."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.clients = max(job.clients - 1, 0)
+            if job.clients == 0 and job.status == "running":
+                job.cancel()
+            return job
+
+
+JOBS = JobRegistry()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# WATCH
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Result fields whose change is pushed as a "changed" signal
+WATCH_FIELDS = ("signal", "div_type", "validated", "near_ob", "ob_confirmed")
+
+
+def bar_bucket(tf_label, now):
+    """Identifies the bar of `tf_label` in progress at `now` (a UTC Timestamp):
+    it changes exactly when a bar closes. 1H bars close every hour of the
+    session and at WATCH_SESSION_CLOSE; daily and longer bars close at
+    WATCH_SESSION_CLOSE of their last weekday (exchange holidays aside)."""
+    t = now.tz_convert(WATCH_TZ)
+    if tf_label == "1H":
+        # The bucket is the last 1H close: it stands still outside the session
+        day = t.normalize()
+        if day.weekday() < 5:
+            if t >= day + WATCH_SESSION_CLOSE:
+                return day + WATCH_SESSION_CLOSE
+            last = (t - WATCH_HOUR_OFFSET).floor("h") + WATCH_HOUR_OFFSET
+            if last > day + WATCH_SESSION_OPEN:
+                return last
+        day -= pd.Timedelta(days=1)
+        while day.weekday() >= 5:
+            day -= pd.Timedelta(days=1)
+        return day + WATCH_SESSION_CLOSE
+    # Session the daily bar in progress belongs to: after the close, the next weekday's
+    day = (t - WATCH_SESSION_CLOSE).normalize() + pd.Timedelta(days=1)
+    if day.weekday() >= 5:
+        day += pd.Timedelta(days=7 - day.weekday())
+    if tf_label == "Daily":
+        return day
+    if tf_label == "Weekly":
+        return day - pd.Timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def is_signal(r):
+    return r["signal"] != "None" or bool(r.get("ob_confirmed"))
+
+
+def signal_delta(before, after, scanned):
+    """Added / removed / changed signals between {(symbol, tf): result}
+    snapshots, over the `scanned` pairs only (a pair that wasn't scanned,
+    e.g. its download failed, keeps its signal)."""
+    added, removed, changed = [], [], []
+    for key in sorted(scanned):
+        old, new = before.get(key), after.get(key)
+        if old is None and new is not None:
+            added.append(new)
+        elif old is not None and new is None:
+            removed.append(old)
+        elif old is not None:
+            fields = [f for f in WATCH_FIELDS if old.get(f) != new.get(f)]
+            if fields:
+                changed.append({"before": old, "after": new, "fields": fields})
+    return {"added": added, "removed": removed, "changed": changed}
+
+
+class Watch:
+    """A scan kept live: the signal snapshot of one watchlist and parameter
+    set, refreshed timeframe by timeframe as bars close (bar_bucket).
+
+    Each cycle scans only the due timeframes and publishes the signals that
+    were added, removed or changed to every subscriber's queue. Runs until
+    stopped, or until nobody has listened for WATCH_IDLE seconds."""
+
+    def __init__(self, params, key):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.params = params
+        self.signals = {}               # (symbol, tf) → result with a signal
+        self.buckets = {}               # tf → bar_bucket() last scanned
+        self.cycles = 0
+        self.last_cycle = None
+        self.seq = 0
+        self.created = self.idle_since = time.time()
+        self._subscribers = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            for q in self._subscribers:
+                q.put(None)
+
+    @property
+    def running(self):
+        return not self._stop.is_set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.cycle()
+            except Exception:
+                log.exception("watch %s cycle failed", self.id)
+                METRICS.inc("screener_errors_total", where="watch")
+            with self._lock:
+                idle = not self._subscribers and time.time() - self.idle_since > WATCH_IDLE
+            if idle:
+                self.stop()
+            self._stop.wait(WATCH_POLL)
+
+    def due(self, now):
+        """Timeframes with a bar closed (WATCH_SETTLE seconds ago) since their last scan."""
+        settled = now - pd.Timedelta(seconds=WATCH_SETTLE)
+        return {tf: bar_bucket(tf, settled) for tf in self.params["timeframes"]
+                if self.buckets.get(tf) != bar_bucket(tf, settled)}
+
+    def cycle(self, now=None):
+        """Re-scan the due timeframes → the published event, or None."""
+        due = self.due(now if now is not None else pd.Timestamp.now(tz="UTC"))
+        if not due:
+            return None
+        stats = ScanStats()
+        started = time.perf_counter()
+        scanned, found = set(), {}
+        for r in iter_scan(**{**self.params, "timeframes": list(due)}, stats=stats,
+                           cancel=self._stop):
+            key = (r["symbol"], r["timeframe"])
+            scanned.add(key)
+            if is_signal(r):
+                found[key] = r
+        if self._stop.is_set():
+            return None
+        with self._lock:
+            delta = signal_delta(self.signals, found, scanned)
+            for key in scanned:
+                self.signals.pop(key, None)
+            self.signals.update(found)
+            self.buckets.update(due)
+            self.cycles += 1
+            self.last_cycle = {
+                "timestamp":  datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "timeframes": list(due),
+                "pairs":      len(scanned),
+                "seconds":    round(time.perf_counter() - started, 3),
+                "requests":   stats.as_dict().get("requests", 0),
+            }
+            if not any(delta.values()):
+                return None
+            return self._publish({"type": "delta", **delta, "cycle": self.last_cycle})
+
+    def _publish(self, event):
+        """Number `event` and queue it for every subscriber (call with the lock held)."""
+        self.seq += 1
+        event["seq"] = self.seq
+        for q in self._subscribers:
+            q.put(event)
+        return event
+
+    def snapshot(self):
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self):
+        return {
+            "type":       "snapshot",
+            "id":         self.id,
+            "running":    self.running,
+            "seq":        self.seq,
+            "cycles":     self.cycles,
+            "last_cycle": self.last_cycle,
+            "buckets":    {tf: str(b) for tf, b in self.buckets.items()},
+            "signals":    sort_results(list(self.signals.values())),
+        }
+
+    def subscribe(self):
+        """Queue of events for one listener, starting with a snapshot. Taken
+        under the lock that publishes deltas, so none falls between the two."""
+        q = queue.Queue()
+        with self._lock:
+            q.put(self._snapshot())
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q):
+        """→ whether `q` was subscribed"""
+        with self._lock:
+            subscribed = q in self._subscribers
+            if subscribed:
+                self._subscribers.remove(q)
+            if not self._subscribers:
+                self.idle_since = time.time()
+        return subscribed
+
+
+class WatchRegistry:
+    """Watches by id; watching an already watched parameter set joins it."""
+
+    def __init__(self):
+        self._watches = {}
+        self._by_key = {}
+        self.listeners = 0              # open event streams, over all watches
+        self._lock = threading.Lock()
+
+    def subscribe(self, watch):
+        """watch.subscribe(), or None when WATCH_MAX_LISTENERS streams are open."""
+        with self._lock:
+            if self.listeners >= WATCH_MAX_LISTENERS:
+                return None
+            self.listeners += 1
+        return watch.subscribe()
+
+    def unsubscribe(self, watch, q):
+        """Release a subscribe()d stream; safe to call more than once."""
+        if watch.unsubscribe(q):
+            with self._lock:
+                self.listeners -= 1
+
+    def _prune(self):
+        for watch_id, watch in list(self._watches.items()):
+            if not watch.running:
+                del self._watches[watch_id]
+                if self._by_key.get(watch.key) is watch:
+                    del self._by_key[watch.key]
+
+    def submit(self, params):
+        """→ (watch, reused)"""
+        key = job_key(params)
+        with self._lock:
+            self._prune()
+            watch = self._by_key.get(key)
+            if watch is not None:
+                return watch, True
+            watch = Watch(params, key)
+            self._watches[watch.id] = self._by_key[key] = watch
+        return watch.start(), False
+
+    def get(self, watch_id):
+        with self._lock:
+            self._prune()
+            return self._watches.get(watch_id)
+
+    def stop(self, watch_id):
+        with self._lock:
+            watch = self._watches.pop(watch_id, None)
+            if watch is not None and self._by_key.get(watch.key) is watch:
+                del self._by_key[watch.key]
+        if watch is not None:
+            watch.stop()
+        return watch
+
+
+WATCHES = WatchRegistry()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PRECOMPUTE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def in_session(now):
+    """Whether `now` (a UTC Timestamp) falls in a weekday exchange session."""
+    t = now.tz_convert(WATCH_TZ)
+    return t.weekday() < 5 and WATCH_SESSION_OPEN <= t - t.normalize() <= WATCH_SESSION_CLOSE
+
+
+def default_scan_params():
+    """The parse_scan_request() defaults that decide a scan's output."""
+    params, _ = parse_scan_request({"symbols": ["-"]})
+    for key in ("symbols", "timeframes", "defer_meta"):
+        params.pop(key)
+    return params
+
+
+class Precomputer:
+    """Keeps the presets scanned with default parameters in the background.
+
+    One thread walks the presets in priority order every WATCH_POLL seconds
+    and re-scans a preset's timeframes that are due: a bar closed since the
+    last scan (bar_bucket), or PRECOMPUTE_REFRESH seconds passed during the
+    session. Its scans are background ScanStats on PRECOMPUTE_WORKERS
+    threads, so interactive scans keep priority on the provider."""
+
+    def __init__(self, presets):
+        self.presets = [p for p in presets if p in PRESET_WATCHLISTS]
+        self.snapshots = {}             # (preset, tf) → {"results": {symbol: result | None}, "at", "bucket"}
+        self._defaults = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def defaults(self):
+        if self._defaults is None:
+            self._defaults = default_scan_params()
+        return self._defaults
+
+    def start(self):
+        """Start the scheduler thread once (no-op without presets)."""
+        with self._lock:
+            if self._thread is None and self.presets:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            for preset in self.presets:
+                if self._stop.is_set():
+                    break
+                now = pd.Timestamp.now(tz="UTC")
+                due = self.due(preset, now)
+                if due:
+                    try:
+                        self.refresh(preset, due)
+                    except Exception:
+                        log.exception("precompute failed: %s %s", preset, ", ".join(due))
+                        METRICS.inc("screener_errors_total", where="precompute")
+            self._stop.wait(WATCH_POLL)
+
+    def due(self, preset, now):
+        """{tf: bar_bucket} of the preset's timeframes to re-scan at `now`."""
+        settled = now - pd.Timedelta(seconds=WATCH_SETTLE)
+        session = in_session(now)
+        due = {}
+        with self._lock:
+            for tf in TF_CONFIG:
+                bucket = bar_bucket(tf, settled)
+                snap = self.snapshots.get((preset, tf))
+                if (snap is None or snap["bucket"] != bucket
+                        or (session and time.time() - snap["at"] > PRECOMPUTE_REFRESH)):
+                    due[tf] = bucket
+        return due
+
+    def refresh(self, preset, due):
+        """Scan `preset` on the due timeframes and replace their snapshots."""
+        symbols = PRESET_WATCHLISTS[preset]
+        results = {tf: dict.fromkeys(symbols) for tf in due}
+        stats = ScanStats(background=True)
+        for r in iter_scan(symbols, list(due), **self.defaults, stats=stats, cancel=self._stop,
+                           io_workers=PRECOMPUTE_WORKERS):
+            results[r["timeframe"]][r["symbol"]] = r
+        if self._stop.is_set():
+            return
+        at = time.time()
+        with self._lock:
+            for tf, bucket in due.items():
+                self.snapshots[(preset, tf)] = {"results": results[tf], "at": at, "bucket": bucket}
+        METRICS.inc("screener_precompute_scans_total", preset=preset)
+
+    def serve(self, params):
+        """(sorted results, snapshot info) for a default-parameter scan of
+        (a subset of) one preset whose snapshots are all younger than
+        PRECOMPUTE_MAX_AGE, else None."""
+        if {k: v for k, v in params.items()
+                if k not in ("symbols", "timeframes", "defer_meta")} != self.defaults:
+            return None
+        symbols = set(params["symbols"])
+        now = time.time()
+        with self._lock:
+            for preset in self.presets:
+                if not symbols <= set(PRESET_WATCHLISTS[preset]):
+                    continue
+                snaps = [self.snapshots.get((preset, tf)) for tf in params["timeframes"]]
+                if not snaps or any(snap is None for snap in snaps):
+                    continue
+                oldest = min(snap["at"] for snap in snaps)
+                if now - oldest > PRECOMPUTE_MAX_AGE:
+                    continue
+                results = [snap["results"][sym] for snap in snaps for sym in params["symbols"]
+                           if snap["results"].get(sym) is not None]
+                METRICS.inc("screener_precompute_hits_total", preset=preset)
+                return sort_results(results), {
+                    "preset": preset,
+                    "age_s": round(now - oldest, 1),
+                    "computed_at": datetime.fromtimestamp(oldest).strftime("%Y-%m-%d %H:%M:%S"),
+                }
+        return None
+
+    def status(self):
+        now = time.time()
+        with self._lock:
+            return {preset: {tf: round(now - self.snapshots[(preset, tf)]["at"], 1)
+                             for tf in TF_CONFIG if (preset, tf) in self.snapshots}
+                    for preset in self.presets}
+
+
+PRECOMPUTE = Precomputer(list(PRESET_WATCHLISTS) if PRECOMPUTE_PRESETS.strip() == "all" else
+                         [p.strip() for p in PRECOMPUTE_PRESETS.split(",") if p.strip()])
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ROUTES
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@app.before_request
+def start_background():
+    """Start the precompute scheduler with the first request a worker serves."""
+    PRECOMPUTE.start()
+
+
+@app.route("/")
+def index():
+    return render_template("index.html", presets=PRESET_WATCHLISTS)
+
+
+def parse_scan_request(data):
+    """Request JSON → (run_scan kwargs, error message or None)."""
+    symbols, timeframes = data.get("symbols", []), data.get("timeframes", ["Daily"])
+    if not isinstance(symbols, list) or not isinstance(timeframes, list):
+        return {}, "symbols and timeframes must be lists"
+    try:
+        params = {
+            "symbols":       [s.strip().upper() for s in symbols if s.strip()],
+            "timeframes":    timeframes,
+            "rsi_len":       int(data.get("rsi_len", 14)),
+            "pivot_len":     int(data.get("pivot_len", 5)),
+            "ob_prox_pct":   float(data.get("ob_prox", 1.0)) / 100.0,
+            "rsi_div_on":    bool(data.get("rsi_div_on", True)),
+            "ob_on":         bool(data.get("ob_on", True)),
+            "ob_confirm_pct": float(data.get("ob_confirm", 0.0)) / 100.0,
+            "derive_htf":    bool(data.get("derive_htf", DERIVE_HTF)),
+            "defer_meta":    bool(data.get("defer_meta", False)),
+            "incremental":   bool(data.get("incremental", False)),
+        }
+    except (AttributeError, TypeError, ValueError):
+        return {}, "symbols must be a list of strings; rsi_len, pivot_len, ob_prox and ob_confirm numbers"
+    if not params["symbols"]:
+        return params, "No symbols provided"
+    if not timeframes:
+        return params, "No timeframes provided"
+    unknown = [tf for tf in timeframes if not isinstance(tf, str) or tf not in TF_CONFIG]
+    if unknown:
+        return params, (f"Unknown timeframe(s): {', '.join(map(str, unknown))} "
+                        f"(choose from {', '.join(TF_CONFIG)})")
+    if not params["rsi_div_on"] and not params["ob_on"]:
+        return params, "Enable at least one: RSI Divergence or Order Block"
+    return params, None
+
+
+def parse_ints(data, **defaults):
+    """{name: int(data.get(name, default))} → (values, error message or None)."""
+    values = {}
+    for name, default in defaults.items():
+        try:
+            values[name] = int(data.get(name, default))
+        except (TypeError, ValueError):
+            return values, f"{name} must be a whole number"
+    return values, None
+
+
+def parse_sweep_request(data):
+    """Request JSON → (run_sweep kwargs, error message or None). rsi_len,
+    pivot_len, ob_prox and ob_confirm take a value or a list of values."""
+    def values(key, default, cast):
+        raw = data.get(key, default)
+        items = raw if isinstance(raw, list) else [raw]
+        return sorted({cast(v) for v in items})
+
+    swept = ("rsi_len", "pivot_len", "ob_prox", "ob_confirm")
+    base, error = parse_scan_request({k: v for k, v in data.items() if k not in swept})
+    if error:
+        return base, error
+    try:
+        params = {
+            "symbols":      base["symbols"],
+            "timeframes":   base["timeframes"],
+            "rsi_lens":     values("rsi_len", 14, int),
+            "pivot_lens":   values("pivot_len", 5, int),
+            "prox_pcts":    [v / 100.0 for v in values("ob_prox", 1.0, float)],
+            "confirm_pcts": [v / 100.0 for v in values("ob_confirm", 0.0, float)],
+            "rsi_div_on":   base["rsi_div_on"],
+            "ob_on":        base["ob_on"],
+            "derive_htf":   base["derive_htf"],
+        }
+    except (TypeError, ValueError):
+        return base, "rsi_len, pivot_len, ob_prox and ob_confirm must be numbers or lists of numbers"
+    if min(params["rsi_lens"] + params["pivot_lens"], default=0) < 1:
+        return params, "rsi_len and pivot_len must be positive"
+    combos = (len(params["rsi_lens"]) * len(params["pivot_lens"]) *
+              len(params["prox_pcts"]) * len(params["confirm_pcts"]))
+    if not combos or combos > SWEEP_MAX_COMBOS:
+        return params, f"Sweep must have 1–{SWEEP_MAX_COMBOS} combinations (got {combos})"
+    return params, None
+
+
+def scan_summary(results, params, stats, timings=False):
+    """Counts shared by /api/scan and the final /api/scan/stream frame.
+    timings adds the per-stage breakdown (scan_timings)."""
+    summary = {
+        "scanned": len(params["symbols"]) * len(params["timeframes"]),
+        "signals": sum(1 for r in results if r["signal"] != "None"),
+        "validated": sum(1 for r in results if r["validated"]),
+        "ob_confirmed_count": sum(1 for r in results if r.get("ob_confirmed")),
+        "requests": stats.as_dict().get("requests", 0),
+        "stages": stage_report(stats),
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    if timings:
+        summary["timings"] = scan_timings(stats)
+    return summary
+
+
+@app.route("/api/scan", methods=["POST"])
+def api_scan():
+    data = req.get_json(force=True)
+    params, error = parse_scan_request(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    # Default-parameter preset scans come from the precomputed snapshots
+    # unless the client asks for a live scan
+    served = None if data.get("live") else PRECOMPUTE.serve(params)
+    if served is not None:
+        results, snapshot = served
+        return jsonify({"results": results, "snapshot": snapshot,
+                        **scan_summary(results, params, ScanStats(), bool(data.get("timings")))})
+
+    stats = ScanStats()
+    results = run_scan(**params, stats=stats)
+    return jsonify({"results": results,
+                    **scan_summary(results, params, stats, bool(data.get("timings")))})
+
+
+@app.route("/api/scan/stream", methods=["POST"])
+def api_scan_stream():
+    """Same scan as /api/scan as NDJSON: a "start" frame, one "result" frame
+    per scan_one as it completes, then a "summary" frame with the counts.
+    Scans served from a precomputed snapshot send all their result frames at
+    once, and the summary carries the "snapshot" block (preset, age_s)."""
+    data = req.get_json(force=True)
+    params, error = parse_scan_request(data)
+    if error:
+        return jsonify({"error": error}), 400
+    served = None if data.get("live") else PRECOMPUTE.serve(params)
+
+    def generate():
+        stats = ScanStats()
+        results = []
+        yield json.dumps({"type": "start", "total": len(params["symbols"]) * len(params["timeframes"])}) + "\n"
+        if served is not None:
+            results, snapshot = served
+            for r in results:
+                yield json.dumps({"type": "result", "result": r}) + "\n"
+            yield json.dumps({"type": "summary", "snapshot": snapshot,
+                              **scan_summary(results, params, stats, bool(data.get("timings")))}) + "\n"
+            return
+        scan = iter_scan(**params, stats=stats)
+        try:
+            for r in scan:
+                results.append(r)
+                yield json.dumps({"type": "result", "result": r}) + "\n"
+        finally:
+            scan.close()
+        yield json.dumps({"type": "summary",
+                          **scan_summary(results, params, stats, bool(data.get("timings")))}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/api/screen", methods=["POST"])
+def api_screen():
+    """Universe-scale scan (same body as /api/scan plus "top_k" and "only",
+    one of the results-table filters) as NDJSON, in bounded memory: a
+    "start" frame, a "progress" frame with the counts so far every
+    SCREEN_PROGRESS_INTERVAL seconds, then a "summary" frame with the top_k
+    best-ranked matching results and counts over everything scanned."""
+    data = req.get_json(force=True)
+    params, error = parse_scan_request(data)
+    if error:
+        return jsonify({"error": error}), 400
+    params.pop("defer_meta")
+    ints, error = parse_ints(data, top_k=SCREEN_TOP_K)
+    if error:
+        return jsonify({"error": error}), 400
+    top_k = ints["top_k"]
+    only = data.get("only", "all")
+    if top_k < 1:
+        return jsonify({"error": "top_k must be at least 1"}), 400
+    if only not in RESULT_FILTERS:
+        return jsonify({"error": f"Unknown filter {only!r} (choose from {', '.join(RESULT_FILTERS)})"}), 400
+
+    def generate():
+        stats = ScanStats()
+        total = len(params["symbols"]) * len(params["timeframes"])
+        yield json.dumps({"type": "start", "total": total}) + "\n"
+        last = time.monotonic()
+        steps = iter_screen(**params, stats=stats, top_k=top_k, only=only)
+        try:
+            for agg in steps:
+                if time.monotonic() - last >= SCREEN_PROGRESS_INTERVAL:
+                    last = time.monotonic()
+                    yield json.dumps({"type": "progress", "total": total, **agg.counts}) + "\n"
+        finally:
+            steps.close()
+        results = agg.results()
+        summary = scan_summary(results, params, stats, bool(data.get("timings")))
+        summary.update(signals=agg.counts["signals"], validated=agg.counts["validated"],
+                       ob_confirmed_count=agg.counts["ob_confirmed"])
+        yield json.dumps({"type": "summary", "results": results, **summary,
+                          "aggregate": {**agg.counts, "by_timeframe": agg.by_timeframe,
+                                        "top_k": top_k, "only": only}}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/api/confluence", methods=["POST"])
+def api_confluence():
+    """Multi-timeframe confluence ranking (same body as /api/scan, at least
+    two timeframes, plus "top_n", "direction": all / bullish / bearish and
+    "min_aligned") → the top_n symbols, one row each with its per-timeframe
+    results, and counts over every symbol scanned."""
+    data = req.get_json(force=True)
+    params, error = parse_scan_request(data)
+    if error:
+        return jsonify({"error": error}), 400
+    params.pop("defer_meta")
+    ints, error = parse_ints(data, top_n=CONFLUENCE_TOP_N, min_aligned=CONFLUENCE_MIN_ALIGNED)
+    if error:
+        return jsonify({"error": error}), 400
+    top_n, min_aligned = ints["top_n"], ints["min_aligned"]
+    direction = str(data.get("direction", "all")).lower()
+    if len(set(params["timeframes"])) < 2:
+        return jsonify({"error": "Confluence needs at least two timeframes"}), 400
+    if top_n < 1:
+        return jsonify({"error": "top_n must be at least 1"}), 400
+    if direction not in ("all", "bullish", "bearish"):
+        return jsonify({"error": "direction must be all, bullish or bearish"}), 400
+
+    params["timeframes"] = list(dict.fromkeys(params["timeframes"]))
+    stats = ScanStats()
+    agg = rank_confluence(**params, stats=stats, top_n=top_n, direction=direction,
+                          min_aligned=min_aligned)
+    return jsonify({"results": agg.results(),
+                    "aggregate": {**agg.counts, "top_n": top_n, "direction": direction,
+                                  "min_aligned": min_aligned},
+                    "scanned": len(params["symbols"]) * len(params["timeframes"]),
+                    "requests": stats.as_dict().get("requests", 0),
+                    "stages": stage_report(stats),
+                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+
+
+@app.route("/api/sweep", methods=["POST"])
+def api_sweep():
+    """Parameter sweep: one download per symbol / timeframe, every
+    combination evaluated on it. Each row carries one cell per entry of
+    "combos" — null or [signal, div_type, validated, near_ob, ob_confirmed];
+    "totals" holds [signals, validated, ob_confirmed] per combination."""
+    data = req.get_json(force=True)
+    params, error = parse_sweep_request(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    stats = ScanStats()
+    combos, rows = run_sweep(**params, stats=stats)
+    totals = [[0, 0, 0] for _ in combos]
+    for row in rows:
+        for total, cell in zip(totals, row["cells"]):
+            if cell is not None:
+                total[0] += cell[0] != "None"
+                total[1] += cell[2]
+                total[2] += cell[4]
+    return jsonify({
+        "combos": [{"rsi_len": c["rsi_len"], "pivot_len": c["pivot_len"],
+                    "ob_prox": round(c["ob_prox_pct"] * 100, 6),
+                    "ob_confirm": round(c["ob_confirm_pct"] * 100, 6)} for c in combos],
+        "rows": rows,
+        "totals": totals,
+        "scanned": len(params["symbols"]) * len(params["timeframes"]),
+        "requests": stats.as_dict().get("requests", 0),
+        "stages": stage_report(stats),
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    })
+
+
+@app.route("/api/backtest", methods=["POST"])
+def api_backtest():
+    """Walk-forward backtest of the scan's validated signals. Takes the
+    /api/scan fields (or "preset" instead of "symbols") plus optional
+    "horizons" (bars), "refresh" (top up the bar store first) and
+    "events" (include every signal, not just the summary)."""
+    data = req.get_json(force=True)
+    if data.get("preset") in PRESET_WATCHLISTS and not data.get("symbols"):
+        data["symbols"] = PRESET_WATCHLISTS[data["preset"]]
+    params, error = parse_scan_request(data)
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        horizons = sorted({int(h) for h in data.get("horizons", BACKTEST_HORIZONS)})
+    except (TypeError, ValueError):
+        return jsonify({"error": "horizons must be a list of bar counts"}), 400
+    if not horizons or horizons[0] < 1:
+        return jsonify({"error": "horizons must be positive"}), 400
+
+    stats = ScanStats()
+    summary, events = run_backtest(
+        params["symbols"], params["timeframes"], params["rsi_len"], params["pivot_len"],
+        params["ob_prox_pct"], params["rsi_div_on"], params["ob_on"], params["ob_confirm_pct"],
+        horizons, stats=stats, derive_htf=params["derive_htf"], refresh=bool(data.get("refresh")))
+    body = {
+        "summary": summary,
+        "signals": len(events),
+        "horizons": horizons,
+        "requests": stats.as_dict().get("requests", 0),
+        "stages": stage_report(stats),
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    if data.get("events"):
+        body["events"] = events
+    return jsonify(body)
+
+
+@app.route("/api/jobs", methods=["POST"])
+def api_job_create():
+    """Start a background scan (same body as /api/scan) → {id, reused, status}."""
+    params, error = parse_scan_request(req.get_json(force=True))
+    if error:
+        return jsonify({"error": error}), 400
+    job, reused = JOBS.submit(params)
+    return jsonify({"id": job.id, "reused": reused, "status": job.status,
+                    "total": job.total}), 200 if reused else 202
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def api_job_status(job_id):
+    """Progress and results; ?since=N returns only results after the first N."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    since, error = parse_ints(req.args, since=0)
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(job.snapshot(since["since"]))
+
+
+@app.route("/api/jobs/<job_id>", methods=["DELETE"])
+def api_job_cancel(job_id):
+    job = JOBS.release(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify({"id": job.id, "status": job.status, "clients": job.clients})
+
+
+@app.route("/api/watch", methods=["POST"])
+def api_watch_create():
+    """Start watching a scan (same body as /api/scan) → {id, reused}.
+    Subscribe to GET /api/watch/<id>/events for its signal deltas."""
+    params, error = parse_scan_request(req.get_json(force=True))
+    if error:
+        return jsonify({"error": error}), 400
+    watch, reused = WATCHES.submit(params)
+    return jsonify({"id": watch.id, "reused": reused}), 200 if reused else 202
+
+
+@app.route("/api/watch/<watch_id>", methods=["GET"])
+def api_watch_status(watch_id):
+    watch = WATCHES.get(watch_id)
+    if watch is None:
+        return jsonify({"error": "Unknown watch"}), 404
+    return jsonify(watch.snapshot())
+
+
+@app.route("/api/watch/<watch_id>", methods=["DELETE"])
+def api_watch_stop(watch_id):
+    watch = WATCHES.stop(watch_id)
+    if watch is None:
+        return jsonify({"error": "Unknown watch"}), 404
+    return jsonify({"id": watch.id, "running": watch.running})
+
+
+@app.route("/api/watch/<watch_id>/events")
+def api_watch_events(watch_id):
+    """Server-sent events: a "snapshot" of the current signals, then one
+    "delta" event (added / removed / changed) per cycle that changed any."""
+    watch = WATCHES.get(watch_id)
+    if watch is None:
+        return jsonify({"error": "Unknown watch"}), 404
+
+    q = WATCHES.subscribe(watch)
+    if q is None:
+        return jsonify({"error": "Too many open event streams, retry later"}), 503, {"Retry-After": "30"}
+
+    def generate():
+        try:
+            while True:
+                try:
+                    event = q.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    break
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            WATCHES.unsubscribe(watch, q)
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # A stream closed before its first read never runs generate()'s finally
+    response.call_on_close(lambda: WATCHES.unsubscribe(watch, q))
+    return response
+
+
+@app.route("/api/mcap", methods=["POST"])
+def api_mcap():
+    """Market caps for {"symbols": [...]} or {"preset": name}; also warms the cache."""
+    data = req.get_json(force=True)
+    if data.get("preset"):
+        symbols = PRESET_WATCHLISTS.get(data["preset"])
+        if symbols is None:
+            return jsonify({"error": f"Unknown preset: {data['preset']}"}), 400
+    else:
+        symbols = [s.strip().upper() for s in data.get("symbols", []) if s.strip()]
+    if not symbols:
+        return jsonify({"error": "No symbols provided"}), 400
+    return jsonify(META_CACHE.warm(symbols))
+
+
+@app.route("/api/htf_parity")
+def api_htf_parity():
+    """Resampled vs native Weekly / Monthly bars for ?symbol=…"""
+    symbol = req.args.get("symbol", "").strip().upper()
+    if not symbol:
+        return jsonify({"error": "No symbol provided"}), 400
+    lengths, error = parse_ints(req.args, rsi_len=14, pivot_len=5)
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(htf_parity(symbol, lengths["rsi_len"], lengths["pivot_len"]))
+
+
+@app.route("/api/precompute")
+def api_precompute():
+    """Age in seconds of every precomputed preset × timeframe snapshot."""
+    return jsonify({"presets": PRECOMPUTE.status(), "max_age_s": PRECOMPUTE_MAX_AGE})
+
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus scrape target: stage histograms, task outcomes, scans and
+    provider requests of this worker process (labelled with its pid; the
+    Procfile runs a single worker)."""
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/api/presets")
@@ -584,7 +4178,6 @@ def api_presets():
 
 
 if __name__ == "__main__":
-    import os
     port = int(os.environ.get("PORT", 5000))
     debug = os.environ.get("RENDER") is None  # debug only locally
     print("\n  RSI Divergence × Order Block Screener")
@@ -0,0 +1,541 @@
+"""
+Offline benchmark suite
+=======================
+Micro-benchmarks of the analytics functions and end-to-end run_scan timings
+against a fake data provider — no network needed.
+
+    python bench.py                               # everything, report only
+    python bench.py --suite micro --bars 500,5000 --pivots 5
+    python bench.py --suite scan --latency 0.2 --jitter 0.1
+    python bench.py --save baseline.json          # store a baseline
+    python bench.py --compare baseline.json       # exit 1 on regressions
+    python bench.py --record fixtures             # snapshot live Yahoo data
+    python bench.py --fixtures fixtures           # replay it
+    python bench.py --archive data/bench-archive  # scan a memory-mapped archive
+    python bench.py --suite universe --universe-sizes 500,2000,8000   # exit 1 if screen()'s RSS grows per symbol
+
+Reports p50 / p99 latency, throughput (bars/s or symbol-TFs/s) and peak
+traced memory per case.
+"""
+
+import os
+
+# The bar store would turn repeated scans into cache hits — benchmark cold.
+os.environ.setdefault("BAR_STORE_PATH", "")
+
+import argparse
+import json
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+
+import numpy as np
+import pandas as pd
+
+import app
+
+# Fixed "now" for synthetic data, so every run sees identical bars
+SYNTH_END = pd.Timestamp("2026-01-02 15:30", tz="Asia/Kolkata")
+HOURLY_SLOTS = ["09:15", "10:15", "11:15", "12:15", "13:15", "14:15", "15:15"]
+FREQS = {"1d": "B", "1wk": "W-MON", "1mo": "MS"}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# FIXTURES
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def synthetic_bars(n, seed=0, start_price=100.0):
+    """Random-walk OHLCV arrays with realistic candle shapes."""
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0.0002, 0.015, n)))
+    open_ = close * np.exp(rng.normal(0, 0.006, n))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.006, n)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.006, n)))
+    volume = rng.integers(1_000, 1_000_000, n).astype(float)
+    return {"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume}
+
+
+def synthetic_index(interval, period):
+    """Exchange-like bar timestamps covering `period` up to SYNTH_END."""
+    start = app.period_start(period, now=SYNTH_END)
+    if interval == "1h":
+        days = pd.bdate_range(start.normalize(), SYNTH_END.normalize(), tz=SYNTH_END.tz)
+        return pd.DatetimeIndex([d + pd.Timedelta(slot + ":00") for d in days for slot in HOURLY_SLOTS])
+    return pd.date_range(start.normalize(), SYNTH_END.normalize(), freq=FREQS[interval],
+                         tz=SYNTH_END.tz)
+
+
+def synthetic_frame(symbol, interval, period):
+    """Deterministic OHLCV frame for symbol × interval (same bars every run)."""
+    index = synthetic_index(interval, period)
+    seed = zlib.crc32(f"{symbol}|{interval}".encode())
+    return pd.DataFrame(synthetic_bars(len(index), seed, 50 + seed % 2000), index=index)
+
+
+def synthetic_universe(n):
+    """n made-up symbols, for scans larger than any preset."""
+    return [f"SYN{i:05d}.NS" for i in range(n)]
+
+
+def fixture_path(folder, symbol, interval):
+    return os.path.join(folder, interval, symbol.replace("/", "_") + ".csv.gz")
+
+
+def record_fixtures(folder, symbols, timeframes):
+    """Download real bars once with the live provider and save them as
+    replayable fixtures."""
+    saved = 0
+    for interval, period, _ in app.fetch_plan(timeframes):
+        os.makedirs(os.path.join(folder, interval), exist_ok=True)
+        for chunk in app._chunks(list(symbols), app.FETCH_BATCH_SIZE):
+            for sym, df in app.PROVIDER.history_batch(chunk, interval, period=period).items():
+                df.to_csv(fixture_path(folder, sym, interval))
+                saved += 1
+    return saved
+
+
+def build_archive(folder, symbols, timeframes, source):
+    """Write any series missing from the ArchiveProvider at `folder` from
+    `source` (a FakeProvider); returns the archive provider."""
+    archive = app.ArchiveProvider(folder)
+    for interval, period, _ in app.fetch_plan(timeframes):
+        for sym in symbols:
+            if archive.bars(sym, interval) is None:
+                archive.write(sym, interval, source.history(sym, interval, period),
+                              mcap=source.market_cap(sym))
+    return app.ArchiveProvider(folder)
+
+
+class FakeProvider(app.DataProvider):
+    """Offline stand-in for YahooProvider: recorded fixtures when present,
+    synthetic bars otherwise. Every request sleeps latency + U(0, jitter)
+    seconds, so the I/O stage behaves like a remote API. cache=False
+    regenerates frames on every request instead of keeping them, so the
+    provider's memory doesn't grow with the universe."""
+
+    def __init__(self, latency=0.0, jitter=0.0, fixtures=None, seed=0, cache=True):
+        self.latency = latency
+        self.jitter = jitter
+        self.fixtures = fixtures
+        self.cache = cache
+        self._rng = random.Random(seed)
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def _wait(self, stats):
+        if stats is not None:
+            stats.add("requests")
+        with self._lock:
+            delay = self.latency + self._rng.uniform(0.0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _frame(self, symbol, interval, period):
+        key = (symbol, interval, period)
+        with self._lock:
+            df = self._frames.get(key)
+        if df is None:
+            path = fixture_path(self.fixtures, symbol, interval) if self.fixtures else None
+            if path and os.path.exists(path):
+                df = pd.read_csv(path, index_col=0)
+                df.index = pd.to_datetime(df.index, utc=True).tz_convert(SYNTH_END.tz)
+            else:
+                df = synthetic_frame(symbol, interval, period or "1y")
+            if self.cache:
+                with self._lock:
+                    self._frames[key] = df
+        return df
+
+    def _slice(self, symbol, interval, period, start):
+        df = self._frame(symbol, interval, period)
+        return df[df.index >= start] if start is not None else df
+
+    def history(self, symbol, interval, period=None, start=None, stats=None):
+        self._wait(stats)
+        return self._slice(symbol, interval, period, start)
+
+    def history_batch(self, symbols, interval, period=None, start=None, stats=None):
+        self._wait(stats)
+        return {sym: self._slice(sym, interval, period, start) for sym in symbols}
+
+    def market_cap(self, symbol, stats=None):
+        self._wait(stats)
+        return float(zlib.crc32(symbol.encode()) % 10**12)
+
+
+class ThrottlingProvider(FakeProvider):
+    """FakeProvider behind a server enforcing its own limits, the way Yahoo
+    does: past `rate` requests/s (bursts of `burst`) or `max_inflight`
+    concurrent requests, single-symbol calls fail with RateLimited (HTTP
+    429) and bulk downloads come back empty."""
+
+    def __init__(self, rate, burst=None, max_inflight=8, **kwargs):
+        super().__init__(**kwargs)
+        self.rate = rate
+        self.burst = burst or rate
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.rejected = 0
+        self._tokens, self._stamp = self.burst, time.monotonic()
+
+    def _admit(self, stats):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self._tokens < 1 or self.inflight >= self.max_inflight:
+                self.rejected += 1
+                if stats is not None:
+                    stats.add("requests")
+                return False
+            self._tokens -= 1
+            self.inflight += 1
+            return True
+
+    def _served(self, fn, *args):
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+    def history(self, symbol, interval, period=None, start=None, stats=None):
+        if not self._admit(stats):
+            raise app.RateLimited("429 Too Many Requests")
+        return self._served(super().history, symbol, interval, period, start, stats)
+
+    def history_batch(self, symbols, interval, period=None, start=None, stats=None):
+        if not self._admit(stats):
+            if len(symbols) == 1:
+                raise app.RateLimited("429 Too Many Requests")
+            return {}
+        return self._served(super().history_batch, symbols, interval, period, start, stats)
+
+    def market_cap(self, symbol, stats=None):
+        if not self._admit(stats):
+            raise app.RateLimited("429 Too Many Requests")
+        return self._served(super().market_cap, symbol, stats)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MEASUREMENT
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def percentiles(samples):
+    p50, p99 = np.percentile(samples, [50, 99])
+    return float(p50), float(p99)
+
+
+def peak_memory(fn):
+    """Peak traced allocation (KiB) of one fn() call."""
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def time_case(fn, repeat, budget):
+    """Per-call seconds: at least 3 calls, at most `repeat`, stopping once
+    `budget` seconds are spent."""
+    fn()                                    # warm-up (imports, caches)
+    times = []
+    spent = 0.0
+    while len(times) < repeat and (len(times) < 3 or spent < budget):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+        spent += times[-1]
+    return times
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SUITES
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def micro_cases(bar_counts, pivot_lens, rsi_len=14):
+    """(name, bars, fn) for every analytics function × bar count × pivot length."""
+    for n in bar_counts:
+        df = pd.DataFrame(synthetic_bars(n, seed=n))
+        rsi = app.calc_rsi(df["Close"], rsi_len)
+        yield f"calc_rsi[n={n}]", n, lambda df=df: app.calc_rsi(df["Close"], rsi_len)
+        for p in pivot_lens:
+            tag = f"[n={n},p={p}]"
+            ph, pl = app.find_pivots(df["High"], df["Low"], p, p)
+            rph, rpl = app.find_rsi_pivots(rsi, p, p)
+            yield "find_pivots" + tag, n, lambda df=df, p=p: app.find_pivots(df["High"], df["Low"], p, p)
+            yield "find_rsi_pivots" + tag, n, lambda rsi=rsi, p=p: app.find_rsi_pivots(rsi, p, p)
+            yield ("detect_divergences" + tag, n,
+                   lambda df=df, rsi=rsi, rph=rph, rpl=rpl: app.detect_divergences(df, rsi, rph, rpl))
+            yield ("detect_order_blocks" + tag, n,
+                   lambda df=df, ph=ph, pl=pl: app.detect_order_blocks(df, ph, pl))
+            yield ("analyze" + tag, n,
+                   lambda df=df, p=p: app.analyze(df, "BENCH", "Daily", rsi_len, p, 0.01, True, True, 0.01))
+
+
+def run_micro(bar_counts, pivot_lens, repeat, budget, memory=True):
+    results = {}
+    for name, n, fn in micro_cases(bar_counts, pivot_lens):
+        times = time_case(fn, repeat, budget)
+        p50, p99 = percentiles(times)
+        results[name] = {
+            "runs":       len(times),
+            "p50_ms":     round(p50 * 1e3, 4),
+            "p99_ms":     round(p99 * 1e3, 4),
+            "bars_per_s": round(n / p50, 1),
+            "peak_kb":    peak_memory(fn) if memory else None,
+        }
+        print(f"  {name:<36} p50 {results[name]['p50_ms']:>10.3f} ms   "
+              f"p99 {results[name]['p99_ms']:>10.3f} ms   peak {results[name]['peak_kb']} KiB")
+    return results
+
+
+def scan_once(symbols, timeframes, provider, batched=None):
+    """One run_scan-equivalent pass with a cold metadata cache →
+    (wall seconds, seconds to each result, ScanStats)."""
+    app.META_CACHE = app.MetaCache()
+    stats = app.ScanStats()
+    arrivals = []
+    t0 = time.perf_counter()
+    for _ in app.iter_scan(symbols, timeframes, 14, 5, 0.01, True, True, 0.01,
+                           provider=provider, stats=stats, batched=batched):
+        arrivals.append(time.perf_counter() - t0)
+    return time.perf_counter() - t0, arrivals, stats
+
+
+def run_scan_bench(watchlists, repeat, latency, jitter, fixtures=None, memory=True,
+                   universe=0, archive=None, throttle=0.0):
+    timeframes = list(app.TF_CONFIG)
+    lists = {name: app.PRESET_WATCHLISTS[name] for name in watchlists}
+    if universe:
+        lists[f"Synthetic {universe}"] = synthetic_universe(universe)
+    results = {}
+    for name, symbols in lists.items():
+        provider = FakeProvider(latency, jitter, fixtures)
+        if throttle:
+            provider = ThrottlingProvider(throttle, latency=latency, jitter=jitter,
+                                          fixtures=fixtures)
+            app.FETCH_SCHEDULER = app.FetchScheduler()
+        if archive:
+            provider = build_archive(archive, symbols, timeframes, FakeProvider(fixtures=fixtures))
+        scan_once(symbols[:5], timeframes, provider)                    # warm-up
+        walls, arrivals, requests = [], [], 0
+        fetch = {"retries": 0, "throttled": 0, "fetch_failures": 0, "symbols_missing": 0}
+        for _ in range(repeat):
+            wall, ttr, stats = scan_once(symbols, timeframes, provider)
+            walls.append(wall)
+            arrivals.extend(ttr)
+            counts = stats.as_dict()
+            requests = counts.get("requests", 0)
+            for key in fetch:
+                fetch[key] += counts.get(key, 0)
+        tasks = len(symbols) * len(timeframes)
+        p50, p99 = percentiles(walls)
+        t50, t99 = percentiles(arrivals) if arrivals else (0.0, 0.0)
+        results[name] = {
+            "tasks":        tasks,
+            "runs":         repeat,
+            "wall_p50_s":   round(p50, 4),
+            "wall_p99_s":   round(p99, 4),
+            "tasks_per_s":  round(tasks / p50, 1),
+            "ttr_p50_s":    round(t50, 4),
+            "ttr_p99_s":    round(t99, 4),
+            "requests":     requests,
+            "retries":      fetch["retries"],
+            "throttled":    fetch["throttled"],
+            "dropped":      fetch["fetch_failures"] + fetch["symbols_missing"],
+            "peak_kb":      peak_memory(lambda: scan_once(symbols, timeframes, provider)) if memory else None,
+        }
+        r = results[name]
+        print(f"  {name:<20} {tasks:>6} symbol-TFs   {r['tasks_per_s']:>8.1f}/s   "
+              f"wall p50 {r['wall_p50_s']:.3f}s p99 {r['wall_p99_s']:.3f}s   "
+              f"first-results p50 {r['ttr_p50_s']:.3f}s p99 {r['ttr_p99_s']:.3f}s   "
+              f"{requests} requests   peak {r['peak_kb']} KiB")
+        if throttle:
+            print(f"  {'':<20} {r['retries']} retries ({r['throttled']} throttled), "
+                  f"{r['dropped']} dropped, final concurrency {app.FETCH_SCHEDULER.window:.1f}")
+    return results
+
+
+def universe_child(n, mode, latency, jitter):
+    """Runs in a fresh interpreter (see run_universe_bench): one scan of n
+    synthetic symbols → peak RSS over the post-import baseline."""
+    provider = FakeProvider(latency, jitter, cache=False)
+    timeframes = list(app.TF_CONFIG)
+    app.run_scan(synthetic_universe(5), timeframes, 14, 5, 0.01, provider=provider)   # warm-up
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    symbols = synthetic_universe(n)
+    t0 = time.perf_counter()
+    if mode == "stream":
+        kept = len(app.screen(symbols, timeframes, 14, 5, 0.01, provider=provider).results())
+    else:
+        kept = len(app.run_scan(symbols, timeframes, 14, 5, 0.01, provider=provider))
+    return {"wall_s": round(time.perf_counter() - t0, 2), "kept": kept,
+            "base_kb": base, "peak_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def run_universe_bench(sizes, latency, jitter, modes=("list", "stream")):
+    """Peak RSS growth of run_scan (full result list) vs screen() (top-K
+    aggregate) per universe size, each measured in its own process since
+    ru_maxrss never goes down. "<mode> slope" is the growth per 1,000 more
+    symbols between the two largest sizes: flat for screen(), whose live
+    heap doesn't grow with the universe — what remains is free memory the
+    allocator keeps (malloc_trim hands most of it back)."""
+    results = {}
+    for n in sizes:
+        for mode in modes:
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--universe-child", str(n),
+                                  "--universe-mode", mode, "--latency", str(latency),
+                                  "--jitter", str(jitter)],
+                                 capture_output=True, text=True, check=True)
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            r["growth_kb"] = r["peak_kb"] - r["base_kb"]
+            r["tasks_per_s"] = round(n * len(app.TF_CONFIG) / max(r["wall_s"], 1e-9), 1)
+            results[f"{mode} {n}"] = r
+            print(f"  {mode:<7} {n:>6} symbols   {r['tasks_per_s']:>8.1f}/s   wall {r['wall_s']:.2f}s   "
+                  f"{r['kept']:>6} results kept   RSS +{r['growth_kb'] / 1024:.1f} MiB "
+                  f"(peak {r['peak_kb'] / 1024:.0f} MiB)")
+    if len(sizes) > 1:
+        small, large = sorted(sizes)[-2:]
+        for mode in modes:
+            slope = ((results[f"{mode} {large}"]["growth_kb"] - results[f"{mode} {small}"]["growth_kb"])
+                     * 1000 / (large - small))
+            results[f"{mode} slope"] = {"growth_per_1k_kb": round(slope, 1)}
+            print(f"  {mode:<7} RSS +{slope / 1024:.2f} MiB per 1,000 symbols ({small} → {large})")
+    return results
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# BASELINES
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# metric → True when larger is better
+METRICS = {"p50_ms": False, "wall_p50_s": False, "bars_per_s": True,
+           "tasks_per_s": True, "peak_kb": False, "growth_kb": False, "growth_per_1k_kb": False}
+
+
+def compare(current, baseline, tolerance):
+    """Print changes against a saved baseline; returns the regressions."""
+    regressions = []
+    for suite in ("micro", "scan", "universe"):
+        for case, metrics in current.get(suite, {}).items():
+            base = baseline.get(suite, {}).get(case)
+            if not base:
+                continue
+            for metric, higher_better in METRICS.items():
+                now, then = metrics.get(metric), base.get(metric)
+                if not now or not then:
+                    continue
+                change = (now - then) / then
+                worse = -change if higher_better else change
+                flag = "REGRESSION" if worse > tolerance else ""
+                if flag:
+                    regressions.append(f"{suite}:{case}:{metric}")
+                print(f"  {suite}:{case:<36} {metric:<12} {then:>12} → {now:>12}  "
+                      f"{change:+7.1%} {flag}")
+    return regressions
+
+
+def environment():
+    return {
+        "python":    platform.python_version(),
+        "numpy":     np.__version__,
+        "pandas":    pd.__version__,
+        "platform":  platform.platform(),
+        "cpus":      os.cpu_count(),
+        "cpu_workers": app.SCAN_CPU_WORKERS,
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Offline screener benchmarks")
+    ap.add_argument("--suite", choices=["all", "micro", "scan", "universe"], default="all")
+    ap.add_argument("--bars", default="500,5000,50000", help="bar counts for micro-benchmarks")
+    ap.add_argument("--pivots", default="3,5,10", help="pivot lengths for micro-benchmarks")
+    ap.add_argument("--repeat", type=int, default=20, help="max runs per micro case")
+    ap.add_argument("--budget", type=float, default=2.0, help="seconds per micro case")
+    ap.add_argument("--watchlists", default="Nifty 50,Nifty 500")
+    ap.add_argument("--universe", type=int, default=0, help="also scan N synthetic symbols")
+    ap.add_argument("--scan-repeat", type=int, default=3)
+    ap.add_argument("--universe-sizes", default="500,2000,8000",
+                    help="synthetic universe sizes for the memory-bounded scan suite")
+    ap.add_argument("--max-growth-per-1k", type=float, default=1024, metavar="KIB",
+                    help="fail when screen()'s peak RSS grows more than KIB per 1,000 symbols")
+    ap.add_argument("--universe-child", type=int, help=argparse.SUPPRESS)
+    ap.add_argument("--universe-mode", default="stream", help=argparse.SUPPRESS)
+    ap.add_argument("--latency", type=float, default=0.05, help="fake request latency (s)")
+    ap.add_argument("--jitter", type=float, default=0.05, help="extra U(0, jitter) latency (s)")
+    ap.add_argument("--throttle", type=float, default=0.0, metavar="RATE",
+                    help="fake server rejects requests beyond RATE/s or 8 in flight (429)")
+    ap.add_argument("--fixtures", help="directory of recorded fixtures to replay")
+    ap.add_argument("--archive", metavar="DIR",
+                    help="scan through an ArchiveProvider at DIR (built from the fixtures if missing)")
+    ap.add_argument("--record", metavar="DIR", help="record live fixtures for --watchlists and exit")
+    ap.add_argument("--no-memory", action="store_true", help="skip the traced peak-memory runs")
+    ap.add_argument("--save", metavar="FILE", help="write results as a baseline")
+    ap.add_argument("--compare", metavar="FILE", help="compare against a saved baseline")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    args = ap.parse_args(argv)
+    if args.universe_child:
+        print(json.dumps(universe_child(args.universe_child, args.universe_mode,
+                                        args.latency, args.jitter)))
+        return 0
+
+    watchlists = [w.strip() for w in args.watchlists.split(",") if w.strip()]
+    if args.record:
+        symbols = sorted({s for w in watchlists for s in app.PRESET_WATCHLISTS[w]})
+        print(f"Recorded {record_fixtures(args.record, symbols, list(app.TF_CONFIG))} series "
+              f"to {args.record}")
+        return 0
+
+    results = {"env": environment()}
+    if args.suite in ("all", "micro"):
+        print("Micro-benchmarks")
+        results["micro"] = run_micro([int(x) for x in args.bars.split(",")],
+                                     [int(x) for x in args.pivots.split(",")],
+                                     args.repeat, args.budget, not args.no_memory)
+    if args.suite in ("all", "scan"):
+        source = f"archive {args.archive}" if args.archive else \
+            f"latency {args.latency}s + U(0, {args.jitter})s per request"
+        if args.throttle:
+            source += f", server limit {args.throttle:g} req/s"
+        print(f"run_scan ({source})")
+        results["scan"] = run_scan_bench(watchlists, args.scan_repeat, args.latency, args.jitter,
+                                         args.fixtures, not args.no_memory, args.universe,
+                                         args.archive, args.throttle)
+    if args.suite == "universe":
+        print(f"Universe scans (latency {args.latency}s + U(0, {args.jitter})s per request)")
+        results["universe"] = run_universe_bench([int(x) for x in args.universe_sizes.split(",")],
+                                                 args.latency, args.jitter)
+    results["env"]["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    slope = results.get("universe", {}).get("stream slope", {}).get("growth_per_1k_kb")
+    unbounded = slope is not None and slope > args.max_growth_per_1k
+    if unbounded:
+        print(f"screen() peak RSS grows {slope:.0f} KiB per 1,000 symbols "
+              f"(limit {args.max_growth_per_1k:.0f})")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.compare} ({baseline.get('env', {}).get('timestamp', '?')})")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            return 1
+    return 1 if unbounded else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep the suite off the network and off the developer's bar store
+os.environ.setdefault("BAR_STORE_PATH", "")
+os.environ.setdefault("PRECOMPUTE_PRESETS", "")
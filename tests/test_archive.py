@@ -0,0 +1,57 @@
+"""ArchiveProvider: write / replay round trip and period slicing."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+import bench
+
+
+def assert_same_bars(left, right):
+    # epoch seconds come back at second resolution whatever the source's was
+    pd.testing.assert_frame_equal(left, right, check_freq=False, check_index_type=False)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    source = bench.FakeProvider()
+    return bench.build_archive(str(tmp_path), ["AAA.NS", "BBB.NS"], ["Daily", "1H"], source), source
+
+
+def test_history_round_trips(archive):
+    archive, source = archive
+    for tf in ("Daily", "1H"):
+        interval, period = app.TF_CONFIG[tf]["interval"], app.TF_CONFIG[tf]["period"]
+        written = source.history("AAA.NS", interval, period)
+        replayed = archive.history("AAA.NS", interval)
+        assert_same_bars(replayed, written)
+    assert archive.market_cap("AAA.NS") == source.market_cap("AAA.NS")
+
+
+def test_bars_are_zero_copy_views(archive):
+    archive, _ = archive
+    bars = archive.bars_batch(["AAA.NS", "MISSING.NS"], "1d")
+    assert list(bars) == ["AAA.NS"]
+    assert all(isinstance(bars["AAA.NS"][col].base, np.memmap) for col in app.ArchiveProvider.COLUMNS)
+    assert archive.history("MISSING.NS", "1d") is None
+
+
+def test_periods_count_back_from_the_last_bar(archive):
+    archive, source = archive
+    full = archive.history("AAA.NS", "1d")
+    half = archive.history("AAA.NS", "1d", period="6mo")
+    assert half.index[-1] == full.index[-1]
+    assert half.index[0] >= app.period_start("6mo", now=full.index[-1].tz_convert("UTC"))
+    assert_same_bars(half, full[full.index >= half.index[0]])
+    start = full.index[-5]
+    assert_same_bars(archive.history("AAA.NS", "1d", start=start), full.iloc[-5:])
+    assert archive.bars("AAA.NS", "1d", start=full.index[-1] + pd.Timedelta(days=1)) is None
+
+
+def test_rewrite_replaces_the_mapped_series(archive):
+    archive, source = archive
+    shorter = source.history("AAA.NS", "1d", "1y").iloc[:-10]
+    archive.write("AAA.NS", "1d", shorter)
+    assert_same_bars(archive.history("AAA.NS", "1d"), shorter)
+    reopened = app.ArchiveProvider(archive.root)
+    assert len(reopened.bars("AAA.NS", "1d")["Close"]) == len(shorter)
@@ -0,0 +1,47 @@
+"""walk_forward / signal_outcomes never look ahead of the bar they report."""
+import pytest
+
+import app
+import bench
+
+ARGS = (14, 5, 0.02, True, True, 0.0)
+HORIZONS = (1, 5, 10, 20)
+SYMBOLS = bench.synthetic_universe(4)
+
+
+def history(symbol):
+    return bench.synthetic_frame(symbol, "1d", "2y")
+
+
+def prefix(bars, m):
+    return {col: values[:m] for col, values in bars.items()}
+
+
+@pytest.mark.parametrize("symbol", SYMBOLS)
+def test_appending_bars_keeps_earlier_signals_and_outcomes(symbol):
+    bars = app.to_bars(history(symbol), with_ts=True)
+    full = app.walk_forward(bars, symbol, "Daily", *ARGS)
+    full_events = app.signal_outcomes(bars, full, HORIZONS)
+    assert full
+    for m in (120, 250, 400, len(bars["Close"]) - 3):
+        onsets = app.walk_forward(prefix(bars, m), symbol, "Daily", *ARGS)
+        assert onsets == [(k, r) for k, r in full if k < m]
+
+        events = app.signal_outcomes(prefix(bars, m), onsets, HORIZONS)
+        for (k, _), event, later in zip(onsets, events, full_events):
+            assert {key: event[key] for key in event if key not in ("returns", "drawdown")} == \
+                   {key: later[key] for key in later if key not in ("returns", "drawdown")}
+            for hz in HORIZONS:
+                # known once the horizon has closed, unknown (not guessed) before
+                assert event["returns"][str(hz)] == (later["returns"][str(hz)] if k + hz < m else None)
+            assert event["drawdown"] == (later["drawdown"] if k + max(HORIZONS) < m else None)
+
+
+@pytest.mark.parametrize("symbol", SYMBOLS[:2])
+def test_onsets_are_what_a_scan_of_the_prefix_reports(symbol):
+    df = history(symbol)
+    onsets = app.walk_forward(app.to_bars(df, with_ts=True), symbol, "Daily", *ARGS)
+    for k, r in onsets:
+        scanned = app.analyze(df.iloc[:k + 1], symbol, "Daily", *ARGS)
+        assert scanned is not None and scanned["validated"]
+        assert (scanned["signal"], scanned["div_type"]) == (r["signal"], r["div_type"])
@@ -0,0 +1,73 @@
+"""BarStore top-ups: stale fallbacks, pruning and shared-TTL hits."""
+import pandas as pd
+import pytest
+
+import app
+import bench
+
+
+class FailingProvider(bench.FakeProvider):
+    def history_batch(self, symbols, interval, period=None, start=None, stats=None):
+        raise RuntimeError("provider down")
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = app.BarStore(str(tmp_path / "bars.sqlite"))
+    monkeypatch.setattr(app, "BAR_STORE", store)
+    monkeypatch.setattr(app, "shared_ttl", lambda interval: 0.0)   # always top up
+    monkeypatch.setattr(app.FETCH_SCHEDULER, "retries", 0)
+    return store
+
+
+def test_failed_top_up_is_served_and_flagged_stale(store):
+    syms = ["AAA", "BBB"]
+    first = app.load_bars_batch(syms, "1wk", "2y", bench.FakeProvider())
+    assert set(first) == set(syms)
+
+    stats = app.ScanStats()
+    again = app.load_bars_batch(syms, "1wk", "2y", FailingProvider(), stats)
+    for sym in syms:
+        pd.testing.assert_frame_equal(again[sym], first[sym], check_freq=False,
+                                      check_index_type=False)
+    assert app.stage_report(stats)["fetch"]["stale"] == 2
+
+
+def test_top_up_prunes_bars_past_the_longest_period(store):
+    provider = bench.FakeProvider()
+    app.load_bars_batch(["AAA"], "1wk", "2y", provider)
+    old = pd.Timestamp("2020-01-06", tz="UTC")
+    df, since = store.load("AAA", "1wk")
+    # history older than any period a scan asks for, e.g. from a past full download
+    ancient = df.iloc[:3].copy()
+    ancient.index = pd.date_range(old, periods=3, freq="7D")
+    store.save("AAA", "1wk", ancient)
+
+    app.load_bars_batch(["AAA"], "1wk", "2y", provider)
+    df, since = store.load("AAA", "1wk")
+    cutoff = app.retention_start("1wk")
+    assert df.index[0] >= cutoff - pd.Timedelta(days=1)
+    assert since >= (cutoff - pd.Timedelta(days=1)).timestamp()
+
+
+def test_retention_start_uses_the_longest_period():
+    now = pd.Timestamp("2026-06-01", tz="UTC")
+    assert app.retention_start("1d", now) == app.period_start(app.DAILY_BASE_PERIOD, now)
+    assert app.retention_start("1h", now) == app.period_start("60d", now)
+    assert app.retention_start("5m", now) is None
+
+
+def test_recent_refreshes_are_served_without_a_request(store, monkeypatch):
+    syms = ["AAA", "BBB"]
+    first = app.load_bars_batch(syms, "1wk", "2y", bench.FakeProvider())
+    monkeypatch.setattr(app, "shared_ttl", lambda interval: 300.0)
+
+    stats = app.ScanStats()
+    again = app.load_bars_batch(syms + ["CCC"], "1wk", "2y", bench.FakeProvider(), stats)
+    assert set(again) == {"AAA", "BBB", "CCC"}
+    for sym in syms:
+        pd.testing.assert_frame_equal(again[sym], first[sym], check_freq=False,
+                                      check_index_type=False)
+    counts = stats.as_dict()
+    assert counts["shared_hits"] == 2
+    assert counts["requests"] == 1                      # only CCC was downloaded
@@ -0,0 +1,55 @@
+"""Batched (analyze_matrix) scans against per-symbol analysis."""
+import pytest
+
+import app
+import bench
+
+PROVIDER = bench.FakeProvider()
+ARGS = (14, 5, 0.01, True, True, 0.01)
+
+
+def scan(symbols, batched):
+    out = app.iter_scan(symbols, list(app.TF_CONFIG), 14, 5, 0.01, True, True, 0.01,
+                        provider=PROVIDER, batched=batched, meta=False)
+    return sorted(out, key=lambda r: (r["symbol"], r["timeframe"]))
+
+
+@pytest.mark.parametrize("name", list(app.PRESET_WATCHLISTS))
+def test_batched_matches_per_symbol_for_every_preset(name, monkeypatch):
+    symbols = app.PRESET_WATCHLISTS[name]
+    per_symbol = scan(symbols, batched=False)
+    assert per_symbol
+
+    def no_fallback(*args):
+        raise AssertionError("analyze_matrix fell back to analyze_bars")
+
+    # analyze_batch falls back to analyze_bars when a batch fails; that
+    # would match trivially, so make the fallback drop the batch instead
+    monkeypatch.setattr(app, "analyze_bars", no_fallback)
+    assert scan(symbols, batched=True) == per_symbol
+
+
+def test_batch_of_short_frames():
+    frames = [app.to_bars(bench.synthetic_frame(sym, "1d", "1y").iloc[:n])
+              for sym, n in (("AAA", 0), ("BBB", 12))]
+    assert app.analyze_matrix(frames, ["AAA", "BBB"], "Daily", *ARGS) == [None, None]
+
+
+def test_batching_defaults_to_local_providers(monkeypatch):
+    seen = []
+    real = app.analyze_batch
+
+    def spy(*args):
+        seen.append(args[2])
+        return real(*args)
+
+    monkeypatch.setattr(app, "analyze_batch", spy)
+    monkeypatch.setattr(app, "SCAN_BATCHED", "local")
+    list(app.iter_scan(["AAA"], ["Daily"], 14, 5, 0.01, provider=PROVIDER, meta=False))
+    assert seen == []
+
+    class LocalProvider(bench.FakeProvider):
+        local = True
+
+    list(app.iter_scan(["AAA"], ["Daily"], 14, 5, 0.01, provider=LocalProvider(), meta=False))
+    assert seen == ["Daily"]
@@ -0,0 +1,49 @@
+"""Benchmark fixtures and the baseline comparison."""
+import pandas as pd
+import pytest
+
+import app
+import bench
+
+
+def test_synthetic_frames_are_deterministic():
+    a = bench.synthetic_frame("AAA.NS", "1d", "1y")
+    pd.testing.assert_frame_equal(a, bench.synthetic_frame("AAA.NS", "1d", "1y"))
+    assert not a.equals(bench.synthetic_frame("BBB.NS", "1d", "1y"))
+    assert a.index[-1] <= bench.SYNTH_END and a.index.is_monotonic_increasing
+    assert (a["High"] >= a[["Open", "Close"]].max(axis=1)).all()
+    assert (a["Low"] <= a[["Open", "Close"]].min(axis=1)).all()
+
+
+def test_hourly_index_uses_exchange_slots():
+    index = bench.synthetic_index("1h", "5d")
+    assert {ts.strftime("%H:%M") for ts in index} == set(bench.HOURLY_SLOTS)
+    assert all(ts.weekday() < 5 for ts in index)
+
+
+def test_fake_provider_counts_requests_and_slices():
+    provider, stats = bench.FakeProvider(), app.ScanStats()
+    full = provider.history("AAA.NS", "1d", "1y", stats=stats)
+    tail = provider.history("AAA.NS", "1d", "1y", start=full.index[-10], stats=stats)
+    batch = provider.history_batch(["AAA.NS", "BBB.NS"], "1d", "1y", stats=stats)
+    assert stats.as_dict()["requests"] == 3
+    pd.testing.assert_frame_equal(tail, full.iloc[-10:])
+    pd.testing.assert_frame_equal(batch["AAA.NS"], full)
+
+
+def test_throttling_provider_rejects_past_its_burst():
+    provider = bench.ThrottlingProvider(rate=0.001, burst=2)
+    provider.history("AAA.NS", "1d", "1y")
+    provider.history("AAA.NS", "1d", "1y")
+    with pytest.raises(app.RateLimited):
+        provider.history("AAA.NS", "1d", "1y")
+    assert provider.history_batch(["AAA.NS", "BBB.NS"], "1d", "1y") == {}
+    assert provider.rejected == 2
+
+
+def test_compare_flags_only_regressions_past_tolerance():
+    baseline = {"micro": {"calc_rsi": {"p50_ms": 1.0, "bars_per_s": 1000.0}},
+                "scan": {"Nifty 50": {"wall_p50_s": 2.0}}}
+    current = {"micro": {"calc_rsi": {"p50_ms": 1.05, "bars_per_s": 800.0}},
+               "scan": {"Nifty 50": {"wall_p50_s": 1.0}, "new case": {"wall_p50_s": 9.0}}}
+    assert bench.compare(current, baseline, 0.10) == ["micro:calc_rsi:bars_per_s"]
@@ -0,0 +1,37 @@
+"""Confluence scoring of build_result's OB side."""
+import app
+
+
+def ob(low, high):
+    return {"low": low, "high": high, "bar": 0, "breakout": 1}
+
+
+def result(signal, bull_obs, bear_obs, price, tf_label="Daily"):
+    return app.build_result("X", tf_label, signal, "Regular" if signal != "None" else "",
+                            bull_obs, bear_obs, price, 40.0, 0.01)
+
+
+def test_ob_side_is_the_side_price_is_near():
+    # Bullish divergence at 102 with only a bearish OB nearby
+    r = result("Bullish", [ob(90, 95)], [ob(101, 103)], 102)
+    assert (r["ob_side"], r["ob_range"]) == ("Bearish", [101, 103])
+    assert not r["validated"]
+    assert app.confluence_points(r, "Bullish") == 2
+    assert app.confluence_points(r, "Bearish") == 1
+
+    # Nested: a higher timeframe's bearish OB doesn't host a bullish divergence
+    high = result("None", [ob(90, 95)], [ob(101, 103)], 102, tf_label="Weekly")
+    by_tf = {"Daily": r, "Weekly": high}
+    assert app.nested_signals(by_tf, "Bullish", 0.01) == []
+
+
+def test_ob_range_is_the_near_block_not_the_newest():
+    r = result("Bullish", [ob(99, 101), ob(80, 82)], [], 100)
+    assert (r["ob_side"], r["ob_range"]) == ("Bullish", [99, 101])
+
+
+def test_signal_side_wins_when_both_are_near():
+    bull, bear = [ob(99, 101)], [ob(100, 102)]
+    assert result("Bearish", bull, bear, 100.5)["ob_side"] == "Bearish"
+    assert result("Bullish", bull, bear, 100.5)["ob_side"] == "Bullish"
+    assert result("None", [ob(90, 95)], [ob(200, 210)], 150)["ob_side"] is None
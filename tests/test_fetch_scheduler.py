@@ -0,0 +1,128 @@
+"""FetchScheduler: AIMD limits, token bucket and retry cap, on a fake clock."""
+import math
+
+import pytest
+
+import app
+
+
+class Clock:
+    """time.monotonic / time.sleep stand-in: sleeping advances the clock,
+    by at least a microsecond like a real sleep (a rounding-sized delay
+    would otherwise leave the clock where it was)."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 1e-6)
+
+
+class Server:
+    """Throttling stub: the first `throttle` calls get a 429, then every
+    call succeeds. Records when each call arrived."""
+
+    def __init__(self, clock, throttle=0, error=RuntimeError("429 Too Many Requests")):
+        self.clock = clock
+        self.throttle = throttle
+        self.error = error
+        self.calls = []
+
+    def __call__(self, stats=None):
+        self.calls.append(self.clock.now)
+        if len(self.calls) <= self.throttle:
+            raise self.error
+        return "ok"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app.time, "monotonic", clock)
+    monkeypatch.setattr(app.time, "sleep", clock.sleep)
+    return clock
+
+
+def scheduler(**kwargs):
+    opts = dict(rate=8, burst=None, max_concurrency=16, start=8, retries=0,
+                backoff=1.0, backoff_max=4.0, missing_retries=0, background_share=0.5)
+    opts.update(kwargs)
+    return app.FetchScheduler(**opts)
+
+
+def test_throttling_halves_the_limits_once_per_backoff(clock):
+    sched = scheduler()
+    for _ in range(4):
+        sched.call(Server(clock))
+    window = sched.window
+    assert sched.rate > 5
+
+    with pytest.raises(RuntimeError):
+        sched.call(Server(clock, throttle=1))
+    assert sched.window == window / 2
+    assert sched.rate == 5 / 2                  # half of the 5 requests sent this second
+
+    # the rest of the same burst of 429s is one congestion event
+    with pytest.raises(RuntimeError):
+        sched.call(Server(clock, throttle=1))
+    assert sched.window == window / 2 and sched.rate == 5 / 2
+
+    clock.now += 1.5
+    with pytest.raises(RuntimeError):
+        sched.call(Server(clock, throttle=1))
+    assert sched.window == window / 4
+    assert sched.rate == 0.5                    # never below half a request a second
+
+
+def test_limits_recover_additively(clock):
+    sched = scheduler(start=1, max_concurrency=4, rate=4)
+    sched.rate = 1.0
+    windows, rates = [sched.window], [sched.rate]
+    for _ in range(40):
+        sched.call(Server(clock))
+        windows.append(sched.window)
+        rates.append(sched.rate)
+    # one step per success: +1/window, i.e. about +1 per window of successes
+    for before, after in zip(windows, windows[1:]):
+        assert after == min(4, before + 1 / before)
+    for before, after in zip(rates, rates[1:]):
+        assert after == min(4, before + 1 / before)
+    assert windows[1] == 2 and windows[3] < 3       # additive, not multiplicative
+    assert windows[-1] == 4 and rates[-1] == 4      # capped at the configured maxima
+
+
+@pytest.mark.parametrize("burst", [None, 3])
+def test_bucket_never_exceeds_its_rate(clock, burst):
+    sched = scheduler(rate=5, burst=burst)
+    server = Server(clock)
+    for _ in range(60):
+        sched.call(server)
+    size = burst or 5
+    calls = server.calls
+    assert calls[-1] - calls[0] >= (len(calls) - size) / 5 - 1e-9
+    for i, start in enumerate(calls):
+        for j in range(i, len(calls)):
+            # requests in [start, calls[j]] ≤ bucket size + rate × elapsed
+            assert j - i + 1 <= size + 5 * (calls[j] - start) + 1e-9
+
+
+def test_retries_stop_at_the_cap(clock):
+    sched, stats = scheduler(retries=3), app.ScanStats()
+    server = Server(clock, throttle=math.inf)
+    with pytest.raises(RuntimeError, match="429"):
+        sched.call(server, stats=stats)
+    assert len(server.calls) == 4               # the call and three retries
+    counts = stats.as_dict()
+    assert (counts["retries"], counts["throttled"], counts["fetch_failures"]) == (3, 3, 1)
+
+    server = Server(clock, throttle=3)
+    assert sched.call(server) == "ok"
+    assert len(server.calls) == 4
+
+    server = Server(clock, throttle=math.inf, error=ValueError("bad payload"))
+    with pytest.raises(ValueError):
+        scheduler(retries=2).call(server)
+    assert len(server.calls) == 3
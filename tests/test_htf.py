@@ -0,0 +1,47 @@
+"""Derived higher timeframes: windowing and the parity report."""
+import pandas as pd
+
+import app
+import bench
+
+
+class ShortProvider(bench.FakeProvider):
+    """A new listing: a couple of daily bars, no native weekly / monthly."""
+
+    def history(self, symbol, interval, period=None, start=None, stats=None):
+        df = super().history(symbol, interval, period, start, stats)
+        return df.iloc[-2:] if interval == "1d" else df.iloc[:0]
+
+
+def test_tf_frame_counts_the_period_back_from_the_last_bar():
+    daily = bench.synthetic_frame("AAA", "1d", app.DAILY_BASE_PERIOD)
+    weekly = app.tf_frame(daily, "Weekly", "W-MON")
+    start = app.period_start(app.TF_CONFIG["Weekly"]["period"], now=daily.index[-1])
+    assert weekly.index[-1] == app.resample_bars(daily, "W-MON").index[-1]
+    assert weekly.index[0] >= start - pd.Timedelta(days=7)
+    assert weekly.index[0] < start + pd.Timedelta(days=7)
+
+
+def test_tf_frame_of_nothing_is_empty():
+    daily = bench.synthetic_frame("AAA", "1d", "1y").iloc[:0]
+    assert app.tf_frame(daily, "Monthly", "MS").empty
+
+
+def test_htf_parity_matches_on_full_history():
+    report = app.htf_parity("AAA", provider=bench.FakeProvider())
+    assert set(report) == set(app.RESAMPLE_RULES)
+    assert all("error" not in r and r["bars_shared"] for r in report.values())
+
+
+def test_htf_parity_reports_missing_history():
+    report = app.htf_parity("NEWCO", provider=ShortProvider())
+    assert set(report) == set(app.RESAMPLE_RULES)
+    assert all("error" in r for r in report.values())
+
+
+def test_htf_parity_rejects_non_numeric_lengths():
+    client = app.app.test_client()
+    for query in ("rsi_len=x", "pivot_len=5.5"):
+        response = client.get(f"/api/htf_parity?symbol=AAA&{query}")
+        assert response.status_code == 400
+        assert "whole number" in response.get_json()["error"]
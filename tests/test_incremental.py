@@ -0,0 +1,102 @@
+"""Incremental SignalStates against a full analyze() of the same window."""
+from contextlib import closing
+
+import pytest
+
+import app
+import bench
+
+ARGS = (14, 5, 0.01, True, True, 0.01)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = app.BarStore(str(tmp_path / "bars.sqlite"))
+    monkeypatch.setattr(app, "BAR_STORE", store)
+    monkeypatch.setattr(app, "_STATE_CACHE", app.OrderedDict())
+    return store
+
+
+@pytest.mark.parametrize("tf,interval,history,window", [
+    ("Daily", "1d", "3y", 250),         # long frame: state carried forward
+    ("Monthly", "1mo", "20y", 60),      # short frame: re-anchored as it slides
+])
+def test_sliding_window_matches_analyze(store, tf, interval, history, window):
+    for seed in range(4):
+        sym = f"S{seed}"
+        df = bench.synthetic_frame(sym, interval, history)
+        for end in range(window, len(df) + 1, 7):
+            frame = df.iloc[end - window:end]
+            got, _ = app.analyze_incremental(app.to_bars(frame, with_ts=True), sym, tf, *ARGS)
+            assert got == app.analyze(frame, sym, tf, *ARGS), (sym, end)
+
+
+def test_trimmed_forgets_history_before_the_frame():
+    df = bench.synthetic_frame("AAA", "1d", "2y")
+    state = app.SignalState(14, 5)
+    for k, (o, h, l, c) in enumerate(df[["Open", "High", "Low", "Close"]].values):
+        state.update(k, o, h, l, c)
+    first = state.n - 100
+    trimmed = state.trimmed(first)
+    assert trimmed is not state
+    assert all(x["bar"] >= first for x in trimmed.ob["bull"] + trimmed.ob["bear"])
+    assert all(i is None or i >= first + 14 for i in trimmed.div_from.values())
+    assert trimmed.trimmed(first) is trimmed
+    assert state.trimmed(0) is state
+
+
+def test_native_and_derived_bars_keep_separate_states(store):
+    native = bench.synthetic_frame("AAA", "1wk", "2y")
+    derived = app.resample_bars(bench.synthetic_frame("AAA", "1d", "5y"), "W-MON").iloc[-len(native):]
+    app.analyze_incremental(app.to_bars(native, with_ts=True), "AAA", "Weekly", *ARGS)
+    app.analyze_incremental(app.to_bars(derived, with_ts=True), "AAA", "Weekly", *ARGS, "1d")
+    with closing(store._connect()) as con:
+        series = sorted(row[0] for row in con.execute("SELECT timeframe FROM states"))
+    assert series == ["Weekly/1d", "Weekly/1wk"]
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """Counts SignalStates built from scratch (copies and loads don't count)."""
+    built = []
+
+    class Counted(app.SignalState):
+        def __init__(self, *args):
+            built.append(args)
+            super().__init__(*args)
+
+    monkeypatch.setattr(app, "SignalState", Counted)
+    return built
+
+
+def forming(frame, close):
+    """`frame` with its last (still forming) bar re-priced to `close`."""
+    frame = frame.copy()
+    last = frame.index[-1]
+    frame.loc[last, "Close"] = close
+    frame.loc[last, "High"] = max(frame.loc[last, "High"], close)
+    frame.loc[last, "Low"] = min(frame.loc[last, "Low"], close)
+    return frame
+
+
+def test_long_appended_weekly_series_is_built_once(store, builds):
+    df = bench.synthetic_frame("W", "1wk", "10y")
+    for end in range(120, len(df) + 1):
+        for frame in (df.iloc[:end], forming(df.iloc[:end], df["Close"].iloc[end - 1] * 1.03)):
+            got, _ = app.analyze_incremental(app.to_bars(frame, with_ts=True), "W", "Weekly", *ARGS)
+            assert got == app.analyze(frame, "W", "Weekly", *ARGS), end
+    assert len(builds) == 1
+
+
+def test_sliding_weekly_window_rebuilds_once_per_new_bar(store, builds):
+    # A 2y Weekly frame still carries ~5e-4 of older history in its RSI, so the
+    # state is re-anchored when the window slides, never while a bar forms
+    df = bench.synthetic_frame("W", "1wk", "6y")
+    window, slides = 104, 0
+    for end in range(window, len(df) + 1):
+        frame = df.iloc[end - window:end]
+        for update in (frame, forming(frame, frame["Close"].iloc[-1] * 0.98)):
+            got, _ = app.analyze_incremental(app.to_bars(update, with_ts=True), "W", "Weekly", *ARGS)
+            assert got == app.analyze(update, "W", "Weekly", *ARGS), end
+        slides += 1
+    assert len(builds) == slides
@@ -0,0 +1,73 @@
+"""Background scan jobs."""
+import time
+
+import pytest
+
+import app
+import bench
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, "PROVIDER", bench.FakeProvider())
+    monkeypatch.setattr(app, "JOBS", app.JobRegistry())
+    return app.app.test_client()
+
+
+def wait_done(client, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        snap = client.get(f"/api/jobs/{job_id}").get_json()
+        if snap["status"] != "running":
+            return snap
+        time.sleep(0.05)
+    raise AssertionError("job did not finish")
+
+
+BODY = {"symbols": ["AAA", "BBB", "CCC"], "timeframes": ["Daily", "Weekly"]}
+
+
+def test_job_runs_and_is_reused(client):
+    created = client.post("/api/jobs", json=BODY)
+    assert created.status_code == 202
+    job_id = created.get_json()["id"]
+    snap = wait_done(client, job_id)
+    assert snap["status"] == "done"
+    assert snap["done"] == snap["total"] == 6
+    assert snap["summary"]["scanned"] == 6
+
+    again = client.post("/api/jobs", json={**BODY, "symbols": ["CCC", "BBB", "AAA"]})
+    assert again.status_code == 200
+    assert again.get_json() == {"id": job_id, "reused": True, "status": "done", "total": 6}
+
+
+def test_finished_is_set_before_status(monkeypatch):
+    """A job reading as done must have `finished`, or submit() can't age it."""
+    monkeypatch.setattr(app, "PROVIDER", bench.FakeProvider())
+    params, _ = app.parse_scan_request(BODY)
+    job = app.ScanJob(params, app.job_key(params))
+    seen = []
+    real_setattr = app.ScanJob.__setattr__
+
+    def spy(self, name, value):
+        if name == "status" and value != "running":
+            seen.append(self.finished)
+        real_setattr(self, name, value)
+
+    monkeypatch.setattr(app.ScanJob, "__setattr__", spy)
+    job.start()._thread.join(60)
+    assert job.status == "done"
+    assert seen and all(f is not None for f in seen)
+
+
+def test_unknown_job_is_404(client):
+    assert client.get("/api/jobs/nope").status_code == 404
+    assert client.delete("/api/jobs/nope").status_code == 404
+
+
+def test_bad_since_is_400(client):
+    job_id = client.post("/api/jobs", json=BODY).get_json()["id"]
+    response = client.get(f"/api/jobs/{job_id}?since=x")
+    assert response.status_code == 400
+    assert "since" in response.get_json()["error"]
+    wait_done(client, job_id)
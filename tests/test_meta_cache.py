@@ -0,0 +1,78 @@
+"""Market-cap metadata cache: TTL, LRU eviction and coalesced misses."""
+import threading
+import time
+
+import pytest
+
+import app
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class InfoProvider(app.DataProvider):
+    local = True
+
+    def __init__(self, delay=0.0, fail=False):
+        self.calls = []
+        self.delay = delay
+        self.fail = fail
+        self._lock = threading.Lock()
+
+    def market_cap(self, symbol, stats=None):
+        with self._lock:
+            self.calls.append(symbol)
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("info unavailable")
+        return float(len(symbol))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app.time, "monotonic", clock)
+    return clock
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache, provider = app.MetaCache(ttl=60, maxsize=10), InfoProvider()
+    assert cache.market_cap("ABC", provider) == 3.0
+    clock.now += 59
+    assert cache.market_cap("ABC", provider) == 3.0
+    assert provider.calls == ["ABC"]
+    clock.now += 2
+    assert cache.peek("ABC") == (False, None)
+    assert cache.market_cap("ABC", provider) == 3.0
+    assert provider.calls == ["ABC", "ABC"]
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = app.MetaCache(ttl=60, maxsize=2)
+    cache.put("A", 1)
+    cache.put("B", 2)
+    assert cache.peek("A") == (True, 1)         # A is now the most recent
+    cache.put("C", 3)
+    assert cache.peek("B") == (False, None)
+    assert cache.peek("A") == (True, 1)
+    assert cache.peek("C") == (True, 3)
+
+
+def test_concurrent_misses_share_one_lookup():
+    cache, provider = app.MetaCache(ttl=60, maxsize=10), InfoProvider(delay=0.2)
+    caps = cache.warm(["XYZ"] * 6, provider, max_workers=6)
+    assert caps == {"XYZ": 3.0}
+    assert provider.calls == ["XYZ"]
+
+
+def test_failed_lookups_are_not_cached():
+    cache, provider = app.MetaCache(ttl=60, maxsize=10), InfoProvider(fail=True)
+    assert cache.market_cap("ABC", provider) is None
+    assert cache.peek("ABC") == (False, None)
+    assert cache.market_cap("ABC", provider) is None
+    assert provider.calls == ["ABC", "ABC"]
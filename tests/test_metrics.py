@@ -0,0 +1,75 @@
+"""/metrics exposition and failure logging."""
+import logging
+import os
+
+import app
+import bench
+
+
+def test_series_carry_the_pid():
+    metrics = app.Metrics()
+    metrics.describe("x_total", "counter", "X.")
+    metrics.describe("y_seconds", "histogram", "Y.")
+    metrics.inc("x_total", 2, reason="ok")
+    metrics.observe("y_seconds", 0.01)
+    text = metrics.render()
+    assert f'x_total{{pid="{os.getpid()}",reason="ok"}} 2' in text
+    assert f'y_seconds_count{{pid="{os.getpid()}"}} 1' in text
+
+
+def test_scrape_reports_process_start():
+    text = app.app.test_client().get("/metrics").get_data(as_text=True)
+    assert f'screener_process_start_time_seconds{{pid="{os.getpid()}"}}' in text
+
+
+def test_analysis_failures_are_logged_with_traceback(caplog):
+    with caplog.at_level(logging.ERROR, logger="screener"):
+        result, report = app.analyze_bars({"Close": [1.0] * 40}, "AAA", "Daily", 14, 5, 0.01)
+    assert result is None and report["outcomes"] == {"error": 1}
+    record, = caplog.records
+    assert record.getMessage() == "analyze failed: AAA Daily"
+    assert record.exc_info is not None
+
+
+def test_samples_keep_full_precision():
+    metrics = app.Metrics()
+    metrics.describe("big_total", "counter", "Big.")
+    metrics.describe("start_seconds", "gauge", "Start.")
+    metrics.describe("z_seconds", "histogram", "Z.")
+    metrics.inc("big_total", 1234567)
+    metrics.set("start_seconds", 1760000000.123456)
+    metrics.observe("z_seconds", 0.1234567891)
+    text = metrics.render()
+    pid = os.getpid()
+    assert f'big_total{{pid="{pid}"}} 1234567\n' in text
+    assert f'start_seconds{{pid="{pid}"}} 1760000000.123456\n' in text
+    assert f'z_seconds_sum{{pid="{pid}"}} 0.1234567891\n' in text
+
+    scraped = app.app.test_client().get("/metrics").get_data(as_text=True)
+    line = next(l for l in scraped.splitlines() if l.startswith("screener_process_start_time_seconds{"))
+    started = float(line.split()[-1])
+    assert "e+" not in line and started != round(started, -3)   # not cut to 6 digits
+
+
+def errors_total(where):
+    pid = os.getpid()
+    prefix = f'screener_errors_total{{pid="{pid}",where="{where}"}} '
+    return next((int(l[len(prefix):]) for l in app.METRICS.render().splitlines()
+                 if l.startswith(prefix)), 0)
+
+
+def test_caught_failures_are_logged_and_counted(caplog, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(app, "SCAN_CPU_WORKERS", 0)
+    monkeypatch.setattr(app, "walk_forward", broken)
+    before = errors_total("backtest")
+    with caplog.at_level(logging.ERROR, logger="screener"):
+        summary, events = app.run_backtest(["AAA.NS", "BBB.NS"], ["Daily"], 14, 5, 0.01,
+                                           provider=bench.FakeProvider())
+    assert (summary, events) == ([], [])
+    assert errors_total("backtest") == before + 2
+    assert sorted(r.getMessage() for r in caplog.records) == [
+        "backtest failed: AAA.NS Daily", "backtest failed: BBB.NS Daily"]
+    assert all(r.exc_info is not None for r in caplog.records)
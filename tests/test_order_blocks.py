@@ -0,0 +1,119 @@
+"""order_blocks / OBZones against the per-bar loops they replaced."""
+import numpy as np
+import pytest
+
+import app
+
+
+def loop_order_blocks(o, h, l, c, ph_idx, pl_idx):
+    """The original detect_order_blocks loop."""
+    ph_set, pl_set = set(ph_idx), set(pl_idx)
+    last_ph_val = last_pl_val = None
+    bull_obs, bear_obs = [], []
+    for i in range(len(c)):
+        if i in ph_set:
+            last_ph_val = h[i]
+        if i in pl_set:
+            last_pl_val = l[i]
+        if i == 0:
+            continue
+        if last_ph_val is not None and h[i] > last_ph_val and h[i - 1] <= last_ph_val:
+            for j in range(i - 1, max(i - 30, -1), -1):
+                if c[j] < o[j]:
+                    bull_obs.append({"high": float(h[j]), "low": float(l[j]),
+                                     "bar": j, "breakout": i})
+                    break
+        if last_pl_val is not None and l[i] < last_pl_val and l[i - 1] >= last_pl_val:
+            for j in range(i - 1, max(i - 30, -1), -1):
+                if c[j] > o[j]:
+                    bear_obs.append({"high": float(h[j]), "low": float(l[j]),
+                                     "bar": j, "breakout": i})
+                    break
+    return bull_obs, bear_obs
+
+
+def loop_proximity(price, ob_list, threshold):
+    """The original check_proximity loop."""
+    for ob in reversed(ob_list[-10:]):
+        mid = (ob["high"] + ob["low"]) / 2.0
+        if mid > 0 and abs(price - mid) / mid <= threshold:
+            return True
+    return False
+
+
+def loop_breakout(price, ob_list, confirm_pct, ob_type):
+    """The original check_ob_breakout loop."""
+    for ob in reversed(ob_list[-10:]):
+        if ob_type == "bullish" and price >= ob["high"] * (1.0 + confirm_pct):
+            return True, ob
+        if ob_type == "bearish" and price <= ob["low"] * (1.0 - confirm_pct):
+            return True, ob
+    return False, None
+
+
+def ohlc(n, seed, ties=False):
+    rng = np.random.default_rng(seed)
+    c = 100 + np.cumsum(rng.normal(size=n))
+    o = np.concatenate(([c[0]], c[:-1])) + rng.normal(scale=0.3, size=n)
+    h = np.maximum(o, c) + rng.uniform(0, 1, size=n)
+    l = np.minimum(o, c) - rng.uniform(0, 1, size=n)
+    if ties:
+        # whole-number prices: equal highs / lows at pivot levels, doji
+        # candles (c == o) and OBs sharing a high, low or midpoint
+        o, h, l, c = (np.round(a) for a in (o, h, l, c))
+    return o, h, l, c
+
+
+def pivots(h, l, left=3, right=3):
+    ph, _ = app.pivot_indices(h, left, right)
+    _, pl = app.pivot_indices(l, left, right)
+    return ph, pl
+
+
+@pytest.mark.parametrize("ties", [False, True])
+def test_order_blocks_match_loop(ties):
+    for seed in range(8):
+        o, h, l, c = ohlc(400, seed, ties)
+        ph, pl = pivots(h, l)
+        assert app.order_blocks(o, h, l, c, ph, pl) == loop_order_blocks(o, h, l, c, ph, pl)
+
+
+def test_order_blocks_without_pivots_or_bars():
+    o, h, l, c = ohlc(50, 0)
+    assert app.order_blocks(o, h, l, c, [], []) == loop_order_blocks(o, h, l, c, [], []) == ([], [])
+    assert app.order_blocks(o[:1], h[:1], l[:1], c[:1], [0], [0]) == ([], [])
+    assert app.order_blocks([], [], [], [], [], []) == ([], [])
+
+
+@pytest.mark.parametrize("ties", [False, True])
+def test_zones_match_loops(ties):
+    for seed in range(8):
+        o, h, l, c = ohlc(400, seed, ties)
+        bull, bear = app.order_blocks(o, h, l, c, *pivots(h, l))
+        prices = np.concatenate((c[-40:], [ob[k] for ob in bull + bear for k in ("high", "low")]))
+        for obs in (bull, bear, bull[:1], []):
+            zones = app.OBZones(obs, lookback=10)
+            for price in prices:
+                for threshold in (0.0, 0.005, 0.02):
+                    assert zones.near(price, threshold) == loop_proximity(price, obs, threshold)
+                for pct in (0.0, 0.01):
+                    for side in ("bullish", "bearish"):
+                        assert zones.breakout(price, pct, side) == loop_breakout(price, obs, pct, side)
+
+
+def test_tied_zones_confirm_the_newest():
+    older = {"high": 105.0, "low": 100.0, "bar": 1, "breakout": 5}
+    newer = {"high": 105.0, "low": 100.0, "bar": 9, "breakout": 12}
+    zones = app.OBZones([older, newer], lookback=10)
+    assert zones.breakout(105.0, 0.0, "bullish") == (True, newer)
+    assert zones.breakout(100.0, 0.0, "bearish") == (True, newer)
+    assert zones.near(102.5, 0.0)
+
+
+def test_empty_zones():
+    zones = app.OBZones([], lookback=10)
+    assert len(zones) == 0
+    assert not zones.near(100.0, 0.5)
+    assert zones.nearest(100.0, 0.5) is None
+    assert zones.breakout(100.0, 0.0, "bullish") == (False, None)
+    assert zones.breakout(100.0, 0.0, "bearish") == (False, None)
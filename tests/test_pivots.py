@@ -0,0 +1,76 @@
+"""pivot_mask / pivot_indices against the per-bar loops they replaced."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+def loop_pivots(values, left, right):
+    """The original find_pivots / find_rsi_pivots loop: strict >= / <= ties,
+    NaN comparisons are False."""
+    v = list(values)
+    ph_idx, pl_idx = [], []
+    for i in range(left, len(v) - right):
+        if all(not (v[j] >= v[i]) for j in range(i - left, i + right + 1) if j != i):
+            ph_idx.append(i)
+        if all(not (v[j] <= v[i]) for j in range(i - left, i + right + 1) if j != i):
+            pl_idx.append(i)
+    return ph_idx, pl_idx
+
+
+def series(n, seed, ties=False, nans=0):
+    rng = np.random.default_rng(seed)
+    v = np.cumsum(rng.normal(size=n))
+    if ties:
+        v = np.round(v)                       # plenty of equal neighbours
+    if nans:
+        v[:nans] = np.nan                     # RSI warm-up
+        v[rng.choice(n, size=max(n // 20, 1), replace=False)] = np.nan
+    return v
+
+
+@pytest.mark.parametrize("left,right", [(5, 5), (3, 7), (8, 2), (1, 1), (0, 3), (4, 0)])
+@pytest.mark.parametrize("kind", ["plain", "ties", "nan"])
+def test_matches_loops(left, right, kind):
+    for seed in range(5):
+        v = series(300, seed, ties=kind == "ties", nans=14 if kind == "nan" else 0)
+        assert app.pivot_indices(v, left, right) == loop_pivots(v, left, right)
+
+
+def test_flat_series_has_no_pivots():
+    assert app.pivot_indices(np.full(30, 7.0), 5, 5) == ([], [])
+
+
+def test_ties_block_both_sides():
+    v = [1, 2, 3, 5, 3, 2, 1, 2, 3, 5, 3, 2, 1]
+    assert app.pivot_indices(v, 2, 2) == loop_pivots(v, 2, 2) == ([3, 9], [6])
+    # an equal neighbour cancels the pivot
+    v = [1, 2, 5, 5, 2, 1]
+    assert app.pivot_indices(v, 1, 1) == loop_pivots(v, 1, 1) == ([], [])
+
+
+@pytest.mark.parametrize("n", [0, 1, 5, 10, 11, 12])
+def test_short_series(n):
+    v = series(max(n, 1), 1)[:n]
+    assert app.pivot_indices(v, 5, 5) == loop_pivots(v, 5, 5)
+
+
+def test_nan_center_is_reported_and_never_blocks():
+    v = [1.0, 2.0, np.nan, 2.0, 1.0, 0.0, 1.0]
+    assert app.pivot_indices(v, 1, 1) == loop_pivots(v, 1, 1)
+
+
+def test_matrix_rows_match_single_series():
+    rows = np.array([series(200, s, ties=s % 2 == 0, nans=14 * (s % 3 == 0)) for s in range(6)])
+    ph, pl = app.pivot_mask(rows, 4, 6)
+    for k, v in enumerate(rows):
+        assert (np.flatnonzero(ph[k]).tolist(), np.flatnonzero(pl[k]).tolist()) == loop_pivots(v, 4, 6)
+
+
+def test_price_and_rsi_wrappers():
+    df = pd.DataFrame({"High": series(250, 3, ties=True), "Low": series(250, 4, ties=True)})
+    assert app.find_pivots(df["High"], df["Low"], 5, 5) == (
+        loop_pivots(df["High"], 5, 5)[0], loop_pivots(df["Low"], 5, 5)[1])
+    rsi = app.calc_rsi(pd.Series(series(250, 5) + 100), 14)
+    assert app.find_rsi_pivots(rsi, 5, 5) == loop_pivots(rsi, 5, 5)
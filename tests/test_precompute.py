@@ -0,0 +1,51 @@
+"""Precomputed preset snapshots served by the scan routes."""
+import json
+
+import pandas as pd
+import pytest
+
+import app
+import bench
+
+PRESET = "Bank Nifty"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, "PROVIDER", bench.FakeProvider())
+    precompute = app.Precomputer([PRESET])
+    precompute.refresh(PRESET, {"Daily": app.bar_bucket("Daily", pd.Timestamp.now(tz="UTC"))})
+    monkeypatch.setattr(app, "PRECOMPUTE", precompute)
+    yield app.app.test_client()
+    precompute.stop()
+
+
+def frames(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+
+
+BODY = {"symbols": app.PRESET_WATCHLISTS[PRESET][:5], "timeframes": ["Daily"]}
+
+
+def test_stream_serves_the_snapshot(client):
+    served = frames(client.post("/api/scan/stream", json={**BODY, "defer_meta": True}))
+    live = frames(client.post("/api/scan/stream", json={**BODY, "live": True}))
+
+    summary = served[-1]
+    assert summary["type"] == "summary"
+    assert summary["snapshot"]["preset"] == PRESET
+    assert summary["snapshot"]["age_s"] >= 0
+    assert "snapshot" not in live[-1]
+    rows = lambda fs: sorted((f["result"]["symbol"], f["result"]["signal"]) for f in fs
+                             if f["type"] == "result")
+    assert rows(served) == rows(live)
+    assert summary["scanned"] == live[-1]["scanned"]
+
+
+def test_stream_scans_live_off_defaults(client):
+    out = frames(client.post("/api/scan/stream", json={**BODY, "rsi_len": 21}))
+    assert "snapshot" not in out[-1]
+
+
+def test_precompute_is_opt_in():
+    assert app.PRECOMPUTE.presets == []
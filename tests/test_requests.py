@@ -0,0 +1,84 @@
+"""Requests per scan through YahooProvider's batched fetch path."""
+import threading
+import time
+
+import pytest
+
+import app
+import bench
+
+
+class StubYahoo(app.YahooProvider):
+    """YahooProvider with the chart request stubbed out: one call of
+    history() is one HTTP request, answered with synthetic bars."""
+
+    def __init__(self, delay=0.0, fail=()):
+        super().__init__(session=False)
+        self.delay = delay
+        self.fail = set(fail)
+        self.calls = 0
+        self.inflight = self.max_inflight = 0
+        self._lock = threading.Lock()
+
+    def history(self, symbol, interval, period=None, start=None, stats=None):
+        if stats is not None:
+            stats.add("requests")
+        with self._lock:
+            self.calls += 1
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight, self.inflight)
+        try:
+            time.sleep(self.delay)
+            if symbol in self.fail:
+                raise RuntimeError("429 Too Many Requests")
+            return bench.synthetic_frame(symbol, interval, period or "1y")
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+    def market_cap(self, symbol, stats=None):
+        if stats is not None:
+            stats.add("requests")
+        with self._lock:
+            self.calls += 1
+        return 1e9
+
+
+@pytest.fixture
+def meta_cache(monkeypatch):
+    monkeypatch.setattr(app, "META_CACHE", app.MetaCache())
+
+
+@pytest.mark.parametrize("derive_htf,per_symbol", [(False, 4), (True, 2)])
+def test_requests_per_scan_drop_against_per_symbol_fetches(meta_cache, derive_htf, per_symbol):
+    provider = StubYahoo()
+    symbols = bench.synthetic_universe(12)
+    timeframes = list(app.TF_CONFIG)
+    stats = app.ScanStats()
+    app.run_scan(symbols, timeframes, 14, 5, 0.01, provider=provider, stats=stats,
+                 derive_htf=derive_htf)
+
+    requests = stats.as_dict()["requests"]
+    assert requests == provider.calls                   # real calls, no estimate
+    # Baseline: a history and an info request per symbol × timeframe
+    per_task = 2 * len(symbols) * len(timeframes)
+    # Now: one history per symbol per fetched series, one cached info per symbol
+    assert requests == len(symbols) * (per_symbol + 1) < per_task
+
+
+def test_concurrent_batches_are_not_serialized():
+    provider = StubYahoo(delay=0.2)
+    threads = [threading.Thread(target=provider.history_batch, args=(syms, "1d", "1y"))
+               for syms in (["A.NS", "B.NS"], ["C.NS", "D.NS"])]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert provider.max_inflight > 2
+
+
+def test_batch_leaves_out_failures_and_raises_when_all_fail():
+    provider = StubYahoo(fail={"B.NS"})
+    assert set(provider.history_batch(["A.NS", "B.NS"], "1d", "1y")) == {"A.NS"}
+    with pytest.raises(RuntimeError, match="429"):
+        StubYahoo(fail={"A.NS", "B.NS"}).history_batch(["A.NS", "B.NS"], "1d", "1y")
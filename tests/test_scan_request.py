@@ -0,0 +1,30 @@
+"""Scan request validation shared by every scan route."""
+import pytest
+
+import app
+
+ROUTES = ["/api/scan", "/api/scan/stream", "/api/screen", "/api/confluence",
+          "/api/jobs", "/api/watch", "/api/sweep", "/api/backtest"]
+BAD = [
+    ({"timeframes": ["Daily", "4H"]}, "Unknown timeframe(s): 4H"),
+    ({"timeframes": "Daily"}, "must be lists"),
+    ({"timeframes": []}, "No timeframes"),
+    ({"timeframes": [["Daily"]]}, "Unknown timeframe"),
+    ({"symbols": "RELIANCE.NS"}, "must be lists"),
+    ({"rsi_len": "fourteen"}, "numbers"),
+]
+
+
+@pytest.mark.parametrize("route", ROUTES)
+@pytest.mark.parametrize("body,message", BAD)
+def test_bad_scan_requests_are_400(route, body, message):
+    response = app.app.test_client().post(route, json={"symbols": ["AAA"], **body})
+    assert response.status_code == 400
+    assert message in response.get_json()["error"]
+
+
+def test_timeframes_are_kept_in_request_order():
+    params, error = app.parse_scan_request({"symbols": ["aaa "], "timeframes": ["Weekly", "1H"]})
+    assert error is None
+    assert params["symbols"] == ["AAA"]
+    assert params["timeframes"] == ["Weekly", "1H"]
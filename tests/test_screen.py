@@ -0,0 +1,51 @@
+"""Universe screen: streamed NDJSON and request validation."""
+import json
+
+import pytest
+
+import app
+import bench
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, "PROVIDER", bench.FakeProvider())
+    return app.app.test_client()
+
+
+def frames(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+
+
+BODY = {"symbols": bench.synthetic_universe(6), "timeframes": ["Daily", "Weekly"]}
+
+
+def test_screen_streams_progress_then_summary(client, monkeypatch):
+    monkeypatch.setattr(app, "SCREEN_PROGRESS_INTERVAL", 0)
+    out = frames(client.post("/api/screen", json={**BODY, "top_k": 3}))
+    assert out[0] == {"type": "start", "total": 12}
+    progress = [f for f in out if f["type"] == "progress"]
+    assert sorted({f["results"] for f in progress}) == list(range(1, 13))
+    summary = out[-1]
+    assert summary["type"] == "summary"
+    assert summary["aggregate"]["results"] == 12
+    assert len(summary["results"]) == 3
+
+    params = app.parse_scan_request(BODY)[0]
+    params.pop("defer_meta")
+    direct = app.screen(**params, top_k=3)
+    key = lambda r: (r["symbol"], r["timeframe"])
+    assert list(map(key, summary["results"])) == list(map(key, direct.results()))
+
+
+@pytest.mark.parametrize("route,extra", [
+    ("/api/screen", {"top_k": "many"}),
+    ("/api/screen", {"top_k": None}),
+    ("/api/screen", {"rsi_len": "x"}),
+    ("/api/confluence", {"top_n": "ten"}),
+    ("/api/confluence", {"min_aligned": [2]}),
+])
+def test_bad_numbers_are_rejected(client, route, extra):
+    response = client.post(route, json={**BODY, **extra})
+    assert response.status_code == 400
+    assert "error" in response.get_json()
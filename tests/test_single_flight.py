@@ -0,0 +1,64 @@
+"""Concurrent scans share one download per series (FETCH_FLIGHTS)."""
+import threading
+
+import pytest
+
+import app
+import bench
+
+
+class CountingProvider(bench.FakeProvider):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requested = []
+
+    def history_batch(self, symbols, interval, period=None, start=None, stats=None):
+        with self._lock:
+            self.requested.extend(symbols)
+        return super().history_batch(symbols, interval, period, start, stats)
+
+
+@pytest.fixture(autouse=True)
+def no_store(monkeypatch):
+    monkeypatch.setattr(app, "BAR_STORE", None)
+    monkeypatch.setattr(app, "FETCH_FLIGHTS", app.SingleFlight())
+
+
+def test_concurrent_callers_share_one_fetch():
+    provider = CountingProvider(latency=0.3)
+    syms = ["AAA", "BBB", "CCC"]
+    stats = [app.ScanStats() for _ in range(4)]
+    results = [None] * 4
+    barrier = threading.Barrier(4)
+
+    def load(k):
+        barrier.wait()
+        results[k] = app.load_bars_batch(syms, "1d", "1y", provider, stats[k])
+
+    threads = [threading.Thread(target=load, args=(k,)) for k in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(provider.requested) == syms
+    assert all(set(r) == set(syms) for r in results)
+    assert all(results[k][sym] is results[0][sym] for k in range(4) for sym in syms)
+    assert sum(s.as_dict().get("coalesced", 0) for s in stats) == 3 * len(syms)
+
+
+def test_later_callers_fetch_again():
+    provider = CountingProvider()
+    app.load_bars_batch(["AAA"], "1d", "1y", provider)
+    app.load_bars_batch(["AAA"], "1d", "1y", provider)
+    assert provider.requested == ["AAA", "AAA"]
+
+
+def test_failed_fetch_releases_waiters():
+    flights = app.SingleFlight()
+    mine, theirs = flights.claim(["k"])
+    assert mine == ["k"] and not theirs
+    again, waiting = flights.claim(["k"])
+    assert again == [] and list(waiting) == ["k"]
+    flights.resolve({"k": None})                     # the fetch came back empty
+    assert flights.wait(waiting["k"]) is None
+    assert flights.claim(["k"])[0] == ["k"]          # nothing left in flight
@@ -0,0 +1,34 @@
+"""I/O thread stage and process analytics stage of iter_scan."""
+import pytest
+
+import app
+import bench
+
+SYMBOLS = bench.synthetic_universe(8)
+TIMEFRAMES = ["1H", "Daily", "Weekly"]
+
+
+def scan(stats=None):
+    return app.run_scan(SYMBOLS, TIMEFRAMES, 14, 5, 0.01, provider=bench.FakeProvider(),
+                        stats=stats, batched=False)
+
+
+@pytest.fixture
+def process_pool(monkeypatch):
+    monkeypatch.setattr(app, "SCAN_CPU_WORKERS", 2)
+    monkeypatch.setattr(app, "_cpu_pool_instance", None)
+    yield
+    if app._cpu_pool_instance is not None:
+        app._cpu_pool_instance.shutdown()
+
+
+def test_process_stage_matches_in_thread_analytics(monkeypatch, process_pool):
+    stats = app.ScanStats()
+    pooled = scan(stats)
+    assert app._cpu_pool_instance is not None
+    report = app.stage_report(stats)
+    assert report["analytics"]["workers"] == 2
+    assert report["analytics"]["tasks"] == len(SYMBOLS) * len(TIMEFRAMES)
+
+    monkeypatch.setattr(app, "SCAN_CPU_WORKERS", 0)
+    assert pooled == scan()
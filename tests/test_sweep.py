@@ -0,0 +1,31 @@
+"""sweep_matrix against analyze() run once per parameter combination."""
+import pytest
+
+import app
+import bench
+
+GRID = ([7, 14], [3, 5], [0.005, 0.02], [0.0, 0.01])
+
+
+def expected(frame, symbol, rsi_div_on, ob_on):
+    cells = []
+    for combo in app.sweep_combos(*GRID):
+        res = app.analyze(frame, symbol, "Daily", combo["rsi_len"], combo["pivot_len"],
+                          combo["ob_prox_pct"], rsi_div_on, ob_on, combo["ob_confirm_pct"])
+        cells.append(None if res is None else
+                     [res["signal"], res["div_type"], res["validated"],
+                      res["near_ob"], res["ob_confirmed"]])
+    return cells
+
+
+@pytest.mark.parametrize("rsi_div_on,ob_on", [(True, True), (True, False), (False, True)])
+def test_sweep_matrix_matches_per_combination_analyze(rsi_div_on, ob_on):
+    symbols = bench.synthetic_universe(6) + ["SHORT.NS"]
+    frames = [bench.synthetic_frame(sym, "1d", "1y") for sym in symbols]
+    frames[1] = frames[1].iloc[-150:]              # ragged lengths
+    frames[-1] = frames[-1].iloc[-20:]             # too short for the larger combos
+    cells = app.sweep_matrix([app.to_bars(f) for f in frames], symbols, "Daily", *GRID,
+                             rsi_div_on=rsi_div_on, ob_on=ob_on)
+    assert any(c is not None for row in cells for c in row)
+    for frame, symbol, row in zip(frames, symbols, cells):
+        assert row == expected(frame, symbol, rsi_div_on, ob_on), symbol
@@ -0,0 +1,61 @@
+"""Watch mode: bar buckets, subscriptions and the event-stream cap."""
+import pandas as pd
+import pytest
+
+import app
+
+
+def local(ts):
+    return pd.Timestamp(ts, tz=app.WATCH_TZ).tz_convert("UTC")
+
+
+@pytest.mark.parametrize("earlier,later", [
+    ("2026-01-05 16:00", "2026-01-06 09:00"),   # overnight
+    ("2026-01-06 09:14", "2026-01-06 10:14"),   # first bar still open
+    ("2026-01-09 15:31", "2026-01-12 10:00"),   # weekend
+])
+def test_hourly_bucket_stands_still_outside_the_session(earlier, later):
+    assert app.bar_bucket("1H", local(earlier)) == app.bar_bucket("1H", local(later))
+
+
+def test_hourly_bucket_changes_as_each_bar_closes():
+    closes = ["10:15", "11:15", "12:15", "13:15", "14:15", "15:15", "15:30"]
+    buckets = [app.bar_bucket("1H", local(f"2026-01-06 {hm}")) for hm in closes]
+    assert buckets == [pd.Timestamp(f"2026-01-06 {hm}", tz=app.WATCH_TZ) for hm in closes]
+    # The short last bar (15:15–15:30) is due at the close, not an hour later
+    assert app.bar_bucket("1H", local("2026-01-06 15:29")) != buckets[-1]
+    assert app.bar_bucket("1H", local("2026-01-06 16:15")) == buckets[-1]
+
+
+def test_subscribe_misses_no_delta():
+    watch = app.Watch({"timeframes": ["Daily"]}, "key")
+    with watch._lock:
+        watch._publish({"type": "delta"})
+    q = watch.subscribe()
+    with watch._lock:
+        watch._publish({"type": "delta"})
+    snapshot, delta = q.get_nowait(), q.get_nowait()
+    assert (snapshot["type"], snapshot["seq"]) == ("snapshot", 1)
+    assert delta["seq"] == 2
+
+
+def test_event_streams_are_capped(monkeypatch):
+    registry = app.WatchRegistry()
+    watch = app.Watch({"timeframes": ["Daily"]}, "key")
+    registry._watches[watch.id] = registry._by_key[watch.key] = watch
+    monkeypatch.setattr(app, "WATCHES", registry)
+    monkeypatch.setattr(app, "WATCH_MAX_LISTENERS", 1)
+    client = app.app.test_client()
+
+    first = client.get(f"/api/watch/{watch.id}/events", buffered=False)
+    assert first.status_code == 200
+    refused = client.get(f"/api/watch/{watch.id}/events", buffered=False)
+    assert refused.status_code == 503
+    assert registry.listeners == 1
+
+    first.close()
+    assert registry.listeners == 0
+    again = client.get(f"/api/watch/{watch.id}/events", buffered=False)
+    assert again.status_code == 200
+    again.close()
+    assert registry.listeners == 0